@@ -49,6 +49,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if 'timesheet_app' in INSTALLED_APPS:
+    # Per-user timezone for "today" and week boundaries (needs request.user)
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.contrib.auth.middleware.AuthenticationMiddleware') + 1,
+        'timesheet_app.middleware.UserTimezoneMiddleware',
+    )
+
 ROOT_URLCONF = 'FamilyHub.urls'
 
 TEMPLATES = [
@@ -125,3 +132,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
+
+# Timezone for timesheet users who have not picked their own
+TIMESHEET_DEFAULT_TIMEZONE = env('TIMESHEET_DEFAULT_TIMEZONE', default='Pacific/Auckland')
+
+# Timesheet analytics snapshots (memory-mapped NumPy columns, one directory per user)
+TIMESHEET_ANALYTICS_DIR = env('TIMESHEET_ANALYTICS_DIR', default=str(BASE_DIR / 'var' / 'analytics'))
@@ -39,5 +39,8 @@ DATABASES = {
     }
 }
 
+# PostgreSQL-only lookups (trigram job search)
+INSTALLED_APPS = INSTALLED_APPS + ['django.contrib.postgres']
+
 # Deployment context flag for dual deployment strategy
 IS_STANDALONE = False
@@ -29,22 +29,39 @@ DATABASES = {
     }
 }
 
+# PostgreSQL-only lookups (trigram job search)
+INSTALLED_APPS = INSTALLED_APPS + ['django.contrib.postgres']
+
 # Cache Configuration with Redis
+# 'shared' is Redis itself; 'default' keeps the entries cache generations in each
+# process as well, checking version stamps in Redis at most once a second (see
+# home/cache.py). Job and closed-period generations guard writes, so they stay
+# out of L1 and are always read from Redis.
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    'shared': {
+        'BACKEND': 'django_redis.cache.RedisCache',
         'LOCATION': env('REDIS_URL', default='redis://redis:6379/0'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
         },
         'KEY_PREFIX': 'familyhub',
         'TIMEOUT': 300,  # 5 minutes default timeout
-    }
+    },
+    'default': {
+        'BACKEND': 'home.cache.TieredCache',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'L2': 'shared',
+            'MAX_ENTRIES': env.int('CACHE_L1_MAX_ENTRIES', default=1000),
+            'CHECK_INTERVAL': env.float('CACHE_L1_CHECK_INTERVAL', default=1.0),
+            'L1_KEY_PREFIXES': ('timesheet:gen:entries:',),
+        },
+    },
 }
 
 # Session Configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
-SESSION_CACHE_ALIAS = 'default'
+SESSION_CACHE_ALIAS = 'shared'  # Not through the in-process tier, so a logout is seen everywhere at once
 SESSION_COOKIE_AGE = 3600  # 1 hour
 SESSION_COOKIE_SECURE = False  # Set to True when using HTTPS
 SESSION_COOKIE_HTTPONLY = True
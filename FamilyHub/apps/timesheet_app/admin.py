@@ -1,5 +1,117 @@
-from django.contrib import admin
-from .models import Job, TimeEntry
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from . import approvals
+from . import exports
+from . import periods
+from .merging import MergeError, merge_jobs
+from .models import (
+    ArchivedYear, ClosedPeriod, ExportJob, Household, HouseholdInvitation, HouseholdMember, Job, LeaveBalance,
+    LeaveRecord, TimeEntry, TimesheetProfile, WeekApproval,
+)
+from .search import filter_jobs
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that takes PostgreSQL's row estimate for unfiltered listings.
+
+    An exact COUNT(*) over millions of rows takes seconds; pg_class.reltuples
+    is kept current by autovacuum and is close enough for page links. Filtered
+    listings and small tables still get an exact count.
+    """
+    ESTIMATE_THRESHOLD = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            table = queryset.model._meta.db_table
+            with connection.cursor() as cursor:
+                # Partitioned tables keep their estimate on the partitions
+                cursor.execute(
+                    'SELECT SUM(GREATEST(c.reltuples, 0))::bigint FROM pg_class c '
+                    'LEFT JOIN pg_inherits i ON i.inhrelid = c.oid '
+                    'WHERE c.oid = %s::regclass OR i.inhparent = %s::regclass',
+                    [table, table],
+                )
+                estimate = cursor.fetchone()[0] or 0
+            if estimate >= self.ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """
+    Sidebar filter on a foreign key that searches instead of listing.
+
+    The stock related-field filter loads every related row into the sidebar;
+    this one renders the admin autocomplete widget, so only the selected row
+    is ever loaded. Subclasses set ``field_name``.
+    """
+    template = 'admin/timesheet_app/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.field = model._meta.get_field(self.field_name)
+        self.parameter_name = f'{self.field_name}__id__exact'
+        self.title = self.field.verbose_name
+        super().__init__(request, params, model, model_admin)
+        self.admin_site = model_admin.admin_site
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        try:
+            return queryset.filter(**{self.field.attname: int(self.value())})
+        except ValueError:
+            raise IncorrectLookupParameters(f'{self.parameter_name} must be an id')
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'All',
+        }
+
+    def widget(self):
+        formfield = self.field.formfield(widget=AutocompleteSelect(self.field, self.admin_site))
+        return formfield.widget.render(self.parameter_name, self.value(), attrs={'id': f'filter_{self.parameter_name}'})
+
+
+def _export_action(model):
+    """Admin action that queues a background CSV export of the selection"""
+    def export_csv(modeladmin, request, queryset):
+        export = exports.queue_export(request.user, model, queryset)
+        modeladmin.message_user(request, format_html(
+            'Export #{} of {} rows started. <a href="{}">Follow it under exports</a>; '
+            'the download link appears there when it is done.',
+            export.pk, len(export.object_ids), reverse('admin:timesheet_app_exportjob_changelist'),
+        ))
+    export_csv.short_description = 'Export selected %(verbose_name_plural)s to CSV (in background)'
+    export_csv.allowed_permissions = ('view',)
+    return export_csv
+
+
+class UserFilter(AutocompleteFilter):
+    field_name = 'user'
+
+
+class JobFilter(AutocompleteFilter):
+    field_name = 'job'
 
 
 @admin.register(Job)
@@ -8,6 +120,7 @@ class JobAdmin(admin.ModelAdmin):
     list_filter = ['user', 'created_at']
     search_fields = ['name', 'address']
     ordering = ['name']
+    actions = [_export_action(ExportJob.JOBS), 'merge_into_oldest']
     
     def get_queryset(self, request):
         """Only show user's own jobs unless superuser"""
@@ -16,42 +129,302 @@ class JobAdmin(admin.ModelAdmin):
             return qs
         return qs.filter(user=request.user)
     
+    def get_search_results(self, request, queryset, search_term):
+        """Use the trigram index instead of unindexed icontains lookups"""
+        if not search_term:
+            return queryset, False
+        return filter_jobs(queryset, search_term), False
+    
     def save_model(self, request, obj, form, change):
         """Automatically set user on creation"""
         if not change:  # Only on creation
             obj.user = request.user
         super().save_model(request, obj, form, change)
+    
+    def has_delete_permission(self, request, obj=None):
+        """Jobs with entries in a closed pay period are kept"""
+        if obj is not None and periods.period_touching_jobs(obj.user_id, [obj.pk]):
+            return False
+        return super().has_delete_permission(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        """Bulk deletes skip jobs with entries in closed pay periods"""
+        closed = [job.pk for job in queryset if periods.period_touching_jobs(job.user_id, [job.pk])]
+        if closed:
+            self.message_user(
+                request, f'{len(closed)} jobs with entries in closed pay periods were kept.', level=messages.WARNING
+            )
+        super().delete_queryset(request, queryset.exclude(pk__in=closed))
+    
+    @admin.action(description='Merge selected jobs into the oldest one', permissions=['delete'])
+    def merge_into_oldest(self, request, queryset):
+        """Fold duplicates into the first-created job, moving their entries"""
+        jobs = list(queryset.order_by('pk'))
+        try:
+            moved = merge_jobs(jobs[0], jobs[1:])
+        except MergeError as exc:
+            self.message_user(request, str(exc), level=messages.ERROR)
+            return
+        self.message_user(request, f'Merged {len(jobs) - 1} job(s) into "{jobs[0]}" ({moved} entries moved).')
 
 
 @admin.register(TimeEntry)
 class TimeEntryAdmin(admin.ModelAdmin):
     list_display = ['user', 'job', 'date', 'start_time', 'end_time', 'break_duration', 'total_hours_display']
-    list_filter = ['user', 'job', 'date', 'break_duration']
+    list_filter = [UserFilter, JobFilter, 'date', 'break_duration']
     search_fields = ['job__name', 'user__username']
-    date_hierarchy = 'date'
+    autocomplete_fields = ['user', 'job']
     ordering = ['-date', '-start_time']
+    actions = [_export_action(ExportJob.ENTRIES)]
+    # Large tables: no date drill-down query, no second COUNT(*), estimated page count
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    @property
+    def media(self):
+        """The changelist filters need the autocomplete widget's assets too"""
+        return super().media + AutocompleteSelect(TimeEntry._meta.get_field('job'), self.admin_site).media
     
     def get_queryset(self, request):
         """Only show user's own entries unless superuser"""
-        qs = super().get_queryset(request).select_related('user', 'job')
+        qs = super().get_queryset(request).select_related('user', 'job').with_minutes()
         if request.user.is_superuser:
             return qs
         return qs.filter(user=request.user)
     
+    def get_list_filter(self, request):
+        """Other users' entries are hidden from non-superusers, so skip the user filter"""
+        if request.user.is_superuser:
+            return self.list_filter
+        return [spec for spec in self.list_filter if spec is not UserFilter]
+    
     def save_model(self, request, obj, form, change):
         """Automatically set user on creation"""
         if not change:  # Only on creation
             obj.user = request.user
         super().save_model(request, obj, form, change)
     
+    def has_change_permission(self, request, obj=None):
+        """Entries in a closed pay period are read-only"""
+        if obj is not None and periods.period_containing(obj.user_id, obj.date):
+            return False
+        return super().has_change_permission(request, obj)
+    
+    def has_delete_permission(self, request, obj=None):
+        if obj is not None and periods.period_containing(obj.user_id, obj.date):
+            return False
+        return super().has_delete_permission(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        """Bulk deletes skip entries in closed pay periods"""
+        closed = queryset.with_closed().filter(in_closed_period=True).count()
+        if closed:
+            self.message_user(request, f'{closed} entries in closed pay periods were kept.', level=messages.WARNING)
+        super().delete_queryset(request, queryset.with_closed().filter(in_closed_period=False))
+    
     def total_hours_display(self, obj):
-        """Display total hours in admin"""
-        return f"{obj.total_hours():.2f}h"
+        """Display total hours in admin (computed in SQL, see with_minutes)"""
+        return f"{obj.worked_minutes / 60:.2f}h"
     total_hours_display.short_description = 'Total Hours'
-    total_hours_display.admin_order_field = 'start_time'
+    total_hours_display.admin_order_field = 'worked_minutes'
     
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         """Filter job choices to user's jobs"""
         if db_field.name == "job" and request and hasattr(request, 'user') and request.user.is_authenticated:
             kwargs["queryset"] = Job.objects.filter(user=request.user)
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class HouseholdMemberInline(admin.TabularInline):
+    model = HouseholdMember
+    extra = 1
+    autocomplete_fields = ['user']
+
+    def has_add_permission(self, request, obj=None):
+        """Members join by accepting an invitation; only superusers add them directly"""
+        return request.user.is_superuser
+
+
+class HouseholdInvitationInline(admin.TabularInline):
+    model = HouseholdInvitation
+    extra = 0
+    fields = ['user', 'invited_by', 'created_at']
+    readonly_fields = ['user', 'invited_by', 'created_at']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Household)
+class HouseholdAdmin(admin.ModelAdmin):
+    list_display = ['name', 'member_count', 'pending_weeks', 'created_at']
+    search_fields = ['name', 'members__username']
+    inlines = [HouseholdMemberInline, HouseholdInvitationInline]
+    actions = ['recount_pending']
+
+    def get_queryset(self, request):
+        """Only show the user's own household unless superuser"""
+        qs = super().get_queryset(request).annotate(member_total=Count('memberships'))
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(memberships__user=request.user)
+
+    def member_count(self, obj):
+        return obj.member_total
+    member_count.short_description = 'Members'
+    member_count.admin_order_field = 'member_total'
+    
+    @admin.action(description='Recount pending weeks')
+    def recount_pending(self, request, queryset):
+        """Reset the counters from the approval rows"""
+        for household in queryset:
+            approvals.recount_pending(household)
+        self.message_user(request, f'Recounted pending weeks for {queryset.count()} household(s).')
+
+
+@admin.register(WeekApproval)
+class WeekApprovalAdmin(admin.ModelAdmin):
+    """Weeks are reviewed on the Review Weeks page, which keeps the household counters"""
+    list_display = ['user', 'household', 'week_start', 'status', 'reviewed_by', 'reviewed_at']
+    list_filter = ['status']
+    search_fields = ['user__username', 'household__name']
+    date_hierarchy = 'week_start'
+    
+    def get_queryset(self, request):
+        """Only show the user's household unless superuser"""
+        qs = super().get_queryset(request).select_related('user', 'household', 'reviewed_by')
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(household__memberships__user=request.user)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedYear)
+class ArchivedYearAdmin(admin.ModelAdmin):
+    """Read-only: years are archived and restored with the archive_entries command"""
+    list_display = ['user', 'year', 'entry_count', 'total_hours', 'days_worked', 'archived_at']
+    list_filter = ['year']
+    search_fields = ['user__username']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ClosedPeriod)
+class ClosedPeriodAdmin(admin.ModelAdmin):
+    """Deleting a closed period reopens it"""
+    list_display = ['user', 'kind', 'start', 'end', 'closed_at', 'closed_by']
+    list_filter = ['kind']
+    search_fields = ['user__username']
+    date_hierarchy = 'start'
+    autocomplete_fields = ['user']
+    readonly_fields = ['closed_by']
+    
+    def get_queryset(self, request):
+        """Only show user's own periods unless superuser"""
+        qs = super().get_queryset(request).select_related('user', 'closed_by')
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(user=request.user)
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def save_model(self, request, obj, form, change):
+        obj.closed_by = request.user
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(LeaveRecord)
+class LeaveRecordAdmin(admin.ModelAdmin):
+    list_display = ['user', 'kind', 'start', 'end', 'hours', 'note']
+    list_filter = ['kind']
+    search_fields = ['user__username', 'note']
+    date_hierarchy = 'start'
+    autocomplete_fields = ['user']
+    
+    def get_queryset(self, request):
+        """Only show user's own leave unless superuser"""
+        qs = super().get_queryset(request).select_related('user')
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(user=request.user)
+
+
+@admin.register(LeaveBalance)
+class LeaveBalanceAdmin(admin.ModelAdmin):
+    """Read-only: balances follow entries and leave records (see leave.py)"""
+    list_display = ['user', 'kind', 'balance_hours']
+    list_filter = ['kind']
+    search_fields = ['user__username']
+    
+    def get_queryset(self, request):
+        """Only show user's own balances unless superuser"""
+        qs = super().get_queryset(request).select_related('user')
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(user=request.user)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TimesheetProfile)
+class TimesheetProfileAdmin(admin.ModelAdmin):
+    list_display = ['user', 'timezone']
+    search_fields = ['user__username', 'timezone']
+    autocomplete_fields = ['user']
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    """Exports are created by the export actions; here they are followed and downloaded"""
+    list_display = ['__str__', 'created_by', 'row_count', 'created_at', 'heartbeat_at', 'finished_at', 'download_link']
+    list_filter = ['status', 'model']
+    
+    def get_queryset(self, request):
+        """Only show user's own exports unless superuser"""
+        qs = super().get_queryset(request).select_related('created_by').defer('object_ids')
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(created_by=request.user)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def delete_model(self, request, obj):
+        exports.delete_export_file(obj)
+        super().delete_model(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        for export in queryset:
+            exports.delete_export_file(export)
+        super().delete_queryset(request, queryset)
+    
+    def download_link(self, obj):
+        if obj.status == ExportJob.FAILED:
+            return obj.error or 'Failed'
+        if obj.status != ExportJob.DONE:
+            return obj.get_status_display()
+        return format_html('<a href="{}">Download CSV</a>', reverse('timesheet:export_download', args=[obj.pk]))
+    download_link.short_description = 'File'
@@ -0,0 +1,308 @@
+"""
+Columnar analytics snapshot of a user's time entries.
+
+Each user's entries are kept on disk as one ``.npy`` file per column (entry
+id, date ordinal, start minute, end minute, break minutes, job id) and opened
+with ``mmap_mode='r'``, so statistics over the full history are vectorised
+NumPy operations that never instantiate models.
+
+Snapshots are refreshed incrementally: only rows whose ``updated_at`` is
+past the stored high-water mark, less ``HIGH_WATER_OVERLAP`` for transactions
+that committed after stamping it, are fetched and merged. Ids are re-listed
+when the row count no longer matches, which drops deleted entries and fetches
+any that a refresh missed. A snapshot
+whose stored generation matches the user's cache generation (see
+caching.py) is used as-is without touching the database. Years moved to the
+cold archive (see archive.py) remain part of the snapshot.
+
+Writers hold a per-user file lock, so concurrent refreshes in several worker
+processes publish one after another. A version directory that disappears
+under a reader is treated as a missing snapshot and rebuilt.
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.files import locks
+from django.db.models.functions import ExtractHour, ExtractMinute
+
+from . import caching
+from .models import TimeEntry
+
+COLUMNS = {
+    'id': np.int64,
+    'date': np.int32,    # date.toordinal()
+    'start': np.int16,   # minute of day
+    'end': np.int16,     # minute of day
+    'break': np.int16,   # minutes
+    'job': np.int64,     # -1 when the entry has no job
+}
+
+NO_JOB = -1
+
+# Rows stamped this long before the high-water mark are fetched again, so an
+# entry saved by a transaction that committed after a refresh is not missed.
+HIGH_WATER_OVERLAP = timedelta(minutes=5)
+
+
+def analytics_root():
+    """Directory holding all snapshots (``TIMESHEET_ANALYTICS_DIR`` setting)."""
+    default = Path(settings.BASE_DIR) / 'var' / 'analytics'
+    return Path(getattr(settings, 'TIMESHEET_ANALYTICS_DIR', default))
+
+
+def _user_dir(user_id):
+    return analytics_root() / f'user_{user_id}'
+
+
+class Snapshot:
+    """Read-only column arrays for one user, sorted by (date, start)."""
+
+    def __init__(self, user_id, columns, meta):
+        self.user_id = user_id
+        self.columns = columns
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def empty(cls, user_id):
+        return cls(user_id, {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}, {})
+
+
+def _read_meta(user_dir):
+    try:
+        with open(user_dir / 'meta.json') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _open(user_id, meta):
+    """Map the version ``meta`` points at, or ``None`` if a newer refresh removed it."""
+    version_dir = _user_dir(user_id) / meta['version']
+    try:
+        columns = {
+            name: np.load(version_dir / f'{name}.npy', mmap_mode='r')
+            for name in COLUMNS
+        }
+    except FileNotFoundError:
+        return None
+    return Snapshot(user_id, columns, meta)
+
+
+def _fetch_rows(queryset):
+    """Fetch entry rows as column arrays straight from ``values_list``."""
+    rows = list(queryset.annotate(
+        start_minute=ExtractHour('start_time') * 60 + ExtractMinute('start_time'),
+        end_minute=ExtractHour('end_time') * 60 + ExtractMinute('end_time'),
+    ).values_list('id', 'date', 'start_minute', 'end_minute', 'break_duration', 'job_id', 'updated_at'))
+
+    columns = {
+        'id': np.fromiter((row[0] for row in rows), COLUMNS['id'], len(rows)),
+        'date': np.fromiter((row[1].toordinal() for row in rows), COLUMNS['date'], len(rows)),
+        'start': np.fromiter((row[2] for row in rows), COLUMNS['start'], len(rows)),
+        'end': np.fromiter((row[3] for row in rows), COLUMNS['end'], len(rows)),
+        'break': np.fromiter((row[4] for row in rows), COLUMNS['break'], len(rows)),
+        'job': np.fromiter((NO_JOB if row[5] is None else row[5] for row in rows), COLUMNS['job'], len(rows)),
+    }
+    high_water = max((row[6] for row in rows), default=None)
+    return columns, high_water
+
+
+def _take(columns, mask):
+    return {name: np.asarray(values)[mask] for name, values in columns.items()}
+
+
+def _write_meta(user_dir, meta):
+    tmp = user_dir / f'meta.{uuid.uuid4().hex}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(meta, fh)
+    os.replace(tmp, user_dir / 'meta.json')
+    return meta
+
+
+@contextmanager
+def _publishing(user_dir):
+    """Hold the user's snapshot lock, shared by every worker process."""
+    user_dir.mkdir(parents=True, exist_ok=True)
+    with open(user_dir / 'lock', 'wb') as fh:
+        locks.lock(fh, locks.LOCK_EX)
+        try:
+            yield
+        finally:
+            locks.unlock(fh)
+
+
+def _write(user_id, columns, meta):
+    """Write a new snapshot version and atomically point meta.json at it."""
+    user_dir = _user_dir(user_id)
+    with _publishing(user_dir):
+        # Named in publish order, so every version that sorts before this one is superseded
+        version = f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}'
+        version_dir = user_dir / version
+        version_dir.mkdir()
+        for name, dtype in COLUMNS.items():
+            np.save(version_dir / f'{name}.npy', np.ascontiguousarray(columns[name], dtype=dtype))
+
+        meta = _write_meta(user_dir, {**meta, 'version': version})
+
+        # Readers that still map an old version keep working until they close it
+        for child in user_dir.iterdir():
+            if child.is_dir() and child.name < version:
+                shutil.rmtree(child, ignore_errors=True)
+    return meta
+
+
+def load_snapshot(user_id):
+    """Return the user's snapshot, refreshing it incrementally if it is stale."""
+    generation = caching.get_generation(user_id)
+    user_dir = _user_dir(user_id)
+    meta = _read_meta(user_dir)
+    snapshot = _open(user_id, meta) if meta else None
+
+    if snapshot is not None and meta.get('generation') == generation:
+        return snapshot
+
+    from . import archive  # archive builds on this module
+
+    entries = TimeEntry.objects.filter(user_id=user_id).order_by()
+    archived = list(archive.archived_years(user_id))
+
+    if snapshot is not None:
+        current = snapshot.columns
+        previous = datetime.fromisoformat(meta['high_water'])
+        changed, high_water = _fetch_rows(entries.filter(updated_at__gte=previous - HIGH_WATER_OVERLAP))
+        keep = ~np.isin(current['id'], changed['id'])
+        columns = {
+            name: np.concatenate([np.asarray(current[name])[keep], changed[name]])
+            for name in COLUMNS
+        }
+        high_water = max(high_water or previous, previous).isoformat()
+
+        # Archived entries leave the table but stay part of the history
+        archived_rows = sum(year.entry_count for year in archived)
+        if len(columns['id']) != entries.count() + archived_rows:
+            # Entries were deleted or archived, or committed too late for an earlier refresh
+            live_ids = np.fromiter(entries.values_list('id', flat=True), COLUMNS['id'])
+            columns = _take(columns, np.isin(columns['id'], live_ids))
+            missed = live_ids[~np.isin(live_ids, columns['id'])]
+            if len(missed):
+                late, _ = _fetch_rows(entries.filter(id__in=missed.tolist()))
+                columns = {name: np.concatenate([columns[name], late[name]]) for name in COLUMNS}
+            stored = archive.archived_columns(user_id, years=archived)
+            columns = {name: np.concatenate([stored[name], columns[name]]) for name in COLUMNS}
+    else:
+        columns, high_water = _fetch_rows(entries)
+        if archived:
+            stored = archive.archived_columns(user_id, years=archived)
+            columns = {name: np.concatenate([stored[name], columns[name]]) for name in COLUMNS}
+            high_water = high_water or max(year.archived_at for year in archived)
+        if high_water is None:
+            return Snapshot.empty(user_id)
+        high_water = high_water.isoformat()
+
+    order = np.lexsort((columns['start'], columns['date']))
+    columns = _take(columns, order)
+
+    if snapshot is not None and all(np.array_equal(columns[name], snapshot.columns[name]) for name in COLUMNS):
+        # Nothing moved (e.g. only a job was renamed): just re-stamp the generation
+        with _publishing(user_dir):
+            if _read_meta(user_dir) == meta:
+                snapshot.meta = _write_meta(user_dir, {**meta, 'generation': generation, 'high_water': high_water})
+        return snapshot
+
+    meta = _write(user_id, columns, {'generation': generation, 'high_water': high_water, 'rows': len(order)})
+    snapshot = _open(user_id, meta)
+    # A newer refresh may already have replaced this version; the arrays are still in hand
+    return Snapshot(user_id, columns, meta) if snapshot is None else snapshot
+
+
+def discard_snapshot(user_id):
+    """Delete a user's snapshot; the next load rebuilds it from scratch."""
+    shutil.rmtree(_user_dir(user_id), ignore_errors=True)
+
+
+# Vectorised statistics -----------------------------------------------------
+
+def worked_minutes(snapshot):
+    """Minutes worked per entry, matching TimeEntry.total_hours()."""
+    start = snapshot['start'].astype(np.int32)
+    end = snapshot['end'].astype(np.int32)
+    span = np.where(end <= start, end - start + 1440, end - start)
+    return np.clip(span - snapshot['break'], 0, None)
+
+
+def daily_totals(snapshot):
+    """Return ``(date_ordinals, minutes)`` for every day with entries."""
+    if not len(snapshot):
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+    days, inverse = np.unique(snapshot['date'], return_inverse=True)
+    return days, np.bincount(inverse, weights=worked_minutes(snapshot)).astype(np.int64)
+
+
+def hours_by_weekday(snapshot):
+    """Total hours per weekday, Monday first."""
+    days, minutes = daily_totals(snapshot)
+    weekdays = (days.astype(np.int64) - 1) % 7  # ordinal 1 (0001-01-01) is a Monday
+    return np.bincount(weekdays, weights=minutes, minlength=7) / 60
+
+
+def hours_by_job(snapshot):
+    """``{job_id: hours}``; entries without a job are keyed by ``None``."""
+    if not len(snapshot):
+        return {}
+    jobs, inverse = np.unique(snapshot['job'], return_inverse=True)
+    totals = np.bincount(inverse, weights=worked_minutes(snapshot)) / 60
+    return {
+        (None if job == NO_JOB else int(job)): float(hours)
+        for job, hours in zip(jobs, totals)
+    }
+
+
+def entries_by_job(snapshot):
+    """``{job_id: entry count}``, keyed like ``hours_by_job``."""
+    if not len(snapshot):
+        return {}
+    jobs, counts = np.unique(snapshot['job'], return_counts=True)
+    return {
+        (None if job == NO_JOB else int(job)): int(count)
+        for job, count in zip(jobs, counts)
+    }
+
+
+def summary_statistics(snapshot, percentiles=(50, 90)):
+    """Whole-history statistics over days that have at least one entry."""
+    days, minutes = daily_totals(snapshot)
+    if not len(days):
+        return {
+            'days_worked': 0,
+            'total_hours': 0.0,
+            'daily_average': 0.0,
+            'percentiles': {p: 0.0 for p in percentiles},
+            'hours_by_weekday': [0.0] * 7,
+        }
+
+    hours = minutes / 60
+    return {
+        'days_worked': int(len(days)),
+        'total_hours': round(float(hours.sum()), 2),
+        'daily_average': round(float(hours.mean()), 1),
+        'percentiles': {
+            p: round(float(value), 2)
+            for p, value in zip(percentiles, np.percentile(hours, percentiles))
+        },
+        'hours_by_weekday': [round(float(h), 2) for h in hours_by_weekday(snapshot)],
+    }
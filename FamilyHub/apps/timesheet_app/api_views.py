@@ -0,0 +1,530 @@
+"""
+JSON API views for the timesheet app.
+
+``sync`` implements delta sync for offline clients: a GET returns rows
+changed since an opaque cursor (ordered by ``(updated_at, id)``, with
+tombstones for deletes), and a POST applies a batch of upserts and deletes.
+Updates that carry a ``version`` only apply if it still matches the stored
+row (see concurrency.py); otherwise the item comes back as a ``conflict``
+with the stored values.
+
+The ``v1`` views are read-only resources for dashboards and scripts. They
+project fields with ``values()``, serialise with orjson, and answer
+``If-None-Match`` with a 304 when nothing of the user's has changed since
+(the ETag comes from the user's latest ``updated_at``/``deleted_at``).
+"""
+
+import base64
+import binascii
+import functools
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+
+import orjson
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition, require_GET, require_http_methods
+
+from . import archive
+from . import periods
+from .concurrency import VersionConflict, save_form_versioned
+from .forms import JobForm, TimeEntryForm
+from .models import Job, TimeEntry, Tombstone, worked_minutes_expression
+
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 2000
+
+# Rows stamped within this window may belong to transactions that have not
+# committed yet; holding them back keeps the cursor from skipping past them.
+SYNC_SETTLE_TIME = timedelta(seconds=2)
+
+JOB_FIELDS = ('id', 'version', 'name', 'address', 'description', 'hourly_rate', 'created_at', 'updated_at')
+ENTRY_FIELDS = (
+    'id', 'version', 'job_id', 'date', 'start_time', 'end_time', 'break_duration', 'created_at', 'updated_at',
+)
+TOMBSTONE_FIELDS = ('id', 'model', 'object_id', 'deleted_at')
+
+# cursor key -> (queryset factory, timestamp field, projected fields, response key)
+SYNC_STREAMS = {
+    'j': (lambda user: Job.objects.filter(user=user), 'updated_at', JOB_FIELDS, 'jobs'),
+    'e': (lambda user: TimeEntry.objects.filter(user=user), 'updated_at', ENTRY_FIELDS, 'entries'),
+    't': (lambda user: Tombstone.objects.filter(user=user), 'deleted_at', TOMBSTONE_FIELDS, 'tombstones'),
+}
+
+
+def _decode_cursor(value):
+    """Decode a client cursor into ``{stream: (timestamp, id)}``."""
+    if not value:
+        return {}
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(value.encode()).decode())
+        return {
+            key: (parse_datetime(raw[key][0]), int(raw[key][1]))
+            for key in SYNC_STREAMS if key in raw
+        }
+    except (ValueError, TypeError, KeyError, IndexError, binascii.Error):
+        raise ValueError('Invalid sync cursor')
+
+
+def _encode_cursor(positions):
+    raw = {key: [ts.isoformat(), pk] for key, (ts, pk) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(raw, separators=(',', ':')).encode()).decode()
+
+
+def _sync_changes(request):
+    try:
+        positions = _decode_cursor(request.GET.get('cursor'))
+        limit = min(max(int(request.GET.get('limit', SYNC_PAGE_SIZE)), 1), SYNC_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    settled = timezone.now() - SYNC_SETTLE_TIME
+    payload = {'has_more': False}
+
+    for key, (queryset_for, ts_field, fields, response_key) in SYNC_STREAMS.items():
+        queryset = queryset_for(request.user).filter(**{f'{ts_field}__lte': settled})
+        if key in positions:
+            ts, pk = positions[key]
+            queryset = queryset.filter(Q(**{f'{ts_field}__gt': ts}) | Q(**{ts_field: ts, 'id__gt': pk}))
+        rows = list(queryset.order_by(ts_field, 'id').values(*fields)[:limit + 1])
+
+        if len(rows) > limit:
+            payload['has_more'] = True
+            rows = rows[:limit]
+        if rows:
+            positions[key] = (rows[-1][ts_field], rows[-1]['id'])
+        payload[response_key] = rows
+
+    payload['cursor'] = _encode_cursor(positions)
+    return JsonResponse(payload)
+
+
+def _form_errors(form):
+    return {field: [str(error) for error in errors] for field, errors in form.errors.items()}
+
+
+def _conflict_result(conflict, fields):
+    """Sync result for an update whose ``version`` no longer matches the stored row."""
+    if conflict.current is None:
+        return {'status': 'error', 'errors': {'id': ['Deleted on another device.']}}
+    return {
+        'status': 'conflict',
+        'current': {field: getattr(conflict.current, field) for field in fields},
+    }
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _payload_error(data):
+    """Why a sync body has the wrong shape, or ``None``."""
+    for key in ('jobs', 'entries'):
+        if not isinstance(data.get(key, []), list):
+            return f'"{key}" must be a list'
+    deletes = data.get('delete', {})
+    if not isinstance(deletes, dict):
+        return '"delete" must be an object'
+    for key in ('jobs', 'entries'):
+        if not isinstance(deletes.get(key, []), list):
+            return f'"delete.{key}" must be a list of ids'
+    return None
+
+
+def _item_errors(item):
+    """Errors for item fields the forms never see: the object itself, ``id`` and client ids."""
+    if not isinstance(item, dict):
+        return {'__all__': ['Expected an object.']}
+    errors = {}
+    if item.get('id') is not None and not _is_id(item['id']):
+        errors['id'] = ['Must be an integer.']
+    for key in ('client_id', 'job_client_id'):
+        value = item.get(key)
+        if value is not None and not (_is_id(value) or isinstance(value, str)):
+            errors[key] = ['Must be a string or an integer.']
+    return errors
+
+
+def _apply_upserts(request, data):
+    """Apply a batch; each item runs in its own savepoint so one bad row doesn't sink the rest."""
+    results = {'jobs': [], 'entries': [], 'deleted': {'jobs': [], 'entries': []}, 'closed': []}
+    job_ids_by_client_id = {}
+
+    for item in data.get('jobs', []):
+        errors = _item_errors(item)
+        if errors:
+            results['jobs'].append({'status': 'error', 'errors': errors})
+            continue
+        result = {'client_id': item.get('client_id')}
+        instance = Job.objects.filter(pk=item['id'], user=request.user).first() if item.get('id') else None
+        if item.get('id') and instance is None:
+            result.update(status='error', errors={'id': ['Job not found.']})
+        else:
+            form = JobForm(data=item, instance=instance)
+            if form.is_valid():
+                try:
+                    with transaction.atomic():
+                        if instance:
+                            job = save_form_versioned(form)
+                        else:
+                            job = form.save(commit=False)
+                            job.user = request.user
+                            job.save()
+                    result.update(status='updated' if instance else 'created', id=job.pk, version=job.version)
+                    if item.get('client_id') is not None:
+                        job_ids_by_client_id[item['client_id']] = job.pk
+                except VersionConflict as conflict:
+                    result.update(_conflict_result(conflict, JOB_FIELDS))
+                except IntegrityError:
+                    result.update(status='error', errors={'__all__': ['A job with this name and address already exists.']})
+            else:
+                result.update(status='error', errors=_form_errors(form))
+        results['jobs'].append(result)
+
+    for item in data.get('entries', []):
+        errors = _item_errors(item)
+        if errors:
+            results['entries'].append({'status': 'error', 'errors': errors})
+            continue
+        item = dict(item)
+        result = {'client_id': item.get('client_id')}
+        if item.get('job_client_id') is not None:
+            item['job'] = job_ids_by_client_id.get(item['job_client_id'])
+        elif 'job_id' in item and 'job' not in item:
+            item['job'] = item['job_id']
+
+        instance = TimeEntry.objects.filter(pk=item['id'], user=request.user).first() if item.get('id') else None
+        if item.get('id') and instance is None:
+            result.update(status='error', errors={'id': ['Time entry not found.']})
+        else:
+            form = TimeEntryForm(user=request.user, data=item, instance=instance)
+            if instance is None:
+                form.instance.user = request.user
+            if form.is_valid():
+                try:
+                    with transaction.atomic():
+                        entry = save_form_versioned(form) if instance else form.save()
+                    result.update(status='updated' if instance else 'created', id=entry.pk, version=entry.version)
+                except VersionConflict as conflict:
+                    result.update(_conflict_result(conflict, ENTRY_FIELDS))
+                except IntegrityError:
+                    result.update(status='error', errors={'__all__': ['An entry already starts at this time.']})
+            else:
+                result.update(status='error', errors=_form_errors(form))
+        results['entries'].append(result)
+
+    deletes = data.get('delete', {})
+    for model, key in ((TimeEntry, 'entries'), (Job, 'jobs')):
+        ids = [pk for pk in deletes.get(key, []) if _is_id(pk)]
+        for obj in model.objects.filter(user=request.user, pk__in=ids):
+            pk = obj.pk
+            if model is TimeEntry and periods.period_containing(request.user.pk, obj.date):
+                results['closed'].append(pk)
+                continue
+            if model is Job and periods.period_touching_jobs(request.user.pk, [pk]):
+                results['closed'].append(pk)
+                continue
+            obj.delete()
+            results['deleted'][key].append(pk)
+    return results
+
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def sync(request):
+    """
+    Delta sync endpoint for offline clients.
+
+    GET  ``?cursor=<opaque>&limit=N`` returns jobs, entries and tombstones
+    changed since the cursor plus a new cursor; repeat while ``has_more``.
+
+    POST a JSON body ``{"jobs": [...], "entries": [...], "delete": {"jobs":
+    [ids], "entries": [ids]}}``. Items without ``id`` are created; entries
+    may reference a job from the same batch with ``job_client_id``. Entries
+    in a closed pay period, and jobs with such entries, are not deleted;
+    their ids come back in ``closed``. A body of the wrong shape is refused
+    with a 400; an item with a non-integer ``id`` gets an error result.
+    """
+    if request.method == 'GET':
+        return _sync_changes(request)
+
+    try:
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+    error = _payload_error(data)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    return JsonResponse(_apply_upserts(request, data))
+
+
+# Versioned read API --------------------------------------------------------
+
+API_MAX_RANGE_DAYS = 366
+API_DEFAULT_RANGE_DAYS = 31
+
+
+def api_response(data, status=200):
+    """Serialise ``data`` with orjson (dates, times, datetimes and Decimals included)."""
+    content = orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return HttpResponse(content, status=status, content_type='application/json')
+
+
+def _latest_change_etag(request, *args, **kwargs):
+    """
+    ETag covering every resource the user can read from the API.
+
+    One query reads the newest job, entry and tombstone timestamps through
+    the (user, updated_at, id) sync indexes; any create, edit or delete
+    moves at least one of them.
+    """
+    if not request.user.is_authenticated:
+        return None
+
+    def latest(model, field):
+        return Subquery(
+            model.objects.filter(user=OuterRef('pk')).order_by(f'-{field}').values(field)[:1]
+        )
+
+    stamps = User.objects.filter(pk=request.user.pk).annotate(
+        job=latest(Job, 'updated_at'),
+        entry=latest(TimeEntry, 'updated_at'),
+        tombstone=latest(Tombstone, 'deleted_at'),
+    ).values_list('job', 'entry', 'tombstone').first()
+
+    # Defaulted ranges follow today's date, so the day is part of the tag too
+    key = f'v1:{request.user.pk}:{request.get_full_path()}:{timezone.localdate()}:{stamps}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _api_view(view=None, *, closed_period=None):
+    """
+    Common wrapping for v1 endpoints: auth, GET only, conditional responses.
+
+    ``closed_period(request)`` may return the ClosedPeriod a request reads;
+    such responses can never change, so their ETag comes from the period
+    without a query and clients may keep them for good.
+    """
+    if view is None:
+        return functools.partial(_api_view, closed_period=closed_period)
+
+    def frozen_period(request):
+        if closed_period is None or not request.user.is_authenticated:
+            return None
+        return closed_period(request)
+
+    def etag(request, *args, **kwargs):
+        period = frozen_period(request)
+        if period:
+            return periods.frozen_etag(period, 'v1', request.get_full_path())
+        return _latest_change_etag(request, *args, **kwargs)
+
+    wrapped = login_required(require_GET(condition(etag_func=etag)(view)))
+
+    @functools.wraps(view)
+    def inner(request, *args, **kwargs):
+        response = wrapped(request, *args, **kwargs)
+        frozen = response.status_code in (200, 304) and frozen_period(request)
+        response['Cache-Control'] = periods.IMMUTABLE_CACHE_CONTROL if frozen else 'private, no-cache'
+        response['Vary'] = 'Cookie'
+        return response
+
+    return inner
+
+
+def _parse_date(value, default):
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _entry_rows(queryset):
+    rows = queryset.with_minutes().values(
+        'id', 'version', 'job_id', 'date', 'start_time', 'end_time', 'break_duration',
+        'worked_minutes', 'updated_at', job_name=F('job__name'), job_address=F('job__address'),
+    )
+    for row in rows:
+        row['hours'] = round(row.pop('worked_minutes') / 60, 2)
+    return list(rows)
+
+
+@_api_view
+def api_jobs(request):
+    """List the user's jobs with entry counts."""
+    jobs = Job.objects.filter(user=request.user).annotate(
+        entry_count=Count('time_entries')
+    ).order_by('name', 'address').values(
+        'id', 'version', 'name', 'address', 'description', 'hourly_rate', 'entry_count', 'created_at', 'updated_at'
+    )
+    return api_response({'results': list(jobs)})
+
+
+@_api_view
+def api_job_detail(request, pk):
+    """A single job with its total hours."""
+    job = get_object_or_404(
+        Job.objects.filter(user=request.user).values(
+            'id', 'version', 'name', 'address', 'description', 'hourly_rate', 'created_at', 'updated_at'
+        ),
+        pk=pk,
+    )
+    totals = TimeEntry.objects.filter(user=request.user, job_id=pk).aggregate(
+        entry_count=Count('id'), minutes=Sum(worked_minutes_expression())
+    )
+    # Only years with entries of this job are read back from the archive
+    years = [
+        archived for archived in archive.archived_years(request.user.pk)
+        if str(job['id']) in archived.minutes_by_job
+    ]
+    archived_entries = archive.entries_by_job(request.user.pk, None, None, years).get(job['id'], 0)
+    archived_minutes = archive.minutes_by_job(request.user.pk, None, None, years).get(job['id'], 0)
+    job['entry_count'] = totals['entry_count'] + archived_entries
+    job['total_hours'] = round(((totals['minutes'] or 0) + archived_minutes) / 60, 2)
+    return api_response(job)
+
+
+@_api_view
+def api_entries(request):
+    """
+    Entries between ``start`` and ``end`` (inclusive, YYYY-MM-DD).
+
+    Defaults to the last 31 days; ranges are capped at a year. ``job``
+    narrows to a single job. Entries from archived years are included and
+    flagged with ``archived``.
+    """
+    today = timezone.localdate()
+    try:
+        end = _parse_date(request.GET.get('end'), today)
+        start = _parse_date(request.GET.get('start'), end - timedelta(days=API_DEFAULT_RANGE_DAYS - 1))
+    except ValueError:
+        return api_response({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+    if start > end or (end - start).days >= API_MAX_RANGE_DAYS:
+        return api_response({'error': f'Range must be 1 to {API_MAX_RANGE_DAYS} days'}, status=400)
+
+    try:
+        job_id = int(request.GET['job']) if request.GET.get('job') else None
+    except ValueError:
+        return api_response({'error': 'job must be an id'}, status=400)
+
+    # Archived years are read from cold storage (see archive.py)
+    rows = sorted(
+        archive.iter_rows(request.user.pk, start, end, job_id=job_id),
+        key=lambda row: (row['date'], row['start_time']),
+    )
+    return api_response({'start': start, 'end': end, 'results': rows})
+
+
+@_api_view
+def api_entry_detail(request, pk):
+    """A single time entry."""
+    rows = _entry_rows(TimeEntry.objects.filter(user=request.user, pk=pk))
+    if not rows:
+        return api_response({'error': 'Not found'}, status=404)
+    return api_response(rows[0])
+
+
+def _summary_week(request):
+    """``(year, week, week_start)`` from the query, defaulting to the current week."""
+    current_year, current_week, _ = timezone.localdate().isocalendar()
+    year = int(request.GET.get('year', current_year))
+    week = int(request.GET.get('week', current_week))
+    return year, week, date.fromisocalendar(year, week, 1)
+
+
+def _closed_summary_week(request):
+    """The closed period covering an explicitly requested week, if any."""
+    # Without both parameters the response follows today's date
+    if 'year' not in request.GET or 'week' not in request.GET:
+        return None
+    try:
+        _, _, week_start = _summary_week(request)
+    except ValueError:
+        return None
+    return periods.covering(request.user.pk, week_start, week_start + timedelta(days=6))
+
+
+def _weekly_summary(user, week_start):
+    week_end = week_start + timedelta(days=6)
+    entries = TimeEntry.objects.filter(user=user, date__range=[week_start, week_end])
+    by_day = dict(entries.minutes_by_date().values_list('date', 'minutes'))
+    by_job = {
+        row['job_id']: row
+        for row in entries.order_by().values('job_id', 'job__name', 'job__address').annotate(
+            minutes=Sum(worked_minutes_expression())
+        )
+    }
+
+    archived = list(archive.archived_years(user.pk, week_start, week_end))
+    if archived:
+        # Entries of archived years are read back from cold storage
+        for day, minutes in archive.minutes_by_date(user.pk, week_start, week_end, years=archived).items():
+            by_day[day] = (by_day.get(day) or 0) + minutes
+        archived_jobs = archive.minutes_by_job(user.pk, week_start, week_end, years=archived)
+        jobs = {
+            job['id']: job
+            for job in Job.objects.filter(user=user, pk__in=archived_jobs).values('id', 'name', 'address')
+        }
+        for job_id, minutes in archived_jobs.items():
+            # No job, or one deleted since the year was archived
+            job = jobs.get(job_id, {'id': None, 'name': None, 'address': None})
+            row = by_job.setdefault(job['id'], {
+                'job_id': job['id'], 'job__name': job['name'], 'job__address': job['address'], 'minutes': 0,
+            })
+            row['minutes'] = (row['minutes'] or 0) + minutes
+    by_job = sorted(by_job.values(), key=lambda row: -(row['minutes'] or 0))
+
+    days = []
+    for offset in range(7):
+        day = week_start + timedelta(days=offset)
+        days.append({'date': day, 'hours': round((by_day.get(day) or 0) / 60, 2)})
+    total = sum(by_day.values(), 0)
+
+    return {
+        'week_start': week_start,
+        'week_end': week_end,
+        'total_hours': round(total / 60, 2),
+        'days_worked': sum(1 for minutes in by_day.values() if minutes),
+        'days': days,
+        'jobs': [
+            {
+                'job_id': row['job_id'],
+                'name': row['job__name'],
+                'address': row['job__address'],
+                'hours': round((row['minutes'] or 0) / 60, 2),
+            }
+            for row in by_job
+        ],
+    }
+
+
+@_api_view(closed_period=_closed_summary_week)
+def api_weekly_summary(request):
+    """
+    Per-day and per-job totals for an ISO week (``year``, ``week``).
+
+    Weeks inside a closed pay period are computed once and served with an
+    immutable Cache-Control header (see periods.py).
+    """
+    try:
+        year, week, week_start = _summary_week(request)
+    except ValueError:
+        return api_response({'error': 'Invalid year or week'}, status=400)
+
+    period = periods.covering(request.user.pk, week_start, week_start + timedelta(days=6))
+    if period:
+        summary = periods.frozen(
+            period, 'api_weekly_summary', lambda: _weekly_summary(request.user, week_start), week_start
+        )
+    else:
+        summary = _weekly_summary(request.user, week_start)
+    return api_response({'year': year, 'week': week, **summary})
@@ -0,0 +1,115 @@
+"""
+Weekly approval of household members' timesheets.
+
+The household owner reviews the other members' weeks. Each week a member
+records time in gets a WeekApproval row, and Household.pending_weeks counts
+the household's pending rows. The counter moves with F() updates in the same
+transaction as the rows, so no page ever has to COUNT them:
+
+* saving or deleting an entry makes its week pending (signals.py), creating
+  the row on first use or reopening a reviewed one;
+* approving or rejecting any number of weeks is one UPDATE of the rows plus
+  one UPDATE of the counter;
+* a pending row that is deleted (a member leaving, a user removed) takes its
+  count with it.
+"""
+
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from .models import Household, HouseholdMember, TimeEntry, WeekApproval, worked_minutes_expression
+
+REVIEW_PAGE_SIZE = 100
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _adjust_pending(household_id, change):
+    if change:
+        Household.objects.filter(pk=household_id).update(pending_weeks=F('pending_weeks') + change)
+
+
+def week_changed(user_id, day):
+    """Mark the member's week containing ``day`` as waiting for review."""
+    membership = HouseholdMember.objects.filter(user_id=user_id).values_list('household_id', 'role').first()
+    if membership is None or membership[1] == HouseholdMember.OWNER:
+        return
+    household_id = membership[0]
+    start = week_start(day)
+    with transaction.atomic():
+        # A reviewed week that changes is reviewed again
+        reopened = WeekApproval.objects.filter(
+            household_id=household_id, user_id=user_id, week_start=start,
+        ).exclude(status=WeekApproval.PENDING).update(
+            status=WeekApproval.PENDING, reviewed_by=None, reviewed_at=None, updated_at=timezone.now()
+        )
+        if reopened:
+            _adjust_pending(household_id, reopened)
+            return
+        if WeekApproval.objects.filter(user_id=user_id, week_start=start).exists():
+            return
+        try:
+            with transaction.atomic():
+                WeekApproval.objects.create(household_id=household_id, user_id=user_id, week_start=start)
+        except IntegrityError:
+            # Created by a concurrent save
+            return
+        _adjust_pending(household_id, 1)
+
+
+def review_weeks(household, reviewer, approval_ids, status, note=''):
+    """Approve or reject the household's pending weeks in ``approval_ids``; returns how many changed."""
+    with transaction.atomic():
+        changed = WeekApproval.objects.filter(
+            household=household, pk__in=approval_ids, status=WeekApproval.PENDING,
+        ).update(status=status, note=note, reviewed_by=reviewer, reviewed_at=timezone.now(), updated_at=timezone.now())
+        _adjust_pending(household.pk, -changed)
+    return changed
+
+
+def approval_deleted(approval):
+    if approval.status == WeekApproval.PENDING:
+        _adjust_pending(approval.household_id, -1)
+
+
+def member_left(membership):
+    """Drop the member's pending weeks from the household they left."""
+    for approval in WeekApproval.objects.filter(
+        household_id=membership.household_id, user_id=membership.user_id, status=WeekApproval.PENDING,
+    ):
+        approval.delete()
+
+
+def pending_weeks(household):
+    """
+    The household's oldest pending weeks with the hours recorded in each.
+
+    The hours for the whole page come from one grouped query.
+    """
+    approvals = list(
+        WeekApproval.objects.filter(household=household, status=WeekApproval.PENDING)
+        .select_related('user').order_by('week_start', 'user__username')[:REVIEW_PAGE_SIZE]
+    )
+    if not approvals:
+        return []
+    rows = TimeEntry.objects.filter(
+        user_id__in={approval.user_id for approval in approvals},
+        date__range=[approvals[0].week_start, max(approval.week_end() for approval in approvals)],
+    ).order_by().values('user_id', week=TruncWeek('date')).annotate(minutes=Sum(worked_minutes_expression()))
+    minutes = {(row['user_id'], row['week']): row['minutes'] or 0 for row in rows}
+    for approval in approvals:
+        approval.hours = round(minutes.get((approval.user_id, approval.week_start), 0) / 60, 2)
+    return approvals
+
+
+def recount_pending(household):
+    """Reset the counter from the rows, e.g. after editing approvals by hand."""
+    count = WeekApproval.objects.filter(household=household, status=WeekApproval.PENDING).count()
+    Household.objects.filter(pk=household.pk).update(pending_weeks=count)
+    return count
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class TimesheetAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'timesheet_app'  # Just the app name, since apps/ is in Python path
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import ensure_sqlite_index
+        post_migrate.connect(ensure_sqlite_index, sender=self)
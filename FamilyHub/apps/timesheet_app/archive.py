@@ -0,0 +1,370 @@
+"""
+Cold archive of closed years of time entries.
+
+A year is archived per user by writing its entries to one compressed
+``.npz`` file in default storage, with the same columns as the analytics
+snapshot (see analytics.py), recording the year's totals in an
+``ArchivedYear`` row, and deleting the entries from the hot table in the same
+transaction. The delete is a raw one: archiving is not deleting, so it
+leaves no tombstones for sync clients and does not touch their jobs.
+
+Readers merge archived years back in transparently. The analytics snapshot
+(and so charts, statistics and the job list), the heatmap, household
+summaries, invoices, the v1 entries and job APIs and the CSV export all ask
+this module for the archived part of their range, and files
+are read one year at a time so a long export never holds more than a year in
+memory. ``restore_year`` moves a year back into the table unchanged, and
+``remap_jobs`` rewrites archived years when jobs are merged.
+"""
+
+import hashlib
+import io
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, time
+
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+
+from . import analytics, caching
+from .models import ArchivedYear, Job, TimeEntry
+
+ARCHIVE_DIR = 'timesheet/archive'
+ROW_FIELDS = (
+    'id', 'version', 'job_id', 'date', 'start_time', 'end_time', 'break_duration',
+    'hours', 'updated_at', 'job_name', 'job_address', 'archived',
+)
+
+# Archive files never change under a given name, so decoded years can be
+# kept per process without any invalidation.
+_OPEN_YEARS = OrderedDict()
+_OPEN_YEARS_SIZE = 8
+
+
+def keep_years():
+    """Years kept in the hot table besides the current one (``TIMESHEET_ARCHIVE_KEEP_YEARS``)."""
+    return getattr(settings, 'TIMESHEET_ARCHIVE_KEEP_YEARS', 2)
+
+
+def last_archivable_year(today):
+    return today.year - keep_years() - 1
+
+
+def _year_range(year):
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def _save_columns(user_id, year, columns):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **columns)
+    content = buffer.getvalue()
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    return default_storage.save(f'{ARCHIVE_DIR}/{user_id}/{year}-{digest}.npz', ContentFile(content))
+
+
+@contextmanager
+def _deleted_on_error():
+    """
+    Collect paths of newly saved files and delete them if the block raises.
+
+    Files are written before the transaction that records them commits; on a
+    rollback no ``ArchivedYear`` points at them and nothing else would.
+    """
+    paths = []
+    try:
+        yield paths
+    except BaseException:
+        for path in paths:
+            default_storage.delete(path)
+        raise
+
+
+def load_year(archived):
+    """Column arrays for an ``ArchivedYear``, sorted by (date, start)."""
+    columns = _OPEN_YEARS.get(archived.path)
+    if columns is None:
+        with default_storage.open(archived.path) as fh, np.load(fh) as data:
+            columns = {name: data[name] for name in analytics.COLUMNS}
+        _OPEN_YEARS[archived.path] = columns
+        if len(_OPEN_YEARS) > _OPEN_YEARS_SIZE:
+            _OPEN_YEARS.popitem(last=False)
+    else:
+        _OPEN_YEARS.move_to_end(archived.path)
+    return columns
+
+
+def _totals(columns):
+    minutes = analytics.worked_minutes(columns).astype(np.int64)
+    jobs, inverse = np.unique(columns['job'], return_inverse=True)
+    by_job = np.bincount(inverse, weights=minutes).astype(np.int64)
+    return {
+        'entry_count': len(columns['id']),
+        'minutes': int(minutes.sum()),
+        'days_worked': len(np.unique(columns['date'])),
+        'minutes_by_job': {
+            ('' if job == analytics.NO_JOB else str(job)): job_minutes
+            for job, job_minutes in zip(jobs.tolist(), by_job.tolist())
+        },
+    }
+
+
+def archive_year(user_id, year):
+    """
+    Move a user's entries for ``year`` into the archive.
+
+    Entries added to an already archived year are merged into its file.
+    Returns the ``ArchivedYear`` or None when there was nothing to move.
+    """
+    start, end = _year_range(year)
+    with _deleted_on_error() as written, transaction.atomic():
+        entries = TimeEntry.objects.filter(user_id=user_id, date__range=[start, end]).order_by()
+        columns, _ = analytics._fetch_rows(entries.select_for_update())
+        if not len(columns['id']):
+            return None
+
+        archived = ArchivedYear.objects.select_for_update().filter(user_id=user_id, year=year).first()
+        old_path = None
+        if archived:
+            old_path = archived.path
+            previous = load_year(archived)
+            keep = ~np.isin(previous['id'], columns['id'])
+            columns = {name: np.concatenate([previous[name][keep], columns[name]]) for name in analytics.COLUMNS}
+        order = np.lexsort((columns['start'], columns['date']))
+        columns = {
+            name: np.ascontiguousarray(columns[name][order], dtype=dtype)
+            for name, dtype in analytics.COLUMNS.items()
+        }
+
+        path = _save_columns(user_id, year, columns)
+        written.append(path)
+        transaction.on_commit(lambda: caching.bump_generation(user_id))
+        if old_path:
+            transaction.on_commit(lambda: default_storage.delete(old_path))
+        archived, _ = ArchivedYear.objects.update_or_create(
+            user_id=user_id, year=year, defaults={'path': path, **_totals(columns)}
+        )
+        # No signals: entries are moved, not deleted, so no tombstones either
+        entries._raw_delete(entries.db)
+    return archived
+
+
+def restore_year(archived):
+    """Put an archived year's entries back into the table and drop its file."""
+    columns = load_year(archived)
+    job_ids = set(Job.objects.filter(
+        user_id=archived.user_id, pk__in=np.unique(columns['job']).tolist()
+    ).values_list('pk', flat=True))
+    with transaction.atomic():
+        TimeEntry.objects.bulk_create([
+            TimeEntry(
+                pk=entry_id,
+                user_id=archived.user_id,
+                job_id=job if job in job_ids else None,
+                date=date.fromordinal(day),
+                start_time=time(start // 60, start % 60),
+                end_time=time(end // 60, end % 60),
+                break_duration=break_minutes,
+            )
+            for entry_id, day, start, end, break_minutes, job in zip(
+                *(columns[name].tolist() for name in ('id', 'date', 'start', 'end', 'break', 'job'))
+            )
+        ], batch_size=1000)
+        path = archived.path
+        archived.delete()
+        transaction.on_commit(lambda: default_storage.delete(path))
+        transaction.on_commit(lambda: caching.bump_generation(archived.user_id))
+    return len(columns['id'])
+
+
+def remap_jobs(user_id, source_ids, target_id):
+    """
+    Point archived entries of the ``source_ids`` jobs at ``target_id``.
+
+    Used when jobs are merged (see merging.py). Affected years are rewritten
+    to new files, so readers never see a job id that no longer exists. Call
+    inside the merge's transaction; returns the number of years rewritten.
+    """
+    rewritten = 0
+    with _deleted_on_error() as written:
+        for archived in ArchivedYear.objects.select_for_update().filter(user_id=user_id).order_by('year'):
+            columns = load_year(archived)
+            moved = np.isin(columns['job'], source_ids)
+            if not moved.any():
+                continue
+            columns = {**columns, 'job': np.where(moved, target_id, columns['job']).astype(analytics.COLUMNS['job'])}
+            old_path = archived.path
+            archived.path = _save_columns(user_id, archived.year, columns)
+            written.append(archived.path)
+            archived.minutes_by_job = _totals(columns)['minutes_by_job']
+            archived.save(update_fields=['path', 'minutes_by_job'])
+            transaction.on_commit(lambda path=old_path: default_storage.delete(path))
+            rewritten += 1
+    if rewritten:
+        # The snapshot only re-reads live rows, so its archived part would keep the old ids
+        transaction.on_commit(lambda: analytics.discard_snapshot(user_id))
+    return rewritten
+
+
+def archived_years(user_id, start=None, end=None):
+    """``ArchivedYear`` rows for a user overlapping ``start``..``end``."""
+    years = ArchivedYear.objects.filter(user_id=user_id)
+    if start:
+        years = years.filter(year__gte=start.year)
+    if end:
+        years = years.filter(year__lte=end.year)
+    return years.order_by('year')
+
+
+def job_dates(user_id, job_ids):
+    """Dates of archived entries of ``job_ids``, oldest first."""
+    keys = {str(job_id) for job_id in job_ids}
+    days = set()
+    for archived in archived_years(user_id):
+        if keys.isdisjoint(archived.minutes_by_job):
+            continue
+        columns = load_year(archived)
+        days.update(np.unique(columns['date'][np.isin(columns['job'], list(job_ids))]).tolist())
+    return [date.fromordinal(day) for day in sorted(days)]
+
+
+def _slice(columns, start, end):
+    dates = columns['date']
+    lo = np.searchsorted(dates, start.toordinal()) if start else 0
+    hi = np.searchsorted(dates, end.toordinal() + 1) if end else len(dates)
+    return {name: values[lo:hi] for name, values in columns.items()}
+
+
+def _for_job(columns, job_id):
+    return {name: values[columns['job'] == job_id] for name, values in columns.items()}
+
+
+def archived_columns(user_id, start=None, end=None, years=None):
+    """All archived entries in ``start``..``end`` as one set of column arrays."""
+    if years is None:
+        years = archived_years(user_id, start, end)
+    parts = [_slice(load_year(archived), start, end) for archived in years]
+    if not parts:
+        return analytics.Snapshot.empty(user_id).columns
+    return {name: np.concatenate([part[name] for part in parts]) for name in analytics.COLUMNS}
+
+
+def minutes_by_date(user_id, start, end, years=None, job_id=None):
+    """``{date: minutes}`` over archived entries, the counterpart of ``TimeEntry.objects.minutes_by_date()``."""
+    columns = archived_columns(user_id, start, end, years=years)
+    if job_id is not None:
+        columns = _for_job(columns, job_id)
+    snapshot = analytics.Snapshot(user_id, columns, {})
+    days, minutes = analytics.daily_totals(snapshot)
+    return {date.fromordinal(int(day)): int(value) for day, value in zip(days, minutes)}
+
+
+def minutes_by_job(user_id, start, end, years=None):
+    """``{job_id: minutes}`` over archived entries; entries without a job are keyed by ``None``."""
+    columns = archived_columns(user_id, start, end, years=years)
+    jobs, inverse = np.unique(columns['job'], return_inverse=True)
+    minutes = np.bincount(inverse, weights=analytics.worked_minutes(columns), minlength=len(jobs))
+    return {
+        (None if job == analytics.NO_JOB else int(job)): int(value)
+        for job, value in zip(jobs.tolist(), minutes)
+    }
+
+
+def entries_by_job(user_id, start, end, years=None):
+    """``{job_id: entry count}`` over archived entries, keyed like ``minutes_by_job``."""
+    jobs, counts = np.unique(archived_columns(user_id, start, end, years=years)['job'], return_counts=True)
+    return {
+        (None if job == analytics.NO_JOB else int(job)): int(count)
+        for job, count in zip(jobs.tolist(), counts.tolist())
+    }
+
+
+def archived_entries(user_id, start, end, years=None):
+    """
+    Archived entries in ``start``..``end`` as unsaved ``TimeEntry`` instances
+    with their jobs, for views that render entries rather than rows.
+    """
+    columns = archived_columns(user_id, start, end, years=years)
+    if not len(columns['id']):
+        return []
+    jobs = Job.objects.filter(user_id=user_id).in_bulk()
+    entries = []
+    for entry_id, day, start_minute, end_minute, break_minutes, job in zip(
+        *(columns[name].tolist() for name in ('id', 'date', 'start', 'end', 'break', 'job'))
+    ):
+        entry = TimeEntry(
+            id=entry_id,
+            user_id=user_id,
+            date=date.fromordinal(day),
+            start_time=time(start_minute // 60, start_minute % 60),
+            end_time=time(end_minute // 60, end_minute % 60),
+            break_duration=break_minutes,
+        )
+        # No job, or one deleted since the year was archived
+        entry.job = jobs.get(job)
+        entries.append(entry)
+    return entries
+
+
+def _archived_rows(columns, jobs):
+    minutes = analytics.worked_minutes(columns).tolist()
+    for entry_id, day, start, end, break_minutes, job, worked in zip(
+        *(columns[name].tolist() for name in ('id', 'date', 'start', 'end', 'break', 'job')), minutes
+    ):
+        job_id = None if job == analytics.NO_JOB else job
+        name, address = jobs.get(job_id, (None, None))
+        yield {
+            'id': entry_id,
+            'version': None,
+            'job_id': job_id,
+            'date': date.fromordinal(day),
+            'start_time': time(start // 60, start % 60),
+            'end_time': time(end // 60, end % 60),
+            'break_duration': break_minutes,
+            'hours': round(worked / 60, 2),
+            'updated_at': None,
+            'job_name': name,
+            'job_address': address,
+            'archived': True,
+        }
+
+
+def iter_rows(user_id, start=None, end=None, job_id=None, chunk_size=2000):
+    """
+    Yield entry dicts (``ROW_FIELDS``) for ``start``..``end``.
+
+    Archived entries come first, then live ones, each in date order.
+    Archived years are read one at a time and live entries through a
+    server-side cursor, so memory stays flat however long the range is.
+    """
+    years = list(archived_years(user_id, start, end))
+    jobs = {}
+    if years:
+        jobs = {
+            job['id']: (job['name'], job['address'])
+            for job in Job.objects.filter(user_id=user_id).values('id', 'name', 'address')
+        }
+    for archived in years:
+        columns = _slice(load_year(archived), start, end)
+        if job_id is not None:
+            columns = _for_job(columns, job_id)
+        yield from _archived_rows(columns, jobs)
+
+    entries = TimeEntry.objects.filter(user_id=user_id)
+    if start:
+        entries = entries.filter(date__gte=start)
+    if end:
+        entries = entries.filter(date__lte=end)
+    if job_id is not None:
+        entries = entries.filter(job_id=job_id)
+    rows = entries.with_minutes().order_by('date', 'start_time').values(
+        'id', 'version', 'job_id', 'date', 'start_time', 'end_time', 'break_duration',
+        'worked_minutes', 'updated_at', job_name=F('job__name'), job_address=F('job__address'),
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        row['hours'] = round(row.pop('worked_minutes') / 60, 2)
+        row['archived'] = False
+        yield row
@@ -0,0 +1,78 @@
+"""
+Per-user cache generations for timesheet data.
+
+Every cached value derived from a user's timesheet is stored under a key that
+embeds the user's current generation number. Changing an entry or job bumps
+the generation (see signals.py), which makes all of the old keys unreachable
+without having to know or delete them individually.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+
+ENTRIES = 'entries'
+JOBS = 'jobs'
+PERIODS = 'periods'
+
+
+def _generation_key(user_id, scope):
+    return f'timesheet:gen:{scope}:{user_id}'
+
+
+def _fresh_generation():
+    # Time-based so a generation lost to eviction never reuses an old number.
+    return int(time.time() * 1000)
+
+
+def get_generation(user_id, scope=ENTRIES):
+    """Return the current generation for a user's data in ``scope``."""
+    key = _generation_key(user_id, scope)
+    generation = cache.get(key)
+    if generation is None:
+        generation = _fresh_generation()
+        if not cache.add(key, generation, timeout=None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def bump_generation(user_id, scope=ENTRIES):
+    """Invalidate everything cached for a user's data in ``scope``."""
+    key = _generation_key(user_id, scope)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = _fresh_generation()
+        cache.set(key, generation, timeout=None)
+        return generation
+
+
+def user_cache_key(user_id, name, *parts, scope=ENTRIES):
+    """Build a cache key for ``name`` that expires with the user's generation."""
+    suffix = ':'.join(str(part) for part in parts)
+    return f'timesheet:{name}:{user_id}:{get_generation(user_id, scope)}:{suffix}'
+
+
+def get_generations(user_ids, scope=ENTRIES):
+    """Return ``{user_id: generation}`` for several users in one cache round trip."""
+    keys = {_generation_key(user_id, scope): user_id for user_id in user_ids}
+    found = cache.get_many(list(keys))
+    return {
+        user_id: found[key] if key in found else get_generation(user_id, scope)
+        for key, user_id in keys.items()
+    }
+
+
+def group_cache_key(name, group_id, user_ids, *parts, scope=ENTRIES):
+    """
+    Build a cache key that expires when any of ``user_ids`` changes their data.
+
+    The key embeds every member's generation, so a write by one member needs
+    no knowledge of the groups they belong to; a membership change alters
+    ``user_ids`` and therefore the key as well.
+    """
+    generations = get_generations(sorted(user_ids), scope)
+    stamp = hashlib.sha1(repr(sorted(generations.items())).encode()).hexdigest()[:16]
+    suffix = ':'.join(str(part) for part in parts)
+    return f'timesheet:{name}:g{group_id}:{stamp}:{suffix}'
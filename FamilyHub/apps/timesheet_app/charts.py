@@ -0,0 +1,141 @@
+"""
+Downsampled hours-over-time series for charts.
+
+Daily or weekly totals are built from the analytics snapshot (analytics.py)
+as dense NumPy arrays and reduced to a target number of points, so the
+payload size and browser render cost stay flat however long the history is.
+
+Two reductions are offered:
+
+``lttb``
+    Largest-Triangle-Three-Buckets: keeps the points that preserve the
+    visual shape of the line.
+``minmax``
+    Min/max envelope: keeps each bucket's lowest and highest value, so
+    spikes and gaps are never smoothed away.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+
+from . import analytics
+
+DAY = 'day'
+WEEK = 'week'
+RESOLUTIONS = (DAY, WEEK)
+
+LTTB = 'lttb'
+MINMAX = 'minmax'
+METHODS = (LTTB, MINMAX)
+
+
+def hours_series(snapshot, start, end, resolution=DAY):
+    """
+    Dense ``(x, hours)`` arrays from ``start`` to ``end`` inclusive.
+
+    ``x`` holds date ordinals: every day, or every Monday for weekly totals.
+    """
+    if resolution == WEEK:
+        start -= timedelta(days=start.weekday())
+    first, last = start.toordinal(), end.toordinal()
+    dates = snapshot['date']
+    lo, hi = np.searchsorted(dates, [first, last + 1])
+    window = analytics.Snapshot(
+        snapshot.user_id,
+        {name: column[lo:hi] for name, column in snapshot.columns.items()},
+        snapshot.meta,
+    )
+    minutes = np.bincount(
+        window['date'].astype(np.int64) - first,
+        weights=analytics.worked_minutes(window),
+        minlength=last - first + 1,
+    )
+    x = np.arange(first, last + 1)
+    if resolution == WEEK:
+        weeks = -(-len(minutes) // 7)
+        minutes = np.pad(minutes, (0, weeks * 7 - len(minutes))).reshape(weeks, 7).sum(axis=1)
+        x = x[::7]
+    return x, minutes / 60
+
+
+def _bucket_edges(length, buckets):
+    """Edges splitting ``length`` points into ``buckets`` nearly equal ranges."""
+    return np.linspace(0, length, buckets + 1).astype(np.int64)
+
+
+def lttb(x, y, threshold):
+    """Indices of the ``threshold`` points Largest-Triangle-Three-Buckets keeps."""
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    # First and last points are always kept; the rest are split into buckets
+    edges = _bucket_edges(length - 2, threshold - 2) + 1
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+
+    # Each bucket's triangle uses the mean of the following bucket as its third
+    # vertex; those means don't depend on earlier choices, so compute them at once
+    sums_x = np.add.reduceat(x, edges[:-1])
+    sums_y = np.add.reduceat(y, edges[:-1])
+    counts = np.diff(edges)
+    next_x = np.append((sums_x / counts)[1:], x[-1])
+    next_y = np.append((sums_y / counts)[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, length - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        px, py = x[previous], y[previous]
+        area = np.abs(
+            (px - next_x[bucket]) * (y[lo:hi] - py) - (px - x[lo:hi]) * (next_y[bucket] - py)
+        )
+        previous = lo + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax(x, y, threshold):
+    """Indices of each bucket's minimum and maximum, ``threshold`` points at most."""
+    length = len(x)
+    buckets = threshold // 2
+    if threshold >= length or buckets < 1:
+        return np.arange(length)
+
+    edges = _bucket_edges(length, buckets)
+    size = int(np.diff(edges).max())
+    # Lay the buckets out as rows, padding short ones so argmin/argmax ignore them
+    bucket = np.arange(buckets)
+    positions = edges[:-1, None] + np.arange(size)
+    valid = positions < edges[1:, None]
+    positions = np.where(valid, positions, edges[1:, None] - 1)
+    values = y[positions]
+    lows = positions[bucket, np.where(valid, values, np.inf).argmin(axis=1)]
+    highs = positions[bucket, np.where(valid, values, -np.inf).argmax(axis=1)]
+    return np.unique(np.concatenate([lows, highs]))
+
+
+def downsample(x, y, points, method=LTTB):
+    """Return ``(x, y)`` reduced to at most ``points`` points."""
+    keep = minmax(x, y, points) if method == MINMAX else lttb(x, y, points)
+    return x[keep], y[keep]
+
+
+def chart_payload(snapshot, start, end, resolution, points, method):
+    """JSON-ready chart series for a user's snapshot."""
+    x, y = hours_series(snapshot, start, end, resolution)
+    source_points = len(x)
+    x, y = downsample(x, y, points, method)
+    return {
+        'resolution': resolution,
+        'method': method,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'source_points': source_points,
+        'points': [
+            [date.fromordinal(int(ordinal)).isoformat(), round(float(hours), 2)]
+            for ordinal, hours in zip(x, y)
+        ],
+    }
@@ -0,0 +1,56 @@
+"""
+Optimistic concurrency for Job and TimeEntry edits.
+
+Edit forms carry the ``version`` they were rendered from. Saving issues a
+single ``UPDATE ... WHERE id = %s AND version = %s`` that also increments
+the version; if no row matched, someone else saved first and
+``VersionConflict`` carries the current row so the UI can show both sides.
+No row locks are held while the user is looking at the form.
+"""
+
+from django.db import router
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+
+class VersionConflict(Exception):
+    """The row changed since it was read; ``current`` is None if it was deleted."""
+
+    def __init__(self, current):
+        super().__init__('The record was changed by someone else.')
+        self.current = current
+
+
+def save_versioned(instance, expected_version, fields):
+    """
+    Write ``fields`` of ``instance`` only if the stored version is ``expected_version``.
+
+    ``post_save`` is sent by hand because ``QuerySet.update()`` skips it and
+    the cache invalidation receivers depend on it.
+    """
+    model = type(instance)
+    using = router.db_for_write(model, instance=instance)
+    values = {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        values[field.attname] = getattr(instance, field.attname)
+    values['updated_at'] = timezone.now()
+
+    rows = model._base_manager.using(using).filter(pk=instance.pk, version=expected_version)
+    if not rows.update(version=F('version') + 1, **values):
+        raise VersionConflict(model._base_manager.using(using).filter(pk=instance.pk).first())
+
+    instance.version = expected_version + 1
+    instance.updated_at = values['updated_at']
+    post_save.send(
+        sender=model, instance=instance, created=False,
+        update_fields=frozenset(fields), raw=False, using=using,
+    )
+    return instance
+
+
+def save_form_versioned(form):
+    """Save a bound, valid ModelForm for an existing instance with a version check."""
+    expected = form.cleaned_data.get('version') or form.instance.version
+    return save_versioned(form.instance, expected, form._meta.fields)
@@ -0,0 +1,177 @@
+"""
+Background CSV exports of jobs and time entries for the admin.
+
+The admin action only records an ``ExportJob`` holding the selected primary
+keys and returns. Once that row is committed a daemon thread writes the CSV:
+rows are read in primary-key chunks with ``values_list`` (on PostgreSQL through
+a server-side cursor), written to a spooled temporary file, and the file is
+copied into default storage in chunks. A request therefore never waits on the
+export, and memory stays flat however many rows were selected.
+
+Exports whose thread never ran (for example because the worker was recycled)
+are picked up by the ``run_exports`` management command. A running export
+stamps ``heartbeat_at`` as it writes each chunk, and one whose writer died
+mid-export (no progress for ``TIMESHEET_EXPORT_STALE_SECONDS``) is taken
+over by ``run_exports`` too.
+"""
+
+import csv
+import io
+import logging
+import tempfile
+import threading
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Q
+from django.utils import timezone
+
+from .models import ExportJob, Job, TimeEntry
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = 'timesheet/exports'
+CHUNK_SIZE = 2000
+
+# model -> (queryset factory, CSV header, projected values)
+EXPORTS = {
+    ExportJob.JOBS: (
+        lambda: Job.objects.all(),
+        ['ID', 'User', 'Name', 'Address', 'Description', 'Hourly rate', 'Created', 'Updated'],
+        ('id', 'user__username', 'name', 'address', 'description', 'hourly_rate', 'created_at', 'updated_at'),
+    ),
+    ExportJob.ENTRIES: (
+        lambda: TimeEntry.objects.with_minutes().annotate(
+            hours=ExpressionWrapper(F('worked_minutes') / 60.0, output_field=FloatField())
+        ),
+        ['ID', 'User', 'Date', 'Start', 'End', 'Break (min)', 'Hours', 'Job', 'Address'],
+        ('id', 'user__username', 'date', 'start_time', 'end_time', 'break_duration', 'hours',
+         'job__name', 'job__address'),
+    ),
+}
+
+
+def stale_after():
+    """How long a running export may go without progress (``TIMESHEET_EXPORT_STALE_SECONDS``)."""
+    return timedelta(seconds=getattr(settings, 'TIMESHEET_EXPORT_STALE_SECONDS', 10 * 60))
+
+
+def claimable():
+    """Exports waiting to start, or running without a live writer."""
+    stale = Q(status=ExportJob.RUNNING) & (
+        Q(heartbeat_at__lt=timezone.now() - stale_after()) | Q(heartbeat_at__isnull=True)
+    )
+    return ExportJob.objects.filter(Q(status=ExportJob.PENDING) | stale)
+
+
+def export_path(export):
+    return f'{EXPORT_DIR}/{export.created_by_id}/{export.model}-export-{export.pk}.csv'
+
+
+def _chunks(values, size):
+    values = iter(values)
+    while chunk := list(islice(values, size)):
+        yield chunk
+
+
+def _rows(export):
+    queryset_for, _, fields = EXPORTS[export.model]
+    for chunk in _chunks(sorted(export.object_ids), CHUNK_SIZE):
+        rows = queryset_for().filter(pk__in=chunk).order_by('pk').values_list(*fields)
+        yield from rows.iterator(chunk_size=CHUNK_SIZE)
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def write_export(export, heartbeat=None):
+    """
+    Write the CSV for ``export`` to default storage; returns ``(path, rows)``.
+
+    ``heartbeat`` is called after every ``CHUNK_SIZE`` rows.
+    """
+    _, header, _ = EXPORTS[export.model]
+    count = 0
+    max_memory = getattr(settings, 'TIMESHEET_EXPORT_SPOOL_BYTES', 8 * 1024 * 1024)
+    with tempfile.SpooledTemporaryFile(max_size=max_memory) as spool:
+        text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(header)
+        for row in _rows(export):
+            writer.writerow([_format(value) for value in row])
+            count += 1
+            if heartbeat and not count % CHUNK_SIZE:
+                heartbeat()
+        text.flush()
+        spool.seek(0)
+        path = default_storage.save(export_path(export), File(spool))
+        text.detach()
+    return path, count
+
+
+def run_export(export_id):
+    """Claim a pending or stale export and write it; failures are recorded on the row."""
+    claimed = claimable().filter(pk=export_id).update(status=ExportJob.RUNNING, heartbeat_at=timezone.now())
+    if not claimed:
+        return None
+    export = ExportJob.objects.get(pk=export_id)
+
+    def heartbeat():
+        ExportJob.objects.filter(pk=export_id).update(heartbeat_at=timezone.now())
+
+    try:
+        export.path, export.row_count = write_export(export, heartbeat=heartbeat)
+        export.status = ExportJob.DONE
+    except Exception as exc:
+        logger.exception('Timesheet export %s failed', export_id)
+        export.status = ExportJob.FAILED
+        export.error = str(exc)
+    export.finished_at = timezone.now()
+    export.save(update_fields=['path', 'row_count', 'status', 'error', 'finished_at'])
+    return export
+
+
+def _run_in_thread(export_id):
+    try:
+        run_export(export_id)
+    finally:
+        connection.close()
+
+
+def start_export(export):
+    """
+    Run ``export`` in a background thread once the current transaction commits.
+
+    With ``TIMESHEET_EXPORT_IN_BACKGROUND = False`` nothing is started and
+    exports wait for the ``run_exports`` command.
+    """
+    if not getattr(settings, 'TIMESHEET_EXPORT_IN_BACKGROUND', True):
+        return
+    transaction.on_commit(
+        lambda: threading.Thread(target=_run_in_thread, args=(export.pk,), daemon=True).start()
+    )
+
+
+def queue_export(user, model, queryset):
+    """Record an export of ``queryset`` for ``user`` and start it."""
+    export = ExportJob.objects.create(
+        created_by=user,
+        model=model,
+        object_ids=list(queryset.order_by().values_list('pk', flat=True)),
+    )
+    start_export(export)
+    return export
+
+
+def delete_export_file(export):
+    if export.path:
+        default_storage.delete(export.path)
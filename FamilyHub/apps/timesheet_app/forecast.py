@@ -0,0 +1,129 @@
+"""
+Hours forecast and unusual-day flags for the timesheet dashboard.
+
+Works on the analytics snapshot (see analytics.py). Only a bounded window of
+recent weeks is sliced out of the date-sorted columns, laid out as a
+weeks x weekdays matrix, and compared against a rolling per-weekday baseline
+computed with cumulative sums. A new entry therefore only ever costs a
+recomputation of that window, and the result is cached per user generation.
+"""
+
+import calendar
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+
+from . import analytics
+from .caching import user_cache_key
+
+BASELINE_WEEKS = 8   # trailing same-weekday samples each day is compared against
+FLAG_WEEKS = 4       # how far back unusual days are reported
+Z_THRESHOLD = 2.0    # flag days this many standard deviations from their baseline
+MIN_DEVIATION_HOURS = 1.0  # ignore tiny absolute differences on very regular weekdays
+
+
+def _window_matrix(snapshot, first_monday, weeks):
+    """Minutes per day for ``weeks`` weeks from ``first_monday`` as a (weeks, 7) matrix."""
+    start = first_monday.toordinal()
+    end = start + weeks * 7
+    dates = snapshot['date']
+    lo, hi = np.searchsorted(dates, [start, end])
+    window = analytics.Snapshot(
+        snapshot.user_id,
+        {name: column[lo:hi] for name, column in snapshot.columns.items()},
+        snapshot.meta,
+    )
+    minutes = np.bincount(
+        window['date'].astype(np.int64) - start,
+        weights=analytics.worked_minutes(window),
+        minlength=weeks * 7,
+    )
+    return minutes.reshape(weeks, 7)
+
+
+def _rolling_baseline(matrix, k):
+    """
+    Mean and standard deviation of the previous ``k`` weeks for every cell.
+
+    Row ``i`` of the result describes weeks ``i-k .. i-1``; rows with fewer
+    than ``k`` weeks of history are NaN.
+    """
+    zeros = np.zeros((1, 7))
+    sums = np.vstack([zeros, np.cumsum(matrix, axis=0)])
+    squares = np.vstack([zeros, np.cumsum(matrix ** 2, axis=0)])
+
+    mean = np.full(matrix.shape, np.nan)
+    std = np.full(matrix.shape, np.nan)
+    rows = np.arange(k, matrix.shape[0])
+    mean[rows] = (sums[rows] - sums[rows - k]) / k
+    variance = (squares[rows] - squares[rows - k]) / k - mean[rows] ** 2
+    std[rows] = np.sqrt(np.clip(variance, 0, None))
+    return mean, std
+
+
+def compute_forecast(snapshot, today):
+    """Build the forecast panel data for ``today`` from a snapshot."""
+    this_monday = today - timedelta(days=today.weekday())
+    weeks = BASELINE_WEEKS + FLAG_WEEKS + 1
+    first_monday = this_monday - timedelta(weeks=weeks - 1)
+
+    matrix = _window_matrix(snapshot, first_monday, weeks) / 60
+    mean, std = _rolling_baseline(matrix, BASELINE_WEEKS)
+
+    # Projection: actual hours so far plus the typical hours for each remaining day
+    current = matrix[-1]
+    expected = np.nan_to_num(mean[-1])
+    weekday = today.weekday()
+    week_actual = float(current[:weekday + 1].sum())
+    week_projected = week_actual + float(expected[weekday + 1:].sum())
+
+    month_start = today.replace(day=1)
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    # The window always spans more than a month, so the month start is inside it
+    flat = matrix.reshape(-1)
+    month_actual = float(flat[(month_start - first_monday).days:(today - first_monday).days + 1].sum())
+    remaining_weekdays = [
+        (today + timedelta(days=offset)).weekday()
+        for offset in range(1, days_in_month - today.day + 1)
+    ]
+    month_projected = month_actual + float(expected[remaining_weekdays].sum())
+
+    # Unusual days within the flag window (completed days only)
+    flags = []
+    deviation = np.abs(matrix - mean)
+    unusual = (
+        ~np.isnan(mean)
+        & (deviation > Z_THRESHOLD * std)
+        & (deviation >= MIN_DEVIATION_HOURS)
+    )
+    unusual[-1, weekday:] = False  # today and later are not finished yet
+    for week, day in zip(*np.nonzero(unusual[-(FLAG_WEEKS + 1):])):
+        row = week + weeks - (FLAG_WEEKS + 1)
+        flags.append({
+            'date': first_monday + timedelta(weeks=int(row), days=int(day)),
+            'hours': round(float(matrix[row, day]), 2),
+            'expected': round(float(mean[row, day]), 2),
+            'direction': 'high' if matrix[row, day] > mean[row, day] else 'low',
+        })
+    flags.sort(key=lambda flag: flag['date'], reverse=True)
+
+    return {
+        'week_actual': round(week_actual, 2),
+        'week_projected': round(week_projected, 2),
+        'month_actual': round(month_actual, 2),
+        'month_projected': round(month_projected, 2),
+        'expected_by_weekday': [round(float(hours), 2) for hours in expected],
+        'has_baseline': bool(expected.any()),
+        'flags': flags,
+    }
+
+
+def forecast_for_user(user_id, today):
+    """Cached forecast panel for a user, recomputed when their generation changes."""
+    key = user_cache_key(user_id, 'forecast', today.isoformat())
+    panel = cache.get(key)
+    if panel is None:
+        panel = compute_forecast(analytics.load_snapshot(user_id), today)
+        cache.set(key, panel, timeout=60 * 60 * 24)
+    return panel
@@ -1,16 +1,149 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from datetime import date
-from .models import Job, TimeEntry
+from django.core.cache import cache
+from django.db.models import Count
+from django.urls import reverse_lazy
+from django.utils import timezone
+from .caching import JOBS, user_cache_key
+from .idempotency import key_field
+from .models import ClosedPeriod, Household, HouseholdInvitation, HouseholdMember, Job, LeaveRecord, TimeEntry, TimesheetProfile
+from .timezones import default_timezone_name, timezone_choices
+
+
+class JobAutocompleteWidget(forms.Select):
+    """
+    Job select that only renders the selected option.
+
+    The remaining options are fetched from the job autocomplete endpoint as
+    the user types, so rendering cost no longer grows with the number of jobs.
+    """
+
+    class Media:
+        js = ('timesheet/js/job-autocomplete.js',)
+
+    def __init__(self, attrs=None):
+        attrs = {'data-autocomplete-url': reverse_lazy('timesheet:job_autocomplete'), **(attrs or {})}
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v not in (None, '')]
+        choices = [('', '---------')]
+        field = getattr(self.choices, 'field', None)
+        if selected and isinstance(field, UserJobChoiceField) and field.user_id is not None:
+            choices += field.selected_choices(selected)
+        elif selected and hasattr(self.choices, 'queryset'):
+            choices += [(job.pk, str(job)) for job in self.choices.queryset.filter(pk__in=selected)]
+
+        all_choices, self.choices = self.choices, choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = all_choices
+
+
+def cached_job_choices(user_id):
+    """
+    ``{job_id: (name, address)}`` for a user's jobs, cached per job generation.
+
+    Any job save or delete bumps the generation (see signals.py), so the
+    cached list never offers a job that is gone or misses a new one.
+    """
+    key = user_cache_key(user_id, 'job_choices', scope=JOBS)
+    jobs = cache.get(key)
+    if jobs is None:
+        jobs = {
+            job_id: (name, address)
+            for job_id, name, address in Job.objects.filter(user_id=user_id)
+            .order_by('name', 'address').values_list('id', 'name', 'address')
+        }
+        cache.set(key, jobs, timeout=60 * 60 * 24)
+    return jobs
+
+
+class UserJobChoiceField(forms.ModelChoiceField):
+    """
+    Job choice limited to one user's jobs and checked against their cached list.
+
+    Validating or rendering the field therefore costs no query while the
+    user's jobs are unchanged. The cleaned value is a Job carrying only
+    id, user, name and address; other fields load on first access.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', Job.objects.all())
+        super().__init__(**kwargs)
+        self.user_id = None
+
+    def set_user(self, user):
+        self.user_id = user.pk
+        self.queryset = Job.objects.filter(user=user)
+
+    def _job(self, job_id, name, address):
+        values = {'id': job_id, 'user_id': self.user_id, 'name': name, 'address': address}
+        fields = [field.attname for field in Job._meta.concrete_fields if field.attname in values]
+        return Job.from_db(self.queryset.db, fields, [values[name] for name in fields])
+
+    def selected_choices(self, values):
+        jobs = cached_job_choices(self.user_id)
+        return [
+            (job_id, str(self._job(job_id, *jobs[job_id])))
+            for job_id in (self._job_id(value) for value in values)
+            if job_id in jobs
+        ]
+
+    @staticmethod
+    def _job_id(value):
+        if isinstance(value, Job):
+            return value.pk
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def to_python(self, value):
+        if self.user_id is None:
+            return super().to_python(value)
+        if value in self.empty_values:
+            return None
+        job_id = self._job_id(value)
+        jobs = cached_job_choices(self.user_id)
+        if job_id not in jobs:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return self._job(job_id, *jobs[job_id])
+
+
+class CachedJobFormMixin:
+    """
+    Leave the job out of model validation once UserJobChoiceField has checked it.
+
+    The model would otherwise query again just to confirm the job exists.
+    """
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        if self.fields['job'].user_id is not None:
+            exclude.add('job')
+        return exclude
+
+
+def version_field():
+    """Hidden field echoing the version the form was rendered from."""
+    return forms.IntegerField(widget=forms.HiddenInput, required=False, min_value=1)
 
 
 class JobForm(forms.ModelForm):
     """Form for creating and editing jobs."""
     
+    version = version_field()
+    
     class Meta:
         model = Job
-        fields = ['name', 'address', 'description']
+        fields = ['name', 'address', 'description', 'hourly_rate']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -25,8 +158,19 @@ class JobForm(forms.ModelForm):
                 'rows': 3,
                 'placeholder': 'Optional job description or notes'
             }),
+            'hourly_rate': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'step': '0.01',
+                'min': '0',
+                'placeholder': 'Hourly rate for invoicing (optional)'
+            }),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['version'].initial = self.instance.version
+
     def clean(self):
         """Ensure at least one of name or address is provided."""
         cleaned_data = super().clean()
@@ -41,9 +185,15 @@ class JobForm(forms.ModelForm):
         return cleaned_data
 
 
-class TimeEntryForm(forms.ModelForm):
+class TimeEntryForm(CachedJobFormMixin, forms.ModelForm):
     """Form for creating and editing time entries."""
     
+    idempotency_key = key_field()
+    version = version_field()
+    job = UserJobChoiceField(required=False, widget=JobAutocompleteWidget(attrs={
+        'class': 'form-select'
+    }))
+    
     class Meta:
         model = TimeEntry
         fields = ['job', 'date', 'start_time', 'end_time', 'break_duration']
@@ -51,8 +201,7 @@ class TimeEntryForm(forms.ModelForm):
             'date': forms.DateInput(
                 attrs={
                     'type': 'date',
-                    'class': 'form-control',
-                    'max': date.today().strftime('%Y-%m-%d')
+                    'class': 'form-control'
                 },
                 format='%Y-%m-%d'
             ),
@@ -73,16 +222,17 @@ class TimeEntryForm(forms.ModelForm):
             'break_duration': forms.Select(attrs={
                 'class': 'form-select'
             }),
-            'job': forms.Select(attrs={
-                'class': 'form-select'
-            }),
         }
 
     def __init__(self, user=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if user:
-            # Filter jobs by the current user
-            self.fields['job'].queryset = Job.objects.filter(user=user)
+            # Limit jobs to the current user's (validated against their cached list)
+            self.fields['job'].set_user(user)
+        if self.instance.pk:
+            self.fields['version'].initial = self.instance.version
+        # Per request: today depends on the user's timezone
+        self.fields['date'].widget.attrs['max'] = timezone.localdate().isoformat()
             
         # Add helpful labels
         self.fields['break_duration'].help_text = "Select break duration"
@@ -100,7 +250,7 @@ class TimeEntryForm(forms.ModelForm):
     def clean_date(self):
         """Validate that the date is not in the future."""
         entry_date = self.cleaned_data.get('date')
-        if entry_date and entry_date > date.today():
+        if entry_date and entry_date > timezone.localdate():
             raise ValidationError("Cannot add entries for future dates.")
         return entry_date
 
@@ -117,9 +267,14 @@ class TimeEntryForm(forms.ModelForm):
         return cleaned_data
 
 
-class QuickTimeEntryForm(forms.ModelForm):
+class QuickTimeEntryForm(CachedJobFormMixin, forms.ModelForm):
     """Simplified form for quick time entry on dashboard."""
     
+    idempotency_key = key_field()
+    job = UserJobChoiceField(required=False, widget=JobAutocompleteWidget(attrs={
+        'class': 'form-select form-select-sm'
+    }))
+    
     class Meta:
         model = TimeEntry
         fields = ['job', 'start_time', 'end_time', 'break_duration']
@@ -135,15 +290,12 @@ class QuickTimeEntryForm(forms.ModelForm):
             'break_duration': forms.Select(attrs={
                 'class': 'form-select form-select-sm'
             }),
-            'job': forms.Select(attrs={
-                'class': 'form-select form-select-sm'
-            }),
         }
 
     def __init__(self, user=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if user:
-            self.fields['job'].queryset = Job.objects.filter(user=user)
+            self.fields['job'].set_user(user)
 
 
 class DateFilterForm(forms.Form):
@@ -152,15 +304,188 @@ class DateFilterForm(forms.Form):
     date = forms.DateField(
         widget=forms.DateInput(attrs={
             'type': 'date',
-            'class': 'form-control',
-            'max': date.today().strftime('%Y-%m-%d')  # Prevent future dates
+            'class': 'form-control'
         }),
         help_text="Select date to view entries"
     )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['date'].widget.attrs['max'] = timezone.localdate().isoformat()  # Prevent future dates
     
     def clean_date(self):
         """Validate that the selected date is not in the future."""
         selected_date = self.cleaned_data['date']
-        if selected_date > date.today():
+        if selected_date > timezone.localdate():
             raise ValidationError("Cannot select future dates.")
         return selected_date
+
+
+class HouseholdForm(forms.ModelForm):
+    """Form for creating a household."""
+
+    class Meta:
+        model = Household
+        fields = ['name']
+        widgets = {
+            'name': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'e.g. The Smith Family'
+            }),
+        }
+
+
+class HouseholdMemberForm(forms.Form):
+    """Form for inviting an existing user to a household by username."""
+
+    username = forms.CharField(
+        max_length=150,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Username'
+        })
+    )
+
+    def __init__(self, household=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.household = household
+
+    def clean_username(self):
+        """Resolve the username to a user who is not already in or invited to a household."""
+        username = self.cleaned_data['username'].strip()
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise ValidationError('No user with that username.')
+        if HouseholdMember.objects.filter(user=user).exists():
+            raise ValidationError('That user already belongs to a household.')
+        if HouseholdInvitation.objects.filter(household=self.household, user=user).exists():
+            raise ValidationError('That user has already been invited.')
+        self.cleaned_data['user'] = user
+        return username
+
+
+class InvoiceForm(forms.Form):
+    """Form for choosing the jobs and date range to invoice."""
+
+    start_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    end_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    jobs = forms.ModelMultipleChoiceField(
+        queryset=Job.objects.none(),
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'})
+    )
+
+    def __init__(self, user=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if user:
+            self.fields['jobs'].queryset = Job.objects.filter(user=user).order_by('name', 'address')
+
+    def clean(self):
+        """Ensure the range is in order and at most a year long."""
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        if start_date and end_date:
+            if start_date > end_date:
+                raise forms.ValidationError('Start date must be before end date.')
+            if (end_date - start_date).days > 366:
+                raise forms.ValidationError('Invoices can cover at most a year.')
+        return cleaned_data
+
+
+class TimesheetProfileForm(forms.ModelForm):
+    """Form for a user's timesheet preferences."""
+
+    class Meta:
+        model = TimesheetProfile
+        fields = ['timezone']
+        widgets = {
+            'timezone': forms.Select(attrs={'class': 'form-select'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['timezone'].widget.choices = [
+            ('', f'Site default ({default_timezone_name()})'),
+            *timezone_choices(),
+        ]
+
+
+class JobMergeForm(forms.Form):
+    """Form for folding duplicate jobs into one."""
+
+    target = forms.ModelChoiceField(
+        queryset=Job.objects.none(),
+        label='Keep',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    sources = forms.ModelMultipleChoiceField(
+        queryset=Job.objects.none(),
+        label='Merge into it',
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'})
+    )
+
+    def __init__(self, user=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if user:
+            jobs = Job.objects.filter(user=user).annotate(entry_count=Count('time_entries')).order_by('name', 'address')
+            self.fields['target'].queryset = jobs
+            self.fields['sources'].queryset = jobs
+        self.fields['target'].label_from_instance = self.job_label
+        self.fields['sources'].label_from_instance = self.job_label
+
+    @staticmethod
+    def job_label(job):
+        return f'{job} ({job.entry_count} entries)' if hasattr(job, 'entry_count') else str(job)
+
+    def clean(self):
+        """The kept job cannot also be one of the merged ones."""
+        cleaned_data = super().clean()
+        target = cleaned_data.get('target')
+        sources = cleaned_data.get('sources')
+        if target and sources is not None:
+            sources = [job for job in sources if job.pk != target.pk]
+            if not sources:
+                raise forms.ValidationError('Pick at least one other job to merge.')
+            cleaned_data['sources'] = sources
+        return cleaned_data
+
+
+class ClosePeriodForm(forms.Form):
+    """Form for closing the week or month containing a date."""
+
+    kind = forms.ChoiceField(
+        choices=ClosedPeriod.KIND_CHOICES,
+        label='Close the',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    date = forms.DateField(
+        label='Containing',
+        widget=forms.DateInput(attrs={
+            'type': 'date',
+            'class': 'form-control'
+        })
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['date'].widget.attrs['max'] = timezone.localdate().isoformat()
+
+
+class LeaveRecordForm(forms.ModelForm):
+    """Form for recording leave or an absence."""
+
+    class Meta:
+        model = LeaveRecord
+        fields = ['kind', 'start', 'end', 'hours', 'note']
+        widgets = {
+            'kind': forms.Select(attrs={'class': 'form-select'}),
+            'start': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+            'end': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+            'hours': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.25', 'min': '0.25'}),
+            'note': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Optional'}),
+        }
+        labels = {
+            'start': 'From',
+            'end': 'To',
+        }
@@ -0,0 +1,138 @@
+"""
+Household-level timesheet summaries.
+
+A period's hours for every member come from a single query over TimeEntry
+grouped by (member, job), plus any archived years in the period (see
+archive.py); the by-member and by-job breakdowns are folded from those rows
+in Python. Results are cached under a key that embeds each
+member's cache generation (see caching.group_cache_key), so a change by any
+member invalidates the household's summaries without the write path having
+to know which household the member belongs to.
+"""
+
+import calendar
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from . import archive
+from .caching import group_cache_key
+from .models import Job, TimeEntry, worked_minutes_expression
+
+WEEK = 'week'
+MONTH = 'month'
+PERIODS = (WEEK, MONTH)
+
+
+def period_bounds(period, day):
+    """Inclusive ``(start, end)`` of the week (Monday first) or month containing ``day``."""
+    if period == MONTH:
+        start = day.replace(day=1)
+        return start, start.replace(day=calendar.monthrange(day.year, day.month)[1])
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=6)
+
+
+def adjacent_period(period, start, step):
+    """Start date of the period ``step`` (+1/-1) away from the one starting at ``start``."""
+    if period == MONTH:
+        month = start.month - 1 + step
+        return start.replace(year=start.year + month // 12, month=month % 12 + 1, day=1)
+    return start + timedelta(weeks=step)
+
+
+def _member_name(user):
+    return user.get_full_name() or user.username
+
+
+def compute_summary(memberships, start, end):
+    """Hours by member and by job for ``memberships`` between ``start`` and ``end``."""
+    members = {
+        membership.user_id: {
+            'user_id': membership.user_id,
+            'name': _member_name(membership.user),
+            'minutes': 0,
+            'entries': 0,
+            'jobs': [],
+        }
+        for membership in memberships
+    }
+
+    rows = TimeEntry.objects.filter(
+        user_id__in=list(members),
+        date__range=[start, end],
+    ).order_by().values('user_id', 'job_id', 'job__name', 'job__address').annotate(
+        minutes=Sum(worked_minutes_expression()),
+        entries=Count('id'),
+    )
+
+    totals = {}
+    names = {}
+    for row in rows:
+        totals[row['user_id'], row['job_id']] = [row['minutes'] or 0, row['entries']]
+        names[row['job_id']] = row['job__name'] or row['job__address']
+
+    archived = {}
+    for user_id in members:
+        years = list(archive.archived_years(user_id, start, end))
+        if years:
+            archived[user_id] = (
+                archive.minutes_by_job(user_id, start, end, years),
+                archive.entries_by_job(user_id, start, end, years),
+            )
+    missing = {job_id for by_job, _ in archived.values() for job_id in by_job} - set(names) - {None}
+    for job in Job.objects.filter(pk__in=missing).values('id', 'name', 'address'):
+        names[job['id']] = job['name'] or job['address']
+    for user_id, (minutes_by_job, entries_by_job) in archived.items():
+        for job_id, minutes in minutes_by_job.items():
+            # No job, or one deleted since the year was archived
+            total = totals.setdefault((user_id, job_id if job_id in names else None), [0, 0])
+            total[0] += minutes
+            total[1] += entries_by_job[job_id]
+
+    jobs = []
+    for (user_id, job_id), (minutes, entries) in totals.items():
+        member = members[user_id]
+        job = {
+            'job_id': job_id,
+            'name': names.get(job_id) or 'No Job Assigned',
+            'member': member['name'],
+            'hours': round(minutes / 60, 2),
+            'entries': entries,
+        }
+        member['minutes'] += minutes
+        member['entries'] += entries
+        member['jobs'].append(job)
+        jobs.append(job)
+
+    total_minutes = sum(member['minutes'] for member in members.values())
+    by_member = []
+    for member in members.values():
+        minutes = member.pop('minutes')
+        member['hours'] = round(minutes / 60, 2)
+        member['share'] = round(100 * minutes / total_minutes, 1) if total_minutes else 0
+        member['jobs'].sort(key=lambda job: -job['hours'])
+        by_member.append(member)
+    by_member.sort(key=lambda member: (-member['hours'], member['name']))
+    jobs.sort(key=lambda job: (-job['hours'], job['name']))
+
+    return {
+        'start': start,
+        'end': end,
+        'total_hours': round(total_minutes / 60, 2),
+        'by_member': by_member,
+        'by_job': jobs,
+    }
+
+
+def household_summary(household, memberships, period, day):
+    """Cached summary for the household's ``period`` (week or month) containing ``day``."""
+    start, end = period_bounds(period, day)
+    member_ids = [membership.user_id for membership in memberships]
+    key = group_cache_key('household', household.pk, member_ids, period, start.isoformat())
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_summary(memberships, start, end)
+        cache.set(key, summary, timeout=60 * 60 * 24)
+    return summary
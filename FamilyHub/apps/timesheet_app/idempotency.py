@@ -0,0 +1,116 @@
+"""
+Idempotent form posts.
+
+Entry forms carry a hidden ``idempotency_key`` generated when the form is
+rendered. The ``idempotent`` view decorator claims the key in the cache with
+``cache.add`` before running the view; a successful response is then stored
+under the key for a few minutes, and any retry carrying the same key (a
+double tap, or a resubmit after a timeout) is answered from the cache
+without validating or writing anything. Failed attempts release the key so
+the user can correct the form and submit again. A retry that arrives while
+the first attempt is still running is not held in the worker: scripts get a
+409 with ``Retry-After`` and plain submits a redirect back to the page.
+
+Scripts post the same form and fall back to a plain submit with the same key
+when the request fails. A plain submit whose first attempt came from a script
+is sent back to the page with a redirect rather than the stored JSON.
+"""
+
+import functools
+import re
+import uuid
+
+from django import forms
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+
+FIELD_NAME = 'idempotency_key'
+RESPONSE_TTL = 10 * 60      # how long a stored response is replayed
+IN_FLIGHT_TTL = 60          # safety net if the first request dies mid-flight
+RETRY_AFTER = 1             # seconds a script should wait before retrying an in-flight key
+
+_PENDING = 'pending'
+_VALID_KEY = re.compile(r'^[A-Za-z0-9-]{8,64}$')
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def key_field():
+    """Hidden form field holding a fresh key for every unbound render."""
+    return forms.CharField(widget=forms.HiddenInput, required=False, initial=new_key)
+
+
+def _cache_key(request, key):
+    return f'timesheet:idem:{request.user.pk}:{request.path}:{key}'
+
+
+def _freeze(response):
+    return {
+        'status': response.status_code,
+        'content_type': response.get('Content-Type'),
+        'location': response.get('Location'),
+        'content': response.content,
+    }
+
+
+def _from_script(request):
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def _thaw(request, stored):
+    if (stored['content_type'] or '').startswith('application/json') and not _from_script(request):
+        # A full page submit can't show a fragment; the page itself shows the saved entry
+        response = HttpResponseRedirect(request.get_full_path())
+    else:
+        response = HttpResponse(stored['content'], status=stored['status'], content_type=stored['content_type'])
+        if stored['location']:
+            response['Location'] = stored['location']
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Replay the first successful response for POSTs that reuse an idempotency key."""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.POST.get(FIELD_NAME, '') if request.method == 'POST' else ''
+        if not _VALID_KEY.match(key) or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        cache_key = _cache_key(request, key)
+        if not cache.add(cache_key, _PENDING, timeout=IN_FLIGHT_TTL):
+            stored = cache.get(cache_key)
+            if stored == _PENDING:
+                if not _from_script(request):
+                    messages.warning(request, 'This submission is still being processed.')
+                    return HttpResponseRedirect(request.get_full_path())
+                response = JsonResponse({'errors': ['This submission is still being processed.']}, status=409)
+                response['Retry-After'] = str(RETRY_AFTER)
+                return response
+            if stored is not None:
+                return _thaw(request, stored)
+            # The first attempt failed and released the key: take it over
+            cache.add(cache_key, _PENDING, timeout=IN_FLIGHT_TTL)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+
+        # Redirects and fragment responses mean the write happened; a 200
+        # page render means the form was redisplayed with errors.
+        succeeded = response.status_code in (301, 302, 303) or (
+            response.status_code == 200 and response.get('Content-Type', '').startswith('application/json')
+        )
+        if succeeded and not getattr(response, 'streaming', False):
+            cache.set(cache_key, _freeze(response), timeout=RESPONSE_TTL)
+        else:
+            cache.delete(cache_key)
+        return response
+
+    return wrapper
@@ -0,0 +1,124 @@
+"""
+Client invoices built from timesheet entries.
+
+Line items are hours per day for each billed job, all read with one query
+grouped by (job, date) plus the archived years in range (see archive.py). Each invoice is numbered by a SHA-256 hash of what
+it bills, and its PDF lives in default storage under a hash that also covers
+the issue date printed on it, so an invoice whose entries have not changed is
+rendered at most once a day. Requests render missing PDFs in-process; the
+``generate_invoices`` command renders them in a process pool (pdf.py has no
+Django dependencies).
+"""
+
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from itertools import groupby
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import archive, pdf
+from .models import TimeEntry, worked_minutes_expression
+
+INVOICE_DIR = 'timesheet/invoices'
+# Bump when the PDF layout changes so cached documents are rendered again
+RENDER_VERSION = 1
+
+CENT = Decimal('0.01')
+
+
+def invoice_path(user_id, digest):
+    return f'{INVOICE_DIR}/{user_id}/{digest}.pdf'
+
+
+def _content_hash(invoice):
+    content = {key: value for key, value in invoice.items() if key not in ('hash', 'number', 'path')}
+    payload = json.dumps([RENDER_VERSION, content], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def build_invoices(user, jobs, start, end):
+    """
+    Return one invoice dict per job in ``jobs`` with entries between ``start`` and ``end``.
+
+    Jobs without an hourly rate are billed at zero so their hours still show.
+    """
+    jobs = {job.pk: job for job in jobs}
+    rows = TimeEntry.objects.filter(
+        user=user, job_id__in=list(jobs), date__range=[start, end]
+    ).order_by().values('job_id', 'date').annotate(
+        minutes=Sum(worked_minutes_expression()),
+        entries=Count('id'),
+    ).order_by('job_id', 'date')
+
+    minutes = {(row['job_id'], row['date']): row['minutes'] or 0 for row in rows}
+    years = list(archive.archived_years(user.pk, start, end))
+    for job_id in jobs:
+        if not any(str(job_id) in archived.minutes_by_job for archived in years):
+            continue
+        for day, day_minutes in archive.minutes_by_date(user.pk, start, end, years, job_id=job_id).items():
+            minutes[job_id, day] = minutes.get((job_id, day), 0) + day_minutes
+
+    billed_by = user.get_full_name() or user.username
+    invoices = []
+    for job_id, job_days in groupby(sorted(minutes), key=lambda key: key[0]):
+        job = jobs[job_id]
+        rate = job.hourly_rate or Decimal('0.00')
+        lines = []
+        for _, day in job_days:
+            hours = (Decimal(minutes[job_id, day]) / 60).quantize(CENT)
+            lines.append({'date': day, 'hours': hours, 'amount': (hours * rate).quantize(CENT)})
+
+        invoice = {
+            'user_id': user.pk,
+            'billed_by': billed_by,
+            'job_id': job_id,
+            'job': job.display_name(),
+            'address': job.address,
+            'rate': rate,
+            'start': start,
+            'end': end,
+            'lines': lines,
+            'total_hours': sum((line['hours'] for line in lines), Decimal('0.00')),
+            'total': sum((line['amount'] for line in lines), Decimal('0.00')),
+        }
+        # Numbered by what is billed, stored by what is printed, issue date included
+        invoice['number'] = f"INV-{start:%Y%m}-{_content_hash(invoice)[:8].upper()}"
+        invoice['issued'] = timezone.localdate()
+        invoice['hash'] = _content_hash(invoice)
+        invoice['path'] = invoice_path(user.pk, invoice['hash'])
+        invoices.append(invoice)
+    return invoices
+
+
+def pool_workers():
+    """Rendering processes for ``generate_invoices`` (``TIMESHEET_INVOICE_WORKERS``, default one per CPU)."""
+    return getattr(settings, 'TIMESHEET_INVOICE_WORKERS', None)
+
+
+def render_invoices(invoices, max_workers=1):
+    """
+    Make sure every invoice has a stored PDF; return how many were rendered.
+
+    Invoices already in storage are skipped. Missing ones are rendered in
+    this process unless ``max_workers`` asks for a process pool (``None``
+    for one per CPU), which only batch jobs should do: a web worker must
+    not fork.
+    """
+    pending = [invoice for invoice in invoices if not default_storage.exists(invoice['path'])]
+
+    if len(pending) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            documents = list(pool.map(pdf.render_invoice, pending, chunksize=4))
+    else:
+        documents = [pdf.render_invoice(invoice) for invoice in pending]
+
+    for invoice, document in zip(pending, documents):
+        if not default_storage.exists(invoice['path']):
+            default_storage.save(invoice['path'], ContentFile(document))
+    return len(pending)
@@ -0,0 +1,153 @@
+"""
+Leave balances maintained incrementally.
+
+Each user has one LeaveBalance row per kind of leave. Saving or deleting a
+time entry adds the change in minutes worked, times the kind's accrual rate,
+to ``accrued_minutes``; saving or deleting a LeaveRecord moves
+``taken_minutes``. Either is a single UPDATE (see signals.py), so reading a
+balance is one indexed read of the user's rows however long their history.
+
+Accrual rates are hours of leave earned per hour worked and come from
+``TIMESHEET_LEAVE_ACCRUAL``; a rate change applies from then on. Rows are
+built from the full history the first time a user needs them, and
+``rebuild_balances`` (or the ``rebuild_leave_balances`` command) recomputes
+them with the current rates. Entries moved to or from the archive keep
+their accrual, since archiving doesn't change what was worked.
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+
+from .models import ArchivedYear, LeaveBalance, LeaveRecord, TimeEntry, worked_minutes
+
+# Four weeks of annual and ten days of sick leave a year for full-time work
+DEFAULT_ACCRUAL = {
+    LeaveRecord.ANNUAL: 0.0769,
+    LeaveRecord.SICK: 0.0385,
+}
+
+_MINUTES = DecimalField(max_digits=14, decimal_places=4)
+
+
+def accrual_rates():
+    """``{kind: hours of leave per hour worked}`` for the kinds that accrue."""
+    rates = getattr(settings, 'TIMESHEET_LEAVE_ACCRUAL', DEFAULT_ACCRUAL)
+    return {kind: Decimal(str(rate)) for kind, rate in rates.items() if rate}
+
+
+def _adjust(user_id, field, minutes_by_kind):
+    """Add ``minutes_by_kind`` to ``field`` of the user's balances in one UPDATE."""
+    minutes_by_kind = {kind: minutes for kind, minutes in minutes_by_kind.items() if minutes}
+    if not minutes_by_kind:
+        return
+    change = Case(
+        *[When(kind=kind, then=Value(Decimal(minutes), output_field=_MINUTES))
+          for kind, minutes in minutes_by_kind.items()],
+        default=Value(Decimal(0), output_field=_MINUTES),
+    )
+    updated = LeaveBalance.objects.filter(user_id=user_id, kind__in=minutes_by_kind).update(
+        **{field: F(field) + change}
+    )
+    if updated < len(minutes_by_kind):
+        # First use: the history already includes this change
+        rebuild_balances(user_id)
+
+
+def worked_changed(user_id, minutes):
+    """Accrue (or, for negative ``minutes``, give back) leave for time worked."""
+    if minutes:
+        _adjust(user_id, 'accrued_minutes', {
+            kind: minutes * rate for kind, rate in accrual_rates().items()
+        })
+
+
+def taken_changed(user_id, kind, minutes):
+    _adjust(user_id, 'taken_minutes', {kind: minutes})
+
+
+def rebuild_balances(user_id):
+    """Recompute the user's balances from their whole history, archived years included."""
+    worked = TimeEntry.objects.filter(user_id=user_id).total_minutes()
+    worked += ArchivedYear.objects.filter(user_id=user_id).aggregate(minutes=Sum('minutes'))['minutes'] or 0
+    taken = dict(
+        LeaveRecord.objects.filter(user_id=user_id).order_by().values('kind')
+        .annotate(hours=Sum('hours')).values_list('kind', 'hours')
+    )
+    rates = accrual_rates()
+    balances = [
+        LeaveBalance(
+            user_id=user_id,
+            kind=kind,
+            accrued_minutes=worked * rates.get(kind, 0),
+            taken_minutes=taken.get(kind, 0) * 60,
+        )
+        for kind in sorted({*rates, *taken})
+    ]
+    LeaveBalance.objects.bulk_create(
+        balances,
+        update_conflicts=True,
+        unique_fields=['user', 'kind'],
+        update_fields=['accrued_minutes', 'taken_minutes'],
+    )
+    return balances
+
+
+def balances(user_id):
+    """The user's balances by kind, in display order."""
+    found = {balance.kind: balance for balance in LeaveBalance.objects.filter(user_id=user_id)}
+    if not found:
+        found = {balance.kind: balance for balance in rebuild_balances(user_id)}
+    return [found[kind] for kind, _ in LeaveRecord.KIND_CHOICES if kind in found]
+
+
+def _entry_minutes(entry):
+    return worked_minutes(entry.start_time, entry.end_time, entry.break_duration)
+
+
+def entry_saved(entry, created):
+    """Move the accrual of a saved time entry by the change in its minutes."""
+    minutes = _entry_minutes(entry)
+    if created:
+        worked_changed(entry.user_id, minutes)
+    elif hasattr(entry, '_loaded_minutes'):
+        old_user_id, old_minutes = entry._loaded_minutes
+        if old_user_id != entry.user_id:
+            worked_changed(old_user_id, -old_minutes)
+            worked_changed(entry.user_id, minutes)
+        else:
+            worked_changed(entry.user_id, minutes - old_minutes)
+    else:
+        # Saved without knowing what it was before
+        rebuild_balances(entry.user_id)
+    entry._loaded_minutes = (entry.user_id, minutes)
+
+
+def entry_deleted(entry):
+    user_id, minutes = getattr(entry, '_loaded_minutes', (entry.user_id, _entry_minutes(entry)))
+    worked_changed(user_id, -minutes)
+
+
+def record_saved(record, created):
+    """Move taken leave by the change in a saved record."""
+    minutes = Decimal(record.hours) * 60
+    if created:
+        taken_changed(record.user_id, record.kind, minutes)
+    elif hasattr(record, '_loaded_minutes'):
+        old_user_id, old_kind, old_minutes = record._loaded_minutes
+        if (old_user_id, old_kind) != (record.user_id, record.kind):
+            taken_changed(old_user_id, old_kind, -old_minutes)
+            taken_changed(record.user_id, record.kind, minutes)
+        else:
+            taken_changed(record.user_id, record.kind, minutes - old_minutes)
+    else:
+        rebuild_balances(record.user_id)
+    record._loaded_minutes = (record.user_id, record.kind, minutes)
+
+
+def record_deleted(record):
+    user_id, kind, minutes = getattr(
+        record, '_loaded_minutes', (record.user_id, record.kind, Decimal(record.hours) * 60)
+    )
+    taken_changed(user_id, kind, -minutes)
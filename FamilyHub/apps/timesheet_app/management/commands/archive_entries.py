@@ -0,0 +1,94 @@
+"""
+Django management command to move closed years of time entries to cold storage.
+
+Usage:
+    python manage.py archive_entries
+    python manage.py archive_entries --through 2019 --user alice
+    python manage.py archive_entries --dry-run
+    python manage.py archive_entries --restore 2019 --user alice
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+from timesheet_app import archive
+from timesheet_app.models import ArchivedYear, TimeEntry
+
+
+class Command(BaseCommand):
+    help = 'Archive closed years of time entries to compressed files, or restore one'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--through',
+            type=int,
+            help='Last year to archive (default: all but the current year and '
+                 'TIMESHEET_ARCHIVE_KEEP_YEARS before it)'
+        )
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Only archive this username'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List what would be archived without changing anything'
+        )
+        parser.add_argument(
+            '--restore',
+            type=int,
+            metavar='YEAR',
+            help='Move an archived year back into the table (requires --user)'
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']}")
+
+        if options['restore']:
+            self.restore(user, options['restore'])
+            return
+
+        last_year = archive.last_archivable_year(timezone.localdate())
+        if options['through'] is not None:
+            if options['through'] > last_year:
+                raise CommandError(f'Only years up to {last_year} are closed')
+            last_year = options['through']
+
+        entries = TimeEntry.objects.filter(date__year__lte=last_year)
+        if user:
+            entries = entries.filter(user=user)
+        batches = entries.order_by().values('user_id', year=ExtractYear('date')).annotate(
+            entries=Count('id')
+        ).order_by('user_id', 'year')
+
+        archived = 0
+        for batch in batches:
+            if options['dry_run']:
+                self.stdout.write(f"user {batch['user_id']} {batch['year']}: {batch['entries']} entries")
+                continue
+            result = archive.archive_year(batch['user_id'], batch['year'])
+            if result:
+                archived += batch['entries']
+                self.stdout.write(
+                    f"user {batch['user_id']} {batch['year']}: {result.entry_count} entries in {result.path}"
+                )
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Archived {archived} entries through {last_year}'))
+
+    def restore(self, user, year):
+        if user is None:
+            raise CommandError('--restore needs --user')
+        archived = ArchivedYear.objects.filter(user=user, year=year).first()
+        if archived is None:
+            raise CommandError(f'{year} is not archived for {user.username}')
+        restored = archive.restore_year(archived)
+        self.stdout.write(self.style.SUCCESS(f'Restored {restored} entries for {user.username} in {year}'))
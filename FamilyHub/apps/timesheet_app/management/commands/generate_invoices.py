@@ -0,0 +1,69 @@
+"""
+Django management command to render a month's invoices for billed jobs.
+
+Usage:
+    python manage.py generate_invoices
+    python manage.py generate_invoices --month 2025-01
+    python manage.py generate_invoices --month 2025-01 --user alice --workers 4
+"""
+
+import calendar
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from timesheet_app import invoicing
+from timesheet_app.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Render invoice PDFs for every job with an hourly rate'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--month',
+            type=str,
+            help='Month to invoice as YYYY-MM (defaults to last month)'
+        )
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Only invoice this username'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Number of rendering processes (default TIMESHEET_INVOICE_WORKERS, or one per CPU)'
+        )
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                start = datetime.strptime(options['month'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--month must be YYYY-MM')
+        else:
+            start = (timezone.localdate().replace(day=1) - timedelta(days=1)).replace(day=1)
+        end = start.replace(day=calendar.monthrange(start.year, start.month)[1])
+
+        jobs = Job.objects.filter(hourly_rate__isnull=False).select_related('user').order_by('user_id')
+        if options['user']:
+            if not User.objects.filter(username=options['user']).exists():
+                raise CommandError(f"No user named {options['user']}")
+            jobs = jobs.filter(user__username=options['user'])
+
+        by_user = {}
+        for job in jobs:
+            by_user.setdefault(job.user, []).append(job)
+
+        invoices = []
+        for user, user_jobs in by_user.items():
+            invoices.extend(invoicing.build_invoices(user, user_jobs, start, end))
+
+        rendered = invoicing.render_invoices(invoices, max_workers=options['workers'] or invoicing.pool_workers())
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(invoices)} invoice(s) for {start:%B %Y}: '
+            f'{rendered} rendered, {len(invoices) - rendered} unchanged'
+        ))
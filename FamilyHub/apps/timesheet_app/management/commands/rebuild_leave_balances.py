@@ -0,0 +1,42 @@
+"""
+Django management command to recompute leave balances from full history.
+
+Balances are normally kept current as entries and leave records change; run
+this after changing TIMESHEET_LEAVE_ACCRUAL to apply the new rates to past
+hours as well.
+
+Usage:
+    python manage.py rebuild_leave_balances
+    python manage.py rebuild_leave_balances --user alice
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from timesheet_app import leave
+
+
+class Command(BaseCommand):
+    help = 'Recompute leave balances from all recorded hours and leave'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Only rebuild this username'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"No user named {options['user']}")
+
+        rebuilt = 0
+        for user in users.only('pk', 'username'):
+            for balance in leave.rebuild_balances(user.pk):
+                self.stdout.write(f'{user.username} {balance.kind}: {balance.balance_hours()}h')
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt leave balances for {rebuilt} user(s)'))
@@ -0,0 +1,47 @@
+"""
+Django management command to write pending admin CSV exports.
+
+Exports normally run in a thread started by the admin action; this picks up
+any that never started (worker restarts, or TIMESHEET_EXPORT_IN_BACKGROUND
+switched off) and any whose writer stopped making progress mid-export (see
+TIMESHEET_EXPORT_STALE_SECONDS). Run it from cron.
+
+Usage:
+    python manage.py run_exports
+    python manage.py run_exports --limit 5
+"""
+
+from django.core.management.base import BaseCommand
+
+from timesheet_app import exports
+from timesheet_app.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Write pending timesheet CSV exports and restart stalled ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Stop after this many exports'
+        )
+
+    def handle(self, *args, **options):
+        pending = exports.claimable().order_by('created_at').values_list('pk', flat=True)
+        if options['limit']:
+            pending = pending[:options['limit']]
+
+        done = failed = 0
+        for export_id in list(pending):
+            export = exports.run_export(export_id)
+            if export is None:
+                continue  # claimed by another worker meanwhile
+            if export.status == ExportJob.DONE:
+                done += 1
+                self.stdout.write(f'#{export.pk}: {export.row_count} rows in {export.path}')
+            else:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f'#{export.pk} failed: {export.error}'))
+
+        self.stdout.write(self.style.SUCCESS(f'{done} export(s) written, {failed} failed'))
@@ -0,0 +1,89 @@
+"""
+Django management command to manage yearly TimeEntry partitions (PostgreSQL only).
+
+Usage:
+    python manage.py timesheet_partitions status
+    python manage.py timesheet_partitions convert --dry-run
+    python manage.py timesheet_partitions convert
+    python manage.py timesheet_partitions ahead --years 3
+    python manage.py timesheet_partitions detach 2015
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from timesheet_app import partitioning
+
+
+class Command(BaseCommand):
+    help = 'Manage yearly range partitions of the time entry table on PostgreSQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['status', 'convert', 'ahead', 'detach'],
+            help='status: list partitions; convert: partition the table; '
+                 'ahead: create upcoming years; detach: split a year off into its own table'
+        )
+        parser.add_argument(
+            'year',
+            nargs='?',
+            type=int,
+            help='Year to detach'
+        )
+        parser.add_argument(
+            '--years',
+            type=int,
+            help='Future years to create partitions for (default TIMESHEET_PARTITION_AHEAD_YEARS)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='convert: print the SQL it would run without changing anything'
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Database alias to operate on'
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        action = options['action']
+
+        try:
+            if action == 'status':
+                self.show_status(connection)
+            elif action == 'convert':
+                statements = partitioning.convert(connection, ahead=options['years'], dry_run=options['dry_run'])
+                if options['dry_run']:
+                    for statement in statements:
+                        self.stdout.write(f'{statement};')
+                    return
+                created = sum(1 for statement in statements if ' FOR VALUES FROM ' in statement)
+                self.stdout.write(self.style.SUCCESS(
+                    f'{partitioning.TABLE} is now partitioned by year ({created} yearly partitions)'
+                ))
+            elif action == 'ahead':
+                created = partitioning.create_ahead(options['years'], connection)
+                if created:
+                    years = ', '.join(str(year) for year in created)
+                    self.stdout.write(self.style.SUCCESS(f'Created partitions for {years}'))
+                else:
+                    self.stdout.write('All upcoming partitions already exist')
+            elif action == 'detach':
+                if options['year'] is None:
+                    raise CommandError('detach needs a year')
+                name = partitioning.detach_partition(options['year'], connection)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Detached {name}; it can now be archived or dropped independently'
+                ))
+        except partitioning.PartitioningError as e:
+            raise CommandError(str(e))
+
+    def show_status(self, connection):
+        if not partitioning.is_partitioned(connection):
+            self.stdout.write(f'{partitioning.TABLE} is not partitioned')
+            return
+        for name, bound, rows in partitioning.partitions(connection):
+            self.stdout.write(f'{name:<40} {bound:<60} ~{max(rows, 0)} rows')
@@ -0,0 +1,67 @@
+"""
+Merging duplicate jobs.
+
+``merge_jobs`` folds any number of a user's jobs into one target in a single
+transaction with a fixed number of queries, however many entries are moved:
+the jobs are locked, every entry is repointed with one UPDATE, tombstones for
+the removed jobs are written with one INSERT and the jobs are deleted with one
+DELETE. Nothing references a job once its entries have moved, so the delete
+skips the collector and model signals; the work those signals would do
+(cache generations, tombstones) is done here instead. Archived years that
+hold entries of the removed jobs are rewritten as well, one file each.
+"""
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import archive, caching, periods
+from .models import Job, TimeEntry, Tombstone
+
+
+class MergeError(Exception):
+    pass
+
+
+def merge_jobs(target, sources):
+    """
+    Move every entry of ``sources`` to ``target`` and delete ``sources``.
+
+    All jobs must belong to the same user, and no entry of ``sources`` may be
+    in a closed period. Returns the number of entries moved.
+    """
+    source_ids = sorted({job.pk for job in sources} - {target.pk})
+    if not source_ids:
+        raise MergeError('Pick at least one job other than the target.')
+
+    with transaction.atomic():
+        locked = list(
+            Job.objects.select_for_update().filter(pk__in=[target.pk, *source_ids])
+            .order_by('pk').values_list('pk', 'user_id')
+        )
+        if len(locked) != len(source_ids) + 1 or {user_id for _, user_id in locked} != {target.user_id}:
+            raise MergeError("Jobs can only be merged with the same user's other jobs.")
+        # Summaries of closed periods are frozen with their per-job totals
+        try:
+            periods.check_jobs_open(target.user_id, source_ids)
+        except periods.PeriodClosed as exc:
+            raise MergeError(exc.message)
+
+        moved = TimeEntry.objects.filter(job_id__in=source_ids).update(
+            job=target, updated_at=timezone.now(), version=F('version') + 1
+        )
+        Tombstone.objects.bulk_create([
+            Tombstone(user_id=target.user_id, model=Tombstone.JOB, object_id=job_id)
+            for job_id in source_ids
+        ])
+        removed = Job.objects.filter(pk__in=source_ids)
+        removed._raw_delete(removed.db)
+
+        # Archived entries of the removed jobs move to the target too
+        archive.remap_jobs(target.user_id, source_ids, target.pk)
+
+        user_id = target.user_id
+        transaction.on_commit(lambda: caching.bump_generation(user_id, caching.JOBS))
+        transaction.on_commit(lambda: caching.bump_generation(user_id, caching.ENTRIES))
+    return moved
+
@@ -0,0 +1,26 @@
+"""
+Request middleware for the timesheet app.
+
+Added to MIDDLEWARE (after AuthenticationMiddleware) in the base settings
+when the app is installed.
+"""
+
+from django.utils import timezone
+
+from .timezones import user_timezone
+
+
+class UserTimezoneMiddleware:
+    """Activate the signed-in user's timezone for the rest of the request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            timezone.activate(user_timezone(user.pk))
+        try:
+            return self.get_response(request)
+        finally:
+            timezone.deactivate()
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS timesheet_job_name_trgm ON timesheet_app_job USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS timesheet_job_address_trgm ON timesheet_app_job USING gin (address gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS timesheet_job_description_trgm ON timesheet_app_job USING gin (description gin_trgm_ops)',
+]
+
+REVERSE = [
+    'DROP INDEX IF EXISTS timesheet_job_name_trgm',
+    'DROP INDEX IF EXISTS timesheet_job_address_trgm',
+    'DROP INDEX IF EXISTS timesheet_job_description_trgm',
+]
+
+
+def _postgres_only(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+    """
+    pg_trgm GIN indexes for fuzzy job search.
+
+    The SQLite FTS5 equivalent is kept in sync by timesheet_app.search on
+    post_migrate, because SQLite table rebuilds drop its triggers.
+    """
+
+    dependencies = [
+        ('timesheet_app', '0002_job_description_job_updated_at_alter_timeentry_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(_postgres_only(FORWARD), _postgres_only(REVERSE)),
+    ]
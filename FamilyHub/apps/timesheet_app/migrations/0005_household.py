@@ -0,0 +1,45 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet_app', '0004_sync_indexes_tombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Household',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HouseholdMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('owner', 'Owner'), ('member', 'Member')], default='member', max_length=10)),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('household', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='timesheet_app.household')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='timesheet_household_membership', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['household', 'user__username'],
+            },
+        ),
+        migrations.AddField(
+            model_name='household',
+            name='members',
+            field=models.ManyToManyField(related_name='timesheet_households', through='timesheet_app.HouseholdMember', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
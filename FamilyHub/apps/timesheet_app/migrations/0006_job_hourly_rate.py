@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet_app', '0005_household'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='hourly_rate',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Rate billed to the client per hour; leave blank for unbilled jobs', max_digits=8, null=True),
+        ),
+    ]
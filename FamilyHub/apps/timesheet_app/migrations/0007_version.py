@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet_app', '0006_job_hourly_rate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='timeentry',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BRIN_FORWARD = [
+    'CREATE INDEX IF NOT EXISTS timesheet_entry_date_brin ON timesheet_app_timeentry USING brin (date)',
+]
+
+BRIN_REVERSE = [
+    'DROP INDEX IF EXISTS timesheet_entry_date_brin',
+]
+
+
+def _postgres_only(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+    """
+    Deliberate index set for TimeEntry.
+
+    (job, date) replaces the single-column job index; the user index is
+    covered by the (user, date, start_time) unique constraint. On PostgreSQL
+    a BRIN index on date serves cross-user date ranges on large tables at a
+    tiny fraction of a btree's size, since entries are mostly appended in
+    date order.
+    """
+
+    dependencies = [
+        ('timesheet_app', '0007_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timeentry',
+            index=models.Index(fields=['job', 'date'], name='timesheet_entry_job_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='timeentry',
+            name='job',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='time_entries', to='timesheet_app.job'),
+        ),
+        migrations.AlterField(
+            model_name='timeentry',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='time_entries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(_postgres_only(BRIN_FORWARD), _postgres_only(BRIN_REVERSE)),
+    ]
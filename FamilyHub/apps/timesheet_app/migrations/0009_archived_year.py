@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet_app', '0008_entry_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('path', models.CharField(help_text='Compressed column file in default storage', max_length=255)),
+                ('entry_count', models.PositiveIntegerField()),
+                ('minutes', models.PositiveIntegerField(help_text='Total minutes worked in the year')),
+                ('days_worked', models.PositiveSmallIntegerField()),
+                ('minutes_by_job', models.JSONField(default=dict, help_text='Job id to minutes; entries without a job under ""')),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timesheet_archived_years', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', 'year'],
+                'unique_together': {('user', 'year')},
+            },
+        ),
+    ]
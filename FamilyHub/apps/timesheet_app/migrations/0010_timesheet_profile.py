@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:22
+
+import django.db.models.deletion
+import timesheet_app.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet_app', '0009_archived_year'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimesheetProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timezone', models.CharField(blank=True, help_text='IANA timezone used for "today" and week boundaries; blank uses the site default', max_length=64, validators=[timesheet_app.models.validate_timezone])),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='timesheet_profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet_app', '0010_timesheet_profile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timeentry',
+            index=models.Index(fields=['date', 'start_time', 'id'], name='timesheet_entry_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet_app', '0012_export_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClosedPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('week', 'Week'), ('month', 'Month')], max_length=10)),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timesheet_closed_periods', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', '-start'],
+                'unique_together': {('user', 'start', 'end')},
+            },
+        ),
+    ]
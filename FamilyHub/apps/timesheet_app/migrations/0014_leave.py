@@ -0,0 +1,48 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet_app', '0013_closed_period'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('annual', 'Annual leave'), ('sick', 'Sick leave'), ('unpaid', 'Unpaid leave')], max_length=10)),
+                ('accrued_minutes', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('taken_minutes', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timesheet_leave_balances', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', 'kind'],
+                'unique_together': {('user', 'kind')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaveRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('annual', 'Annual leave'), ('sick', 'Sick leave'), ('unpaid', 'Unpaid leave')], default='annual', max_length=10)),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('hours', models.DecimalField(decimal_places=2, help_text='Hours of leave taken over the whole period', max_digits=6)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='timesheet_leave', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-start'],
+                'indexes': [models.Index(fields=['user', 'start'], name='timesheet_leave_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet_app', '0014_leave'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='household',
+            name='pending_weeks',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Members' weeks waiting for review, kept by approvals.py"),
+        ),
+        migrations.CreateModel(
+            name='WeekApproval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField(help_text='Monday of the week')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')], default='pending', max_length=10)),
+                ('note', models.CharField(blank=True, help_text="Reviewer's note, e.g. why the week was rejected", max_length=200)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('household', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='week_approvals', to='timesheet_app.household')),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timesheet_week_approvals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['week_start', 'user'],
+                'indexes': [models.Index(fields=['household', 'status', 'week_start'], name='timesheet_approval_review_idx')],
+                'unique_together': {('user', 'week_start')},
+            },
+        ),
+    ]
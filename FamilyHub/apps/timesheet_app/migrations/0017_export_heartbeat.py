@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheet_app', '0016_household_invitation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last progress from the writer; a stale one lets run_exports take over', null=True),
+        ),
+    ]
@@ -1,15 +1,179 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import Case, Exists, F, OuterRef, Sum, Value, When
+from django.db.models.functions import ExtractHour, ExtractMinute, Greatest
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from datetime import datetime, timedelta
 from decimal import Decimal
+import zoneinfo
 
 
-class Job(models.Model):
+def _minute_of_day(field):
+    return ExtractHour(field) * 60 + ExtractMinute(field)
+
+
+def worked_minutes_expression():
+    """
+    SQL expression for minutes worked by a TimeEntry row.
+
+    Mirrors TimeEntry.total_hours(): overnight shifts wrap past midnight,
+    the break is subtracted and the result is never negative.
+    """
+    start = _minute_of_day('start_time')
+    end = _minute_of_day('end_time')
+    span = Case(
+        When(end_time__lte=F('start_time'), then=end - start + 1440),
+        default=end - start,
+        output_field=models.IntegerField(),
+    )
+    return Greatest(span - F('break_duration'), Value(0), output_field=models.IntegerField())
+
+
+def worked_minutes(start_time, end_time, break_duration):
+    """Minutes worked for one entry's values; the Python twin of worked_minutes_expression()."""
+    start = start_time.hour * 60 + start_time.minute
+    end = end_time.hour * 60 + end_time.minute
+    span = end - start if end > start else end - start + 1440
+    return max(span - break_duration, 0)
+
+
+class TimeEntryQuerySet(models.QuerySet):
+    """Aggregations computed in the database rather than per instance."""
+
+    def with_minutes(self):
+        """Annotate each entry with ``worked_minutes``."""
+        return self.annotate(worked_minutes=worked_minutes_expression())
+
+    def minutes_by_date(self):
+        """One ``{'date', 'minutes'}`` row per day, ordered by date."""
+        return (
+            self.order_by()
+            .values('date')
+            .annotate(minutes=Sum(worked_minutes_expression()))
+            .order_by('date')
+        )
+
+    def total_minutes(self):
+        """Total minutes worked across the queryset."""
+        return self.aggregate(minutes=Sum(worked_minutes_expression()))['minutes'] or 0
+
+    def with_closed(self):
+        """Annotate each entry with ``in_closed_period`` (see ClosedPeriod)."""
+        return self.annotate(in_closed_period=Exists(ClosedPeriod.objects.filter(
+            user=OuterRef('user'), start__lte=OuterRef('date'), end__gte=OuterRef('date')
+        )))
+
+
+class VersionedModel(models.Model):
+    """
+    Adds an edit counter for optimistic concurrency (see concurrency.py).
+
+    Plain ``save()`` calls bump it too, so edits made through the admin or
+    scripts are still seen as conflicts by clients holding an older version.
+    The new version is set in Python and written by the save's own UPDATE,
+    on the condition that the row still holds the version this instance
+    read. Only when another save got in between does the write fall back to
+    incrementing in SQL and reading the result back.
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        self._saving_from = self.version
+        self._version_unknown = False
+        self.version = self._saving_from + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self.version = self._saving_from
+            raise
+        finally:
+            del self._saving_from
+        if self._version_unknown:
+            self.refresh_from_db(fields=['version'])
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, '_saving_from', None)
+        if expected is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if super()._do_update(base_qs.filter(version=expected), using, pk_val, values, update_fields, forced_update):
+            return True
+        # Saved elsewhere since this instance was read: the write still wins, past their version
+        values = [
+            (field, model, F('version') + 1 if field.attname == 'version' else value)
+            for field, model, value in values
+        ]
+        self._version_unknown = super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        return self._version_unknown
+
+
+class StoredValuesModel(models.Model):
+    """
+    Remembers what a row holds in the database, for signal handlers that
+    apply the difference a save or delete makes (see leave.py).
+
+    Loading or refreshing an instance records ``stored_fields``; ``save()``
+    and ``delete()`` read them again under a row lock in the same transaction
+    as the write, so a concurrent change never leaves them stale.
+    Subclasses turn those values into attributes in ``remember_stored()``.
+    """
+    stored_fields = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_stored(instance.__dict__)
+        return instance
+
+    def remember_stored(self, values):
+        raise NotImplementedError
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or not set(fields).isdisjoint(self.stored_fields):
+            self.remember_stored(self.__dict__)
+
+    def _lock_stored(self, using):
+        stored = (
+            type(self)._base_manager.using(using).select_for_update()
+            .filter(pk=self.pk).values(*self.stored_fields).first()
+        )
+        if stored is not None:
+            self.remember_stored(stored)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            self._lock_stored(using)
+            super().save(*args, **kwargs)
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            self._lock_stored(using)
+            return super().delete(using=using, keep_parents=keep_parents)
+
+
+class Job(VersionedModel):
     """Model representing a job/work location for timesheet entries."""
     name = models.CharField(max_length=100, blank=True)
     address = models.CharField(max_length=200, blank=True)
     description = models.TextField(blank=True, help_text="Job description or notes")
+    hourly_rate = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, blank=True,
+        help_text="Rate billed to the client per hour; leave blank for unbilled jobs"
+    )
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -17,6 +181,10 @@ class Job(models.Model):
     class Meta:
         ordering = ['name', 'address']
         unique_together = ['user', 'name', 'address']
+        indexes = [
+            # Delta sync reads changes in (updated_at, id) order per user
+            models.Index(fields=['user', 'updated_at', 'id'], name='timesheet_job_user_sync_idx'),
+        ]
 
     def clean(self):
         """Validate that either name or address is provided."""
@@ -42,7 +210,7 @@ class Job(models.Model):
         return self.display_name()
 
 
-class TimeEntry(models.Model):
+class TimeEntry(StoredValuesModel, VersionedModel):
     """Model representing a time entry for work tracking."""
     
     BREAK_CHOICES = [
@@ -51,13 +219,16 @@ class TimeEntry(models.Model):
         (60, '1 hour'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='time_entries')
+    # Both foreign keys lead composite indexes (see Meta), so their own
+    # single-column indexes would only slow down writes
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='time_entries', db_index=False)
     job = models.ForeignKey(
         Job, 
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
-        related_name='time_entries'
+        related_name='time_entries',
+        db_index=False
     )
     date = models.DateField()
     start_time = models.TimeField()
@@ -66,14 +237,40 @@ class TimeEntry(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TimeEntryQuerySet.as_manager()
+    stored_fields = ('user_id', 'date', 'start_time', 'end_time', 'break_duration')
+
     class Meta:
         ordering = ['-date', '-start_time']
+        # Also the index for per-user date lookups and ranges (user, date, start_time)
         unique_together = ['user', 'date', 'start_time']
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='timesheet_entry_user_sync_idx'),
+            # Per-job rollups, entry counts and SET_NULL on job delete
+            models.Index(fields=['job', 'date'], name='timesheet_entry_job_date_idx'),
+            # Admin changelist across all users, read backwards for (-date, -start_time, -pk)
+            models.Index(fields=['date', 'start_time', 'id'], name='timesheet_entry_recent_idx'),
+        ]
+
+    def remember_stored(self, values):
+        # The stored date, so moving an entry out of a closed period is caught too
+        self._loaded_date = values.get('date')
+        # The stored hours, so leave balances can be moved by the difference (see leave.py)
+        if all(values.get(name) is not None for name in ('user_id', 'start_time', 'end_time', 'break_duration')):
+            self._loaded_minutes = (
+                values['user_id'],
+                worked_minutes(values['start_time'], values['end_time'], values['break_duration']),
+            )
 
     def clean(self):
         """Validate time entry for overlaps and logical consistency."""
         super().clean()
         
+        # Entries in a closed pay period are frozen
+        if self.user_id and self.date:
+            from .periods import check_open
+            check_open(self.user_id, self.date, getattr(self, '_loaded_date', None))
+        
         # Ensure end time is after start time
         if self.start_time and self.end_time and self.start_time >= self.end_time:
             raise ValidationError('End time must be after start time.')
@@ -136,3 +333,317 @@ class TimeEntry(models.Model):
     def __str__(self):
         job_name = self.job.display_name() if self.job else "No Job Assigned"
         return f"{self.user.username} - {job_name} - {self.date} ({self.total_hours()}h)"
+
+
+class Tombstone(models.Model):
+    """Record of a deleted Job or TimeEntry so sync clients can drop their copy."""
+
+    JOB = 'job'
+    TIME_ENTRY = 'entry'
+    MODEL_CHOICES = [
+        (JOB, 'Job'),
+        (TIME_ENTRY, 'Time entry'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timesheet_tombstones')
+    model = models.CharField(max_length=10, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'id'], name='timesheet_tomb_user_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_model_display()} #{self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
+
+class Household(models.Model):
+    """A family whose members' timesheets can be viewed together."""
+    name = models.CharField(max_length=100)
+    members = models.ManyToManyField(User, through='HouseholdMember', related_name='timesheet_households')
+    pending_weeks = models.PositiveIntegerField(
+        default=0, editable=False, help_text="Members' weeks waiting for review, kept by approvals.py"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class HouseholdMember(models.Model):
+    """Membership of a user in a household; a user belongs to at most one."""
+
+    OWNER = 'owner'
+    MEMBER = 'member'
+    ROLE_CHOICES = [
+        (OWNER, 'Owner'),
+        (MEMBER, 'Member'),
+    ]
+
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='memberships')
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='timesheet_household_membership')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default=MEMBER)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['household', 'user__username']
+
+    def __str__(self):
+        return f"{self.user.username} in {self.household.name} ({self.get_role_display()})"
+
+
+class HouseholdInvitation(models.Model):
+    """
+    An owner's invitation for a user to join their household.
+
+    Members' hours are visible to the whole household and their weeks are
+    reviewed by the owner, so nobody joins until they accept.
+    """
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='invitations')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timesheet_household_invitations')
+    invited_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        unique_together = ['household', 'user']
+
+    def __str__(self):
+        return f"{self.user.username} invited to {self.household.name}"
+
+
+class WeekApproval(models.Model):
+    """
+    Review state of a household member's week of time entries (see approvals.py).
+
+    A row appears, pending, when a member first records time in a week, and
+    goes back to pending whenever the week changes after it was reviewed.
+    """
+
+    PENDING = 'pending'
+    APPROVED = 'approved'
+    REJECTED = 'rejected'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (APPROVED, 'Approved'),
+        (REJECTED, 'Rejected'),
+    ]
+
+    household = models.ForeignKey(Household, on_delete=models.CASCADE, related_name='week_approvals')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timesheet_week_approvals')
+    week_start = models.DateField(help_text="Monday of the week")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    note = models.CharField(max_length=200, blank=True, help_text="Reviewer's note, e.g. why the week was rejected")
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['week_start', 'user']
+        unique_together = ['user', 'week_start']
+        indexes = [
+            # The review screen: a household's pending weeks, oldest first
+            models.Index(fields=['household', 'status', 'week_start'], name='timesheet_approval_review_idx'),
+        ]
+
+    def week_end(self):
+        return self.week_start + timedelta(days=6)
+
+    def __str__(self):
+        return f"{self.user.username} week of {self.week_start} ({self.get_status_display()})"
+
+
+class ArchivedYear(models.Model):
+    """
+    A closed year of a user's time entries moved to cold storage (see archive.py).
+
+    The totals are kept here so yearly rollups never need to open the file.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timesheet_archived_years')
+    year = models.PositiveSmallIntegerField()
+    path = models.CharField(max_length=255, help_text="Compressed column file in default storage")
+    entry_count = models.PositiveIntegerField()
+    minutes = models.PositiveIntegerField(help_text="Total minutes worked in the year")
+    days_worked = models.PositiveSmallIntegerField()
+    minutes_by_job = models.JSONField(default=dict, help_text="Job id to minutes; entries without a job under \"\"")
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['user', 'year']
+        unique_together = ['user', 'year']
+
+    def total_hours(self):
+        return Decimal(self.minutes / 60).quantize(Decimal('0.01'))
+
+    def __str__(self):
+        return f"{self.user.username} {self.year} ({self.entry_count} entries archived)"
+
+
+class ClosedPeriod(models.Model):
+    """
+    A week or month of a user's timesheet closed for payroll (see periods.py).
+
+    Entries dated inside it can no longer be added, edited or deleted, so its
+    summaries are cached for good under the period's id and ``closed_at``.
+    """
+    WEEK = 'week'
+    MONTH = 'month'
+    KIND_CHOICES = [
+        (WEEK, 'Week'),
+        (MONTH, 'Month'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timesheet_closed_periods')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    start = models.DateField()
+    end = models.DateField()
+    closed_at = models.DateTimeField(auto_now_add=True)
+    closed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        ordering = ['user', '-start']
+        unique_together = ['user', 'start', 'end']
+
+    def clean(self):
+        super().clean()
+        if self.start and self.end and self.end < self.start:
+            raise ValidationError('The period must end on or after its start.')
+
+    def __str__(self):
+        return f"{self.user.username} {self.get_kind_display().lower()} {self.start} - {self.end}"
+
+
+class LeaveRecord(StoredValuesModel):
+    """Leave or an absence taken by a user; balances are kept in LeaveBalance (see leave.py)."""
+
+    ANNUAL = 'annual'
+    SICK = 'sick'
+    UNPAID = 'unpaid'
+    KIND_CHOICES = [
+        (ANNUAL, 'Annual leave'),
+        (SICK, 'Sick leave'),
+        (UNPAID, 'Unpaid leave'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timesheet_leave', db_index=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=ANNUAL)
+    start = models.DateField()
+    end = models.DateField()
+    hours = models.DecimalField(max_digits=6, decimal_places=2, help_text="Hours of leave taken over the whole period")
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-start']
+        indexes = [
+            models.Index(fields=['user', 'start'], name='timesheet_leave_user_idx'),
+        ]
+
+    stored_fields = ('user_id', 'kind', 'hours')
+
+    def remember_stored(self, values):
+        # The stored values, so balances can be moved by the difference (see leave.py)
+        if all(values.get(name) is not None for name in self.stored_fields):
+            self._loaded_minutes = (values['user_id'], values['kind'], values['hours'] * 60)
+
+    def clean(self):
+        super().clean()
+        if self.start and self.end and self.end < self.start:
+            raise ValidationError('Leave must end on or after the day it starts.')
+        if self.hours is not None and self.hours <= 0:
+            raise ValidationError('Enter the hours of leave taken.')
+
+    def __str__(self):
+        return f"{self.user.username} {self.get_kind_display().lower()} {self.start} - {self.end} ({self.hours}h)"
+
+
+class LeaveBalance(models.Model):
+    """
+    A user's running leave balance of one kind, kept up to date by leave.py.
+
+    Accrual is added as entries are saved and deleted, and taken leave as
+    records are, so reading a balance never looks at the history.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timesheet_leave_balances')
+    kind = models.CharField(max_length=10, choices=LeaveRecord.KIND_CHOICES)
+    accrued_minutes = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    taken_minutes = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+
+    class Meta:
+        ordering = ['user', 'kind']
+        unique_together = ['user', 'kind']
+
+    def balance_hours(self):
+        return ((self.accrued_minutes - self.taken_minutes) / 60).quantize(Decimal('0.01'))
+
+    def __str__(self):
+        return f"{self.user.username} {self.get_kind_display().lower()}: {self.balance_hours()}h"
+
+
+def validate_timezone(value):
+    """Accept blank (the site default) or any IANA zone name."""
+    if value and value not in zoneinfo.available_timezones():
+        raise ValidationError(f"Unknown timezone: {value}")
+
+
+class TimesheetProfile(models.Model):
+    """Per-user timesheet preferences."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='timesheet_profile')
+    timezone = models.CharField(
+        max_length=64, blank=True, validators=[validate_timezone],
+        help_text="IANA timezone used for \"today\" and week boundaries; blank uses the site default"
+    )
+
+    def __str__(self):
+        return f"{self.user.username} ({self.timezone or 'default timezone'})"
+
+
+class ExportJob(models.Model):
+    """A CSV export of selected jobs or entries, written in the background (see exports.py)."""
+
+    JOBS = 'job'
+    ENTRIES = 'entry'
+    MODEL_CHOICES = [
+        (JOBS, 'Jobs'),
+        (ENTRIES, 'Time entries'),
+    ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timesheet_exports')
+    model = models.CharField(max_length=10, choices=MODEL_CHOICES)
+    object_ids = models.JSONField(default=list, help_text="Primary keys of the selected rows")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    row_count = models.PositiveIntegerField(default=0)
+    path = models.CharField(max_length=255, blank=True, help_text="CSV file in default storage")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(
+        null=True, blank=True, help_text="Last progress from the writer; a stale one lets run_exports take over"
+    )
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='timesheet_export_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_model_display()} export #{self.pk} ({self.get_status_display()})"
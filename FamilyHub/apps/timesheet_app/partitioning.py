@@ -0,0 +1,268 @@
+"""
+Optional yearly range partitioning of TimeEntry on PostgreSQL.
+
+``convert`` swaps ``timesheet_app_timeentry`` for a table partitioned by
+``RANGE (date)`` with one partition per calendar year plus a DEFAULT
+partition, copying rows, constraints and indexes across in a single
+transaction. Afterwards date-bounded queries (weekly summaries, heatmaps,
+invoices) are pruned to the partitions they touch, and old years can be
+vacuumed, detached or archived on their own.
+
+PostgreSQL requires the partition key in every unique constraint, so the
+primary key becomes ``(id, date)``; ids still come from one sequence and
+stay unique. Nothing here runs automatically, and it is not a migration
+because it is opt-in per deployment: use the ``timesheet_partitions``
+management command, and schedule its ``ahead`` action (e.g. yearly) so next
+year's partition exists before it is needed.
+
+The conversion rewrites the table, so review it first with
+``timesheet_partitions convert --dry-run``, which prints the statements
+without running them. They are built by ``conversion_sql`` from the current
+catalog.
+
+CI runs the test suite twice on PostgreSQL (``.github/workflows/postgres.yml``):
+once on the plain table and once on a test database converted beforehand.
+"""
+
+from datetime import date
+
+from django.conf import settings
+from django.db import connection as default_connection, transaction
+
+from .models import TimeEntry
+
+TABLE = TimeEntry._meta.db_table
+LEGACY_TABLE = f'{TABLE}_legacy'
+DEFAULT_PARTITION = f'{TABLE}_default'
+SEQUENCE = f'{TABLE}_id_seq'
+
+
+class PartitioningError(Exception):
+    """Raised when partitioning is unavailable or the table is in the wrong state."""
+
+
+def partition_name(year):
+    return f'{TABLE}_y{year}'
+
+
+def ahead_years():
+    """How many future years ``create_ahead`` prepares (``TIMESHEET_PARTITION_AHEAD_YEARS``)."""
+    return getattr(settings, 'TIMESHEET_PARTITION_AHEAD_YEARS', 2)
+
+
+def _require_postgres(connection):
+    if connection.vendor != 'postgresql':
+        raise PartitioningError('Table partitioning is only available on PostgreSQL.')
+
+
+def is_partitioned(connection=default_connection):
+    """True if the TimeEntry table is already a partitioned table."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid)',
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions(connection=default_connection):
+    """``[(partition_name, bound_expression, row_estimate)]`` for the TimeEntry table."""
+    _require_postgres(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples::bigint '
+            'FROM pg_inherits i '
+            'JOIN pg_class parent ON parent.oid = i.inhparent '
+            'JOIN pg_class child ON child.oid = i.inhrelid '
+            'WHERE parent.relname = %s AND pg_table_is_visible(parent.oid) '
+            'ORDER BY child.relname',
+            [TABLE],
+        )
+        return cursor.fetchall()
+
+
+def _year_partition_sql(year):
+    return (
+        f'CREATE TABLE IF NOT EXISTS {partition_name(year)} PARTITION OF {TABLE} '
+        f"FOR VALUES FROM ('{date(year, 1, 1)}') TO ('{date(year + 1, 1, 1)}')"
+    )
+
+
+def _constraint_columns(definition):
+    """Column names from a ``UNIQUE (a, b)`` constraint definition."""
+    columns = definition[definition.index('(') + 1:definition.index(')')]
+    return [column.strip().strip('"') for column in columns.split(',')]
+
+
+def _catalog(cursor):
+    """
+    The current table's constraints as ``[(name, kind, definition)]`` and
+    indexes as ``[(name, definition)]``.
+    """
+    cursor.execute(
+        'SELECT con.conname, con.contype, pg_get_constraintdef(con.oid) '
+        'FROM pg_constraint con JOIN pg_class c ON c.oid = con.conrelid '
+        'WHERE c.relname = %s AND pg_table_is_visible(c.oid) ORDER BY con.contype, con.conname',
+        [TABLE],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        'SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND schemaname = current_schema() '
+        'ORDER BY indexname',
+        [TABLE],
+    )
+    return constraints, cursor.fetchall()
+
+
+def _partitioned_definitions(constraints, indexes):
+    """Constraint and index DDL of the current table, rewritten for the partitioned one."""
+    constraint_names = {name for name, _, _ in constraints}
+    statements = []
+    for name, kind, definition in constraints:
+        if kind == 'p':
+            # Unique constraints must include the partition key
+            statements.append(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} PRIMARY KEY (id, date)')
+        elif kind == 'u' and 'date' not in _constraint_columns(definition):
+            columns = ', '.join(_constraint_columns(definition))
+            statements.append(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} UNIQUE ({columns}, date)')
+        else:
+            statements.append(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+    for name, definition in indexes:
+        if name in constraint_names:
+            continue  # created by its constraint above
+        statements.append(definition.replace(' CONCURRENTLY', ''))
+    return statements
+
+
+def conversion_sql(constraints, indexes, first_year, last_year, max_id):
+    """
+    The statements ``convert`` runs, in order, for a table with the given
+    catalog entries (see ``_catalog``), holding years ``first_year`` to
+    ``last_year`` and ids up to ``max_id`` (``None`` when empty).
+    """
+    constraint_names = {name for name, _, _ in constraints}
+    statements = [f'ALTER TABLE {TABLE} DROP CONSTRAINT {name}' for name, _, _ in constraints]
+    statements += [
+        f'ALTER TABLE {TABLE} ALTER COLUMN id DROP IDENTITY IF EXISTS',
+        f'ALTER TABLE {TABLE} ALTER COLUMN id DROP DEFAULT',
+        f'ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}',
+    ]
+    # Indexes keep their names through the rename, and would clash with the copies
+    statements += [f'DROP INDEX {name}' for name, _ in indexes if name not in constraint_names]
+    statements += [
+        f'CREATE TABLE {TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS) PARTITION BY RANGE (date)',
+        f'DROP SEQUENCE IF EXISTS {SEQUENCE}',
+        f'CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id',
+        f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')",
+        f"SELECT setval('{SEQUENCE}', {max_id or 1}, {'true' if max_id is not None else 'false'})",
+    ]
+    statements += [_year_partition_sql(year) for year in range(first_year, last_year + 1)]
+    statements.append(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+    statements += _partitioned_definitions(constraints, indexes)
+    statements += [
+        f'INSERT INTO {TABLE} SELECT * FROM {LEGACY_TABLE}',
+        f'DROP TABLE {LEGACY_TABLE}',
+    ]
+    return statements
+
+
+def convert(connection=default_connection, ahead=None, dry_run=False):
+    """
+    Replace the TimeEntry table with a yearly partitioned copy; returns the statements run.
+
+    Holds an ACCESS EXCLUSIVE lock on the table for the duration of the copy,
+    so run it during a quiet period. With ``dry_run`` the catalog is only
+    read and the statements are returned without running them.
+    """
+    _require_postgres(connection)
+    if is_partitioned(connection):
+        raise PartitioningError(f'{TABLE} is already partitioned.')
+    ahead = ahead_years() if ahead is None else ahead
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if not dry_run:
+            cursor.execute(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT MIN(date), MAX(date), MAX(id) FROM {TABLE}')
+        first, last, max_id = cursor.fetchone()
+        constraints, indexes = _catalog(cursor)
+
+        this_year = date.today().year
+        first_year = first.year if first else this_year
+        last_year = max(last.year if last else this_year, this_year) + ahead
+        statements = conversion_sql(constraints, indexes, first_year, last_year, max_id)
+        if not dry_run:
+            for statement in statements:
+                cursor.execute(statement)
+    return statements
+
+
+def create_partition(year, connection=default_connection):
+    """
+    Create the partition for ``year`` if missing; return True if it was created.
+
+    Rows for that year that landed in the DEFAULT partition are moved into
+    the new partition.
+    """
+    _require_postgres(connection)
+    if not is_partitioned(connection):
+        raise PartitioningError(f'{TABLE} is not partitioned; run the convert action first.')
+
+    name = partition_name(year)
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        cursor.execute('SELECT to_regclass(%s)', [DEFAULT_PARTITION])
+        has_default = cursor.fetchone()[0] is not None
+        stray = 0
+        if has_default:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s', [start, end]
+            )
+            stray = cursor.fetchone()[0]
+
+        if stray:
+            # A new partition may not overlap rows held by the default partition
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+            cursor.execute(_year_partition_sql(year))
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s RETURNING *) '
+                f'INSERT INTO {TABLE} SELECT * FROM moved',
+                [start, end],
+            )
+            cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+        else:
+            cursor.execute(_year_partition_sql(year))
+    return True
+
+
+def create_ahead(years=None, connection=default_connection, today=None):
+    """Ensure partitions exist from this year through ``years`` years ahead; return new years."""
+    years = ahead_years() if years is None else years
+    this_year = (today or date.today()).year
+    return [
+        year for year in range(this_year, this_year + years + 1)
+        if create_partition(year, connection)
+    ]
+
+
+def detach_partition(year, connection=default_connection):
+    """
+    Detach ``year``'s partition into a standalone table.
+
+    The table keeps its name and rows, so it can be dumped, archived or
+    dropped without touching the live partitions.
+    """
+    _require_postgres(connection)
+    name = partition_name(year)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is None:
+            raise PartitioningError(f'No partition for {year}.')
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+    return name
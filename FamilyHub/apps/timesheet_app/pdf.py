@@ -0,0 +1,115 @@
+"""
+Minimal single-page PDF writer for invoices.
+
+Deliberately free of Django imports so it can run in worker processes
+without configuring settings (see invoicing.render_invoices). Output uses
+the built-in Helvetica fonts, so no font files are embedded.
+"""
+
+PAGE_WIDTH = 595   # A4 in points
+PAGE_HEIGHT = 842
+MARGIN = 50
+LINE_HEIGHT = 16
+MAX_LINES = 40     # line items that fit on the page below the header
+
+
+def _escape(text):
+    text = str(text).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+class _Page:
+    def __init__(self):
+        self.ops = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def text(self, x, text, size=10, bold=False):
+        font = 'F2' if bold else 'F1'
+        self.ops.append(f'BT /{font} {size} Tf {x:.2f} {self.y} Td ({_escape(text)}) Tj ET')
+
+    def right(self, x, text, size=10, bold=False):
+        # Helvetica digits are 0.556 em wide; good enough to right-align numbers
+        self.text(x - len(str(text)) * size * 0.556, text, size, bold)
+
+    def rule(self):
+        self.ops.append(f'{MARGIN} {self.y - 4} m {PAGE_WIDTH - MARGIN} {self.y - 4} l S')
+
+    def down(self, lines=1):
+        self.y -= LINE_HEIGHT * lines
+
+
+def _document(content):
+    """Wrap a page content stream in the objects, xref table and trailer of a PDF."""
+    stream = content.encode('latin-1')
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+         f'/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>').encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream',
+    ]
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def render_invoice(invoice):
+    """Render an invoice dict (see invoicing.build_invoices) to PDF bytes."""
+    page = _Page()
+    right_edge = PAGE_WIDTH - MARGIN
+
+    page.text(MARGIN, 'INVOICE', size=20, bold=True)
+    page.right(right_edge, invoice['number'], size=12, bold=True)
+    page.down(2)
+    page.text(MARGIN, f"From: {invoice['billed_by']}")
+    page.right(right_edge, f"Issued: {invoice['issued']:%d %b %Y}")
+    page.down()
+    page.text(MARGIN, f"Job: {invoice['job']}")
+    page.down()
+    if invoice['address']:
+        page.text(MARGIN, f"Address: {invoice['address']}")
+        page.down()
+    page.text(MARGIN, f"Period: {invoice['start']:%d %b %Y} - {invoice['end']:%d %b %Y}")
+    page.down(2)
+
+    columns = (MARGIN, 300, 400, right_edge)
+    page.text(columns[0], 'Date', bold=True)
+    page.right(columns[1], 'Hours', bold=True)
+    page.right(columns[2], 'Rate', bold=True)
+    page.right(columns[3], 'Amount', bold=True)
+    page.rule()
+    page.down()
+
+    lines = invoice['lines']
+    shown = lines if len(lines) <= MAX_LINES else lines[:MAX_LINES - 1]
+    for line in shown:
+        page.text(columns[0], f"{line['date']:%a %d %b %Y}")
+        page.right(columns[1], f"{line['hours']:.2f}")
+        page.right(columns[2], f"{invoice['rate']:.2f}")
+        page.right(columns[3], f"{line['amount']:.2f}")
+        page.down()
+    if len(shown) < len(lines):
+        rest = lines[len(shown):]
+        page.text(columns[0], f'{len(rest)} more days')
+        page.right(columns[1], f"{sum(line['hours'] for line in rest):.2f}")
+        page.right(columns[3], f"{sum(line['amount'] for line in rest):.2f}")
+        page.down()
+
+    page.rule()
+    page.down()
+    page.text(columns[0], 'Total', bold=True)
+    page.right(columns[1], f"{invoice['total_hours']:.2f}", bold=True)
+    page.right(columns[3], f"{invoice['total']:.2f}", bold=True)
+
+    return _document('\n'.join(page.ops))
@@ -0,0 +1,134 @@
+"""
+Closed pay periods.
+
+Once payroll is done for a week or month it is closed: entries dated inside
+it are rejected by TimeEntry.clean() and by the delete paths, and jobs with
+entries in it can't be merged or deleted, so anything computed from the
+period can no longer change. Such values are cached
+without a timeout under a key built from the period's id and ``closed_at``
+instead of the user's cache generation (see caching.py), and reads of them
+are served with a strong ETag and an immutable Cache-Control header.
+Reopening a period deletes its row, so a later close gets fresh keys.
+
+The user's closed periods are themselves cached per user, which keeps the
+checks made on every entry save and every history page free of queries.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from . import archive
+from .caching import PERIODS, user_cache_key
+from .household import period_bounds
+from .models import ClosedPeriod, TimeEntry
+
+# Bump when the shape of a frozen value changes, so old entries are not read back
+FROZEN_VERSION = 2
+
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+
+class PeriodClosed(ValidationError):
+    pass
+
+
+def closed_periods(user_id):
+    """The user's closed periods, oldest first."""
+    key = user_cache_key(user_id, 'closed_periods', scope=PERIODS)
+    found = cache.get(key)
+    if found is None:
+        found = list(ClosedPeriod.objects.filter(user_id=user_id).order_by('start', 'end'))
+        cache.set(key, found, timeout=60 * 60 * 24)
+    return found
+
+
+def period_containing(user_id, day):
+    """The closed period ``day`` falls in, or ``None``."""
+    for period in closed_periods(user_id):
+        if period.start <= day <= period.end:
+            return period
+    return None
+
+
+def covering(user_id, start, end):
+    """A closed period containing the whole of ``start``..``end``, or ``None``."""
+    for period in closed_periods(user_id):
+        if period.start <= start and end <= period.end:
+            return period
+    return None
+
+
+def check_open(user_id, *days):
+    """Raise PeriodClosed if any of ``days`` (``None`` is skipped) is in a closed period."""
+    for day in days:
+        period = day and period_containing(user_id, day)
+        if period:
+            raise PeriodClosed(
+                f"{period.start:%d %b} - {period.end:%d %b %Y} is closed; "
+                f"its entries can no longer be changed."
+            )
+
+
+def period_touching_jobs(user_id, job_ids):
+    """A closed period holding a live or archived entry of any of ``job_ids``, or ``None``."""
+    if not closed_periods(user_id):
+        return None
+    live = (
+        TimeEntry.objects.filter(user_id=user_id, job_id__in=job_ids).with_closed()
+        .filter(in_closed_period=True).values_list('date', flat=True).first()
+    )
+    days = [live] if live else archive.job_dates(user_id, job_ids)
+    return next(filter(None, (period_containing(user_id, day) for day in days)), None)
+
+
+def check_jobs_open(user_id, job_ids):
+    """Raise PeriodClosed if any of ``job_ids`` has entries in a closed period."""
+    period = period_touching_jobs(user_id, job_ids)
+    if period:
+        raise PeriodClosed(
+            f"{period.start:%d %b} - {period.end:%d %b %Y} is closed and has entries for this job; "
+            f"it can no longer be merged or deleted."
+        )
+
+
+def close_period(user, kind, day, closed_by=None):
+    """Close the week or month containing ``day`` for ``user``."""
+    start, end = period_bounds(kind, day)
+    if start > timezone.localdate():
+        raise ValidationError("A period can't be closed before it has started.")
+    if covering(user.pk, start, end):
+        raise ValidationError(f"{start:%d %b} - {end:%d %b %Y} is already closed.")
+    return ClosedPeriod.objects.create(user=user, kind=kind, start=start, end=end, closed_by=closed_by)
+
+
+def reopen_period(period):
+    """Allow edits again; everything frozen under the period becomes unreachable."""
+    period.delete()
+
+
+def _frozen_stamp(period, name, parts):
+    suffix = ':'.join(str(part) for part in parts)
+    return f'{period.user_id}:{period.pk}:{period.closed_at.timestamp()}:{FROZEN_VERSION}:{name}:{suffix}'
+
+
+def frozen_key(period, name, *parts):
+    """Cache key for a value computed from ``period``; it never needs invalidating."""
+    return f'timesheet:closed:{_frozen_stamp(period, name, parts)}'
+
+
+def frozen(period, name, compute, *parts):
+    """Return the value cached for ``period`` under ``name``, computing it once."""
+    key = frozen_key(period, name, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout=None)
+    return value
+
+
+def frozen_etag(period, name, *parts):
+    """Strong ETag for a representation of ``period``; no query needed."""
+    return hashlib.sha1(_frozen_stamp(period, name, parts).encode()).hexdigest()
@@ -0,0 +1,200 @@
+"""
+Fuzzy job search backed by the database's trigram index.
+
+PostgreSQL uses ``pg_trgm`` GIN indexes on name/address/description (created
+by migration 0003). SQLite uses the ``timesheet_app_job_fts`` FTS5 table with
+the trigram tokenizer, maintained by triggers that ``ensure_sqlite_index``
+(re)creates after every migrate. Other backends fall back to ``icontains``.
+"""
+
+
+from django.db import connection
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .models import Job
+
+FTS_TABLE = 'timesheet_app_job_fts'
+
+# Extra score given to a job used today; decays with days since last use.
+RECENCY_WEIGHT = 0.3
+RECENCY_HALF_LIFE_DAYS = 30
+
+# Share of the query's trigrams a job must contain to pass filter_jobs on
+# SQLite; the default of pg_trgm's word_similarity_threshold.
+FILTER_THRESHOLD = 0.6
+
+
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON timesheet_app_job BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name, address, description, user_id)
+            VALUES (new.id, new.name, new.address, new.description, new.user_id);
+        END""",
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON timesheet_app_job BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, address, description, user_id)
+            VALUES ('delete', old.id, old.name, old.address, old.description, old.user_id);
+        END""",
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON timesheet_app_job BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, address, description, user_id)
+            VALUES ('delete', old.id, old.name, old.address, old.description, old.user_id);
+            INSERT INTO {FTS_TABLE}(rowid, name, address, description, user_id)
+            VALUES (new.id, new.name, new.address, new.description, new.user_id);
+        END""",
+}
+
+
+def ensure_sqlite_index(using='default', **kwargs):
+    """
+    Create the FTS5 table and triggers if missing (post_migrate receiver).
+
+    SQLite drops a table's triggers whenever a migration rebuilds it, so this
+    runs after every migrate and rebuilds the index whenever a trigger had
+    to be recreated.
+    """
+    from django.db import connections
+
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'timesheet_app_job'")
+        if not cursor.fetchone():
+            return
+        cursor.execute(
+            f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                name, address, description, user_id UNINDEXED,
+                tokenize='trigram', content='timesheet_app_job', content_rowid='id'
+            )"""
+        )
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'timesheet_app_job'")
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [sql for name, sql in SQLITE_TRIGGERS.items() if name not in existing]
+        for sql in missing:
+            cursor.execute(sql)
+        if missing:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _gram_set(text):
+    text = ' '.join(text.lower().split())
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _trigrams(query):
+    """Split a query into the quoted trigram terms FTS5 expects."""
+    return ['"%s"' % gram.replace('"', '""') for gram in sorted(_gram_set(query))]
+
+
+def _fts_match(query):
+    """FTS5 MATCH expression: any shared trigram matches, bm25 ranks by overlap."""
+    return ' OR '.join(_trigrams(query))
+
+
+def _sqlite_matches(query):
+    """
+    Ids of jobs holding at least ``FILTER_THRESHOLD`` of the query's trigrams
+    in one field. The index finds jobs sharing any trigram; the overlap is
+    measured here, as FTS5 has no similarity cutoff.
+    """
+    grams = _gram_set(query)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, name, address, description FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [_fts_match(query)],
+        )
+        return [
+            rowid for rowid, *fields in cursor.fetchall()
+            if max(len(grams & _gram_set(field or '')) for field in fields) >= FILTER_THRESHOLD * len(grams)
+        ]
+
+
+def filter_jobs(queryset, query):
+    """
+    Narrow a Job queryset to rows fuzzily matching ``query``.
+
+    Unlike the ranked ``search_jobs``, which lists the best of any overlap,
+    a job must match most of the query to pass.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+
+    if connection.vendor == 'postgresql' and len(query) >= 3:
+        return queryset.filter(
+            Q(name__trigram_word_similar=query)
+            | Q(address__trigram_word_similar=query)
+            | Q(description__trigram_word_similar=query)
+        )
+
+    if connection.vendor == 'sqlite' and len(query) >= 3:
+        return queryset.filter(pk__in=_sqlite_matches(query))
+
+    return queryset.filter(
+        Q(name__icontains=query) | Q(address__icontains=query) | Q(description__icontains=query)
+    )
+
+
+def _ranked_candidates(queryset, user, query, limit):
+    """Return ``[(job, similarity)]`` for the user's jobs, best-first, at most ``limit`` rows."""
+    if connection.vendor == 'postgresql' and len(query) >= 3:
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from django.db.models.functions import Greatest
+
+        jobs = filter_jobs(queryset, query).annotate(
+            similarity=Greatest(
+                TrigramWordSimilarity(query, 'name'),
+                TrigramWordSimilarity(query, 'address'),
+                TrigramWordSimilarity(query, 'description'),
+            )
+        ).order_by('-similarity', 'name')[:limit]
+        return [(job, job.similarity) for job in jobs]
+
+    if connection.vendor == 'sqlite' and len(query) >= 3:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND user_id = %s '
+                f'ORDER BY bm25({FTS_TABLE}) LIMIT %s',
+                [_fts_match(query), user.pk, limit],
+            )
+            ranks = cursor.fetchall()
+        if not ranks:
+            return []
+        # bm25 is negative and unbounded; normalise against the best hit.
+        best = -ranks[0][1] or 1.0
+        scores = {rowid: -rank / best for rowid, rank in ranks}
+        jobs = queryset.filter(pk__in=scores)
+        return sorted(((job, scores[job.pk]) for job in jobs), key=lambda pair: -pair[1])
+
+    jobs = filter_jobs(queryset, query).order_by('name', 'address')[:limit]
+    return [(job, 1.0 if job.display_name().lower().startswith(query.lower()) else 0.5) for job in jobs]
+
+
+def search_jobs(user, query, limit=10):
+    """
+    Return up to ``limit`` of the user's jobs ranked by similarity and recent use.
+
+    An empty query returns the most recently used jobs.
+    """
+    queryset = Job.objects.filter(user=user).annotate(last_used=Max('time_entries__date'))
+    query = (query or '').strip()
+
+    if not query:
+        return list(queryset.order_by(F('last_used').desc(nulls_last=True), 'name', 'address')[:limit])
+
+    candidates = _ranked_candidates(queryset, user, query, limit * 3)
+    today = timezone.localdate()
+
+    def score(pair):
+        job, similarity = pair
+        if job.last_used is None:
+            return similarity
+        days = max((today - job.last_used).days, 0)
+        return similarity + RECENCY_WEIGHT / (1 + days / RECENCY_HALF_LIFE_DAYS)
+
+    candidates.sort(key=score, reverse=True)
+    return [job for job, _ in candidates[:limit]]
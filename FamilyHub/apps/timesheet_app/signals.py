@@ -0,0 +1,111 @@
+"""
+Model signal receivers for the timesheet app.
+
+Connected in TimesheetAppConfig.ready().
+"""
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import approvals
+from . import caching
+from . import leave
+from .models import (
+    ClosedPeriod, HouseholdMember, Job, LeaveRecord, TimeEntry, TimesheetProfile, Tombstone, WeekApproval,
+)
+from .timezones import forget_user_timezone
+
+
+def _deleted_directly(origin, model):
+    """False when the delete cascaded from another model, such as the user being deleted."""
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+@receiver([post_save, post_delete], sender=TimeEntry)
+def time_entry_changed(sender, instance, **kwargs):
+    """Invalidate cached summaries for the entry's owner."""
+    caching.bump_generation(instance.user_id, caching.ENTRIES)
+
+
+@receiver(post_save, sender=TimeEntry)
+def time_entry_saved(sender, instance, created, **kwargs):
+    """Accrue leave for the change in hours worked and queue the week for review."""
+    leave.entry_saved(instance, created)
+    approvals.week_changed(instance.user_id, instance.date)
+    loaded_date = getattr(instance, '_loaded_date', None)
+    if loaded_date and approvals.week_start(loaded_date) != approvals.week_start(instance.date):
+        approvals.week_changed(instance.user_id, loaded_date)
+    instance._loaded_date = instance.date
+
+
+@receiver(post_save, sender=LeaveRecord)
+def leave_record_saved(sender, instance, created, **kwargs):
+    leave.record_saved(instance, created)
+
+
+@receiver(post_delete, sender=LeaveRecord)
+def leave_record_deleted(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(origin, LeaveRecord):
+        leave.record_deleted(instance)
+
+
+@receiver([post_save, post_delete], sender=Job)
+def job_changed(sender, instance, **kwargs):
+    """Job names appear in entry summaries, so both scopes are invalidated."""
+    caching.bump_generation(instance.user_id, caching.JOBS)
+    caching.bump_generation(instance.user_id, caching.ENTRIES)
+
+
+@receiver(post_delete, sender=TimeEntry)
+def time_entry_deleted(sender, instance, origin=None, **kwargs):
+    """Leave a tombstone for delta sync clients, give back accrued leave and requeue the week."""
+    # When the user is deleted their tombstones, balances and approvals go too
+    if _deleted_directly(origin, TimeEntry):
+        Tombstone.objects.create(user_id=instance.user_id, model=Tombstone.TIME_ENTRY, object_id=instance.pk)
+        leave.entry_deleted(instance)
+        approvals.week_changed(instance.user_id, instance.date)
+
+
+@receiver(pre_delete, sender=Job)
+def job_deleting(sender, instance, **kwargs):
+    """
+    Touch the job's entries before SET_NULL clears their job.
+
+    The collector nulls the foreign key with a bare UPDATE, which would not
+    move ``updated_at`` (or ``version``) and so would never reach sync clients.
+    """
+    instance.time_entries.update(updated_at=timezone.now(), version=F('version') + 1)
+
+
+@receiver(post_delete, sender=Job)
+def job_deleted(sender, instance, origin=None, **kwargs):
+    """Leave a tombstone for delta sync clients."""
+    if _deleted_directly(origin, Job):
+        Tombstone.objects.create(user_id=instance.user_id, model=Tombstone.JOB, object_id=instance.pk)
+
+
+@receiver([post_save, post_delete], sender=TimesheetProfile)
+def profile_changed(sender, instance, **kwargs):
+    """Drop the cached timezone so the next request picks up the new one."""
+    forget_user_timezone(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=ClosedPeriod)
+def closed_period_changed(sender, instance, **kwargs):
+    """Refresh the user's cached list of closed periods (see periods.py)."""
+    caching.bump_generation(instance.user_id, caching.PERIODS)
+
+
+@receiver(post_delete, sender=WeekApproval)
+def week_approval_deleted(sender, instance, **kwargs):
+    """Keep the household's pending counter in step."""
+    approvals.approval_deleted(instance)
+
+
+@receiver(post_delete, sender=HouseholdMember)
+def household_member_deleted(sender, instance, origin=None, **kwargs):
+    """A member who leaves takes their pending weeks with them."""
+    if _deleted_directly(origin, HouseholdMember):
+        approvals.member_left(instance)
@@ -0,0 +1,84 @@
+// Fragment updates for entry forms marked with data-fragment-target
+// Posts the form in the background and splices the returned entry row and
+// day totals into the page. Without JavaScript the form posts normally and
+// the server answers with the full page.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('form[data-fragment-target]').forEach(function(form) {
+        const list = document.getElementById(form.dataset.fragmentTarget);
+        const empty = document.getElementById(form.dataset.fragmentEmpty);
+        const errors = form.querySelector('[data-fragment-errors]');
+
+        function showErrors(messages) {
+            if (!errors) {
+                alert(messages.join('\n'));
+                return;
+            }
+            errors.textContent = messages.join(' ');
+            errors.classList.toggle('d-none', !messages.length);
+        }
+
+        function insertRow(html) {
+            const holder = document.createElement('div');
+            holder.innerHTML = html.trim();
+            const row = holder.firstElementChild;
+            // Keep rows ordered by start time, like the server render
+            const next = Array.from(list.children).find(child => child.dataset.start > row.dataset.start);
+            list.insertBefore(row, next || null);
+        }
+
+        form.addEventListener('submit', function(e) {
+            if (e.defaultPrevented) {
+                return;
+            }
+            e.preventDefault();
+            const submitBtn = form.querySelector('[type=submit]');
+            submitBtn.disabled = true;
+
+            const body = new FormData(form);
+
+            function send(attempt) {
+                return fetch(form.action || window.location.href, {
+                    method: 'POST',
+                    body: body,
+                    credentials: 'same-origin',
+                    headers: {'X-Requested-With': 'XMLHttpRequest'}
+                }).then(response => {
+                    // An earlier attempt with the same key is still being saved
+                    const retryAfter = Number(response.headers.get('Retry-After'));
+                    if (response.status === 409 && retryAfter && attempt < 5) {
+                        return new Promise(resolve => setTimeout(resolve, retryAfter * 1000))
+                            .then(() => send(attempt + 1));
+                    }
+                    return response.json();
+                });
+            }
+
+            send(0)
+            .then(data => {
+                if (data.errors) {
+                    showErrors(data.errors);
+                    return;
+                }
+                showErrors([]);
+                insertRow(data.html);
+                // The next entry is a new submission and needs its own key
+                if (form.elements.idempotency_key) {
+                    form.elements.idempotency_key.value = window.crypto && crypto.randomUUID
+                        ? crypto.randomUUID()
+                        : Date.now().toString(16) + Math.random().toString(16).slice(2);
+                }
+                if (empty) {
+                    empty.classList.add('d-none');
+                }
+                document.querySelectorAll('[data-day-total]').forEach(function(el) {
+                    el.textContent = data.total_hours.toFixed(2);
+                });
+                document.querySelectorAll('[data-day-count]').forEach(function(el) {
+                    el.textContent = data.entry_count;
+                });
+            })
+            .catch(() => form.submit())
+            .finally(() => { submitBtn.disabled = false; });
+        });
+    });
+});
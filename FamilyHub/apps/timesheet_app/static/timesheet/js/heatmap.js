@@ -0,0 +1,55 @@
+// Yearly activity heatmap (GitHub-style) for the timesheet dashboard
+// Fetches one dense array of minutes per day and draws it as week columns.
+document.addEventListener('DOMContentLoaded', function() {
+    const container = document.getElementById('activityHeatmap');
+    if (!container) {
+        return;
+    }
+
+    const levels = ['#ebedf0', '#c6e48b', '#7bc96f', '#239a3b', '#196127'];
+    const cell = 11;
+    const gap = 2;
+
+    function level(minutes, max) {
+        if (!minutes) {
+            return 0;
+        }
+        return Math.min(4, 1 + Math.floor((minutes / max) * 3.999));
+    }
+
+    fetch(container.dataset.url, {credentials: 'same-origin'})
+        .then(response => response.json())
+        .then(data => {
+            const start = new Date(data.start + 'T00:00:00');
+            const offset = (start.getDay() + 6) % 7;  // Monday-first rows
+            const weeks = Math.ceil((data.minutes.length + offset) / 7);
+            const svgNS = 'http://www.w3.org/2000/svg';
+            const svg = document.createElementNS(svgNS, 'svg');
+            svg.setAttribute('width', weeks * (cell + gap));
+            svg.setAttribute('height', 7 * (cell + gap));
+
+            data.minutes.forEach(function(minutes, index) {
+                const slot = index + offset;
+                const rect = document.createElementNS(svgNS, 'rect');
+                rect.setAttribute('x', Math.floor(slot / 7) * (cell + gap));
+                rect.setAttribute('y', (slot % 7) * (cell + gap));
+                rect.setAttribute('width', cell);
+                rect.setAttribute('height', cell);
+                rect.setAttribute('rx', 2);
+                rect.setAttribute('fill', levels[level(minutes, data.max || 1)]);
+
+                const day = new Date(start.getTime());
+                day.setDate(start.getDate() + index);
+                const title = document.createElementNS(svgNS, 'title');
+                title.textContent = `${day.toDateString()}: ${(minutes / 60).toFixed(2)}h`;
+                rect.appendChild(title);
+                svg.appendChild(rect);
+            });
+
+            container.innerHTML = '';
+            container.appendChild(svg);
+        })
+        .catch(() => {
+            container.innerHTML = '<p class="text-muted mb-0">Activity could not be loaded.</p>';
+        });
+});
@@ -0,0 +1,64 @@
+// Job picker autocomplete
+// Enhances <select data-autocomplete-url> elements rendered by JobAutocompleteWidget:
+// the server only renders the selected job, the rest are fetched as the user types.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(function(select) {
+        const url = select.dataset.autocompleteUrl;
+        const search = document.createElement('input');
+        search.type = 'search';
+        search.className = 'form-control form-control-sm mb-1';
+        search.placeholder = 'Search jobs...';
+        search.setAttribute('autocomplete', 'off');
+        select.parentNode.insertBefore(search, select);
+
+        let timer = null;
+        let lastQuery = null;
+
+        function replaceOptions(results) {
+            const selected = select.value;
+            const selectedOption = select.querySelector('option:checked');
+            select.innerHTML = '';
+            select.appendChild(new Option('---------', ''));
+
+            let hasSelected = false;
+            results.forEach(function(job) {
+                const label = job.address && job.address !== job.text ? `${job.text} (${job.address})` : job.text;
+                const option = new Option(label, job.id);
+                if (String(job.id) === selected) {
+                    option.selected = true;
+                    hasSelected = true;
+                }
+                select.appendChild(option);
+            });
+
+            // Keep the current choice available even if it isn't in the results
+            if (selected && !hasSelected && selectedOption) {
+                selectedOption.selected = true;
+                select.insertBefore(selectedOption, select.options[1] || null);
+            }
+        }
+
+        function load(query) {
+            if (query === lastQuery) {
+                return;
+            }
+            lastQuery = query;
+            fetch(`${url}?q=${encodeURIComponent(query)}`, {credentials: 'same-origin'})
+                .then(response => response.json())
+                .then(data => {
+                    if (query === lastQuery) {
+                        replaceOptions(data.results);
+                    }
+                });
+        }
+
+        search.addEventListener('input', function() {
+            clearTimeout(timer);
+            timer = setTimeout(() => load(search.value.trim()), 150);
+        });
+
+        // Recently used jobs on first interaction
+        select.addEventListener('focus', () => load(search.value.trim()), {once: true});
+        search.addEventListener('focus', () => load(search.value.trim()), {once: true});
+    });
+});
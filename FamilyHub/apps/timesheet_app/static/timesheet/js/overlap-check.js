@@ -0,0 +1,96 @@
+// Client-side overlap check for the time entry form
+// Fetches the sorted intervals for the selected week once (revalidated with
+// an ETag) and binary-searches them on every change. The server still
+// validates overlaps when the form is submitted.
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('entryForm');
+    if (!form || !form.dataset.intervalsUrl) {
+        return;
+    }
+
+    const entryId = parseInt(form.dataset.entryId, 10) || null;
+    const weeks = {};  // Monday (YYYY-MM-DD) -> Promise of {date: intervals}
+
+    function toMinutes(value) {
+        const parts = value.split(':');
+        return parseInt(parts[0], 10) * 60 + parseInt(parts[1], 10);
+    }
+
+    function mondayOf(value) {
+        const day = new Date(value + 'T00:00:00');
+        day.setDate(day.getDate() - (day.getDay() + 6) % 7);
+        const month = String(day.getMonth() + 1).padStart(2, '0');
+        const date = String(day.getDate()).padStart(2, '0');
+        return day.getFullYear() + '-' + month + '-' + date;
+    }
+
+    function loadWeek(value) {
+        const monday = mondayOf(value);
+        if (!weeks[monday]) {
+            const url = form.dataset.intervalsUrl + '?span=week&date=' + monday;
+            weeks[monday] = fetch(url, {credentials: 'same-origin'})
+                .then(response => response.json())
+                .then(data => data.days)
+                .catch(() => { delete weeks[monday]; return {}; });
+        }
+        return weeks[monday];
+    }
+
+    // Intervals are sorted and non-overlapping, so ends are sorted too: the
+    // only candidate is the last interval starting before the new end.
+    function findOverlap(intervals, start, end) {
+        let lo = 0;
+        let hi = intervals.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >> 1;
+            if (intervals[mid][0] < end) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        const candidate = intervals[lo - 1];
+        return candidate && candidate[1] > start ? candidate : null;
+    }
+
+    function showResult(overlap) {
+        const overlapAlert = document.getElementById('overlapAlert');
+        const overlapMessage = document.getElementById('overlapMessage');
+        const submitBtn = document.getElementById('submitBtn');
+
+        if (overlap) {
+            overlapAlert.classList.remove('d-none');
+            overlapMessage.textContent = 'Time overlaps with existing entry: ' + overlap[3];
+            submitBtn.disabled = true;
+        } else {
+            overlapAlert.classList.add('d-none');
+            submitBtn.disabled = false;
+        }
+    }
+
+    function check() {
+        const date = document.getElementById('id_date').value;
+        const startTime = document.getElementById('id_start_time').value;
+        const endTime = document.getElementById('id_end_time').value;
+        if (!date || !startTime || !endTime) {
+            return;
+        }
+
+        loadWeek(date).then(days => {
+            // Ignore stale answers if the inputs changed while fetching
+            if (document.getElementById('id_date').value !== date) {
+                return;
+            }
+            const intervals = (days[date] || []).filter(interval => interval[2] !== entryId);
+            showResult(findOverlap(intervals, toMinutes(startTime), toMinutes(endTime)));
+        });
+    }
+
+    ['id_date', 'id_start_time', 'id_end_time'].forEach(function(inputId) {
+        const input = document.getElementById(inputId);
+        if (input) {
+            input.addEventListener('change', check);
+        }
+    });
+    check();
+});
@@ -1,3 +1,783 @@
-from django.test import TestCase
+import io
+import re
+import shutil
+import tempfile
+import threading
+from datetime import date, time, timedelta
+from decimal import Decimal
+from time import monotonic
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Max
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import analytics, archive, caching, exports, household, idempotency, invoicing, leave, merging, partitioning, periods, search, views
+from .models import (
+    ClosedPeriod, ExportJob, Household, HouseholdInvitation, HouseholdMember, Job, LeaveBalance, LeaveRecord,
+    TimeEntry, Tombstone, WeekApproval,
+)
+
+
+class QueryPlanTests(TestCase):
+    """
+    The hot queries behind timesheet_app views must be answered from indexes.
+
+    Each test runs EXPLAIN for the same queryset a view builds and fails if
+    the plan reads a timesheet table sequentially. On PostgreSQL sequential
+    scans are disabled for the check, so a Seq Scan in the plan means no
+    usable index exists rather than that the seeded tables are small.
+    """
+
+    SEQUENTIAL_SCAN = {
+        'sqlite': re.compile(r'^SCAN (timesheet_app_\w+)$'),
+        'postgresql': re.compile(r'Seq Scan on (timesheet_app_\w+)'),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'user{n}') for n in range(3)]
+        cls.user = cls.users[0]
+        start = date(2024, 1, 1)
+        entries = []
+        for user in cls.users:
+            jobs = Job.objects.bulk_create([Job(user=user, name=f'Job {n}') for n in range(5)])
+            for day in range(200):
+                for slot, hour in enumerate((8, 13)):
+                    entries.append(TimeEntry(
+                        user=user, job=jobs[(day + slot) % 5], date=start + timedelta(days=day),
+                        start_time=time(hour), end_time=time(hour + 4), break_duration=30,
+                    ))
+        TimeEntry.objects.bulk_create(entries)
+        cls.job = Job.objects.filter(user=cls.user).first()
+        cls.day = start + timedelta(days=100)
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                return [row[-1] for row in cursor.fetchall()]
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, queryset):
+        pattern = self.SEQUENTIAL_SCAN.get(connection.vendor)
+        if pattern is None:
+            self.skipTest(f'No plan check for {connection.vendor}')
+        plan = self.explain(queryset)
+        scans = [line for line in plan if pattern.search(line.strip())]
+        self.assertFalse(scans, 'Sequential scan in plan:\n' + '\n'.join(plan))
+
+    def test_day_entries(self):
+        """dashboard, daily_entry and validate_overlap."""
+        self.assertUsesIndexes(
+            TimeEntry.objects.filter(user=self.user, date=self.day).select_related('job').order_by('start_time')
+        )
+
+    def test_week_entries(self):
+        """weekly_summary and day_intervals."""
+        self.assertUsesIndexes(
+            TimeEntry.objects.filter(
+                user=self.user, date__range=[self.day, self.day + timedelta(days=6)]
+            ).select_related('job').order_by('date', 'start_time')
+        )
+
+    def test_year_minutes(self):
+        """heatmap_data."""
+        self.assertUsesIndexes(
+            TimeEntry.objects.filter(
+                user=self.user, date__range=[date(2024, 1, 1), date(2024, 12, 31)]
+            ).minutes_by_date()
+        )
+
+    def test_job_list_counts(self):
+        """job_list."""
+        self.assertUsesIndexes(
+            Job.objects.filter(user=self.user).order_by('name', 'address')
+        )
+
+    def test_job_entry_count(self):
+        """job_delete."""
+        self.assertUsesIndexes(TimeEntry.objects.filter(job=self.job).values('id'))
+
+    def test_job_rollup(self):
+        """Per-job daily rollups used by invoicing."""
+        self.assertUsesIndexes(
+            TimeEntry.objects.filter(
+                user=self.user, job_id__in=[self.job.pk], date__range=[self.day, self.day + timedelta(days=30)]
+            ).order_by().values('job_id', 'date').annotate(entries=Count('id'))
+        )
+
+    def test_household_members(self):
+        """household."""
+        self.assertUsesIndexes(
+            TimeEntry.objects.filter(
+                user_id__in=[user.pk for user in self.users],
+                date__range=[self.day, self.day + timedelta(days=6)],
+            ).order_by().values('user_id', 'job_id').annotate(entries=Count('id'))
+        )
+
+    def test_recent_jobs(self):
+        """job_autocomplete with an empty query."""
+        self.assertUsesIndexes(
+            Job.objects.filter(user=self.user).annotate(last_used=Max('time_entries__date'))
+        )
+
+    def test_admin_changelist(self):
+        """TimeEntryAdmin for a superuser: newest entries across all users."""
+        self.assertUsesIndexes(
+            TimeEntry.objects.select_related('user', 'job').with_minutes().order_by('-date', '-start_time', '-pk')[:100]
+        )
+
+    def test_sync_changes(self):
+        """api_views.sync."""
+        since = TimeEntry.objects.order_by('updated_at').values_list('updated_at', flat=True).first()
+        self.assertUsesIndexes(
+            TimeEntry.objects.filter(user=self.user, updated_at__gt=since).order_by('updated_at', 'id')
+        )
+        self.assertUsesIndexes(
+            Tombstone.objects.filter(user=self.user, deleted_at__gt=since).order_by('deleted_at', 'id')
+        )
+
+    def test_leave_balances(self):
+        """leave."""
+        self.assertUsesIndexes(LeaveBalance.objects.filter(user=self.user))
+
+    def test_pending_weeks(self):
+        """week_review."""
+        household = Household.objects.create(name='Family')
+        self.assertUsesIndexes(
+            WeekApproval.objects.filter(household=household, status=WeekApproval.PENDING)
+            .select_related('user').order_by('week_start', 'user__username')[:100]
+        )
+
+
+class JobSearchTests(TestCase):
+    """Filtering keeps to jobs matching most of the query; autocomplete ranks any overlap."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('worker')
+        self.smith = Job.objects.create(user=self.user, name='Smith', address='4 Smith Road')
+        self.main = Job.objects.create(user=self.user, name='Corner shop', address='12 Main Road')
+
+    def test_filter_needs_most_of_the_query(self):
+        jobs = Job.objects.filter(user=self.user)
+        self.assertEqual(list(search.filter_jobs(jobs, 'smith road')), [self.smith])
+        self.assertEqual(list(search.filter_jobs(jobs, 'smith rd')), [self.smith])
+        self.assertEqual(set(search.filter_jobs(jobs, 'road')), {self.smith, self.main})
+
+    def test_autocomplete_ranks_partial_matches(self):
+        self.assertEqual(search.search_jobs(self.user, 'smith road')[0], self.smith)
+
+
+@override_settings(TIMESHEET_LEAVE_ACCRUAL={LeaveRecord.ANNUAL: 0.1})
+class LeaveBalanceTests(TestCase):
+    """Balances kept by the signals must match a rebuild from full history."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('worker')
+
+    def balances(self):
+        return {balance.kind: balance.balance_hours() for balance in leave.balances(self.user.pk)}
+
+    def assertMatchesRebuild(self):
+        kept = self.balances()
+        leave.rebuild_balances(self.user.pk)
+        self.assertEqual(kept, self.balances())
+
+    def test_entry_changes(self):
+        entry = TimeEntry.objects.create(
+            user=self.user, date=date(2024, 3, 4), start_time=time(8), end_time=time(18), break_duration=0
+        )
+        self.assertEqual(self.balances(), {LeaveRecord.ANNUAL: Decimal('1.00')})
+
+        entry = TimeEntry.objects.get(pk=entry.pk)
+        entry.end_time = time(13)
+        entry.save()
+        self.assertEqual(self.balances(), {LeaveRecord.ANNUAL: Decimal('0.50')})
+
+        TimeEntry.objects.create(
+            user=self.user, date=date(2024, 3, 5), start_time=time(22), end_time=time(2), break_duration=30
+        )
+        self.assertMatchesRebuild()
+
+        entry.delete()
+        self.assertEqual(self.balances(), {LeaveRecord.ANNUAL: Decimal('0.35')})
+        self.assertMatchesRebuild()
+
+    def test_saves_after_another_change(self):
+        entry = TimeEntry.objects.create(
+            user=self.user, date=date(2024, 3, 4), start_time=time(8), end_time=time(18), break_duration=0
+        )
+        stale = TimeEntry.objects.get(pk=entry.pk)
+
+        # Shortened elsewhere, e.g. through the edit view
+        other = TimeEntry.objects.get(pk=entry.pk)
+        other.end_time = time(13)
+        other.save()
+
+        entry.refresh_from_db()
+        entry.save()
+        entry.save()
+        self.assertEqual(self.balances(), {LeaveRecord.ANNUAL: Decimal('0.50')})
+
+        stale.break_duration = 60
+        stale.save()
+        self.assertMatchesRebuild()
+
+    def test_leave_records(self):
+        TimeEntry.objects.create(
+            user=self.user, date=date(2024, 3, 4), start_time=time(8), end_time=time(18), break_duration=0
+        )
+        record = LeaveRecord.objects.create(
+            user=self.user, kind=LeaveRecord.ANNUAL, start=date(2024, 3, 6), end=date(2024, 3, 6), hours=Decimal('0.25')
+        )
+        self.assertEqual(self.balances(), {LeaveRecord.ANNUAL: Decimal('0.75')})
+
+        record = LeaveRecord.objects.get(pk=record.pk)
+        record.kind = LeaveRecord.UNPAID
+        record.save()
+        self.assertEqual(self.balances(), {LeaveRecord.ANNUAL: Decimal('1.00'), LeaveRecord.UNPAID: Decimal('-0.25')})
+        self.assertMatchesRebuild()
+
+        record.delete()
+        self.assertEqual(self.balances(), {LeaveRecord.ANNUAL: Decimal('1.00'), LeaveRecord.UNPAID: Decimal('0.00')})
+
+
+class UserDeletionTests(TransactionTestCase):
+    """Deleting a user commits, so foreign keys are checked as they would be in production."""
+
+    def test_deleting_a_user_removes_their_timesheet(self):
+        user = User.objects.create_user('worker')
+        job = Job.objects.create(user=user, name='Garden')
+        entry = TimeEntry.objects.create(
+            user=user, job=job, date=date(2024, 3, 4), start_time=time(8), end_time=time(17), break_duration=0
+        )
+        TimeEntry.objects.create(
+            user=user, job=job, date=date(2024, 3, 5), start_time=time(8), end_time=time(17), break_duration=0
+        )
+
+        # A direct delete still leaves a tombstone for sync clients
+        entry.delete()
+        self.assertEqual(Tombstone.objects.filter(user=user).count(), 1)
+
+        user.delete()
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(TimeEntry.objects.exists())
+        self.assertFalse(Tombstone.objects.exists())
+
+
+class VersionedSaveTests(TestCase):
+    """A plain save bumps the version in its own UPDATE, also when racing another save."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('worker')
+        self.job = Job.objects.create(user=self.user, name='Garden')
+
+    def test_plain_save_is_one_query(self):
+        job = Job.objects.get(pk=self.job.pk)
+        job.name = 'Gardening'
+        with self.assertNumQueries(1):
+            job.save()
+        self.assertEqual(job.version, 2)
+        self.assertEqual(Job.objects.get(pk=job.pk).version, 2)
+
+    def test_save_after_another_save(self):
+        first, second = Job.objects.get(pk=self.job.pk), Job.objects.get(pk=self.job.pk)
+        first.save()
+        second.description = 'Weekly'
+        second.save()
+        self.assertEqual(second.version, 3)
+        self.assertEqual(Job.objects.values_list('version', 'description').get(pk=self.job.pk), (3, 'Weekly'))
+
+
+class SyncPayloadTests(TestCase):
+    """Well-formed JSON of the wrong shape is refused without a server error."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('worker')
+        self.client.force_login(self.user)
+
+    def post(self, payload):
+        return self.client.post(reverse('timesheet:api_sync'), payload, content_type='application/json')
+
+    def test_wrong_container_types(self):
+        for payload in ({'entries': 5}, {'jobs': {'name': 'a'}}, {'delete': {'entries': 5}}, {'delete': [1]}):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+
+    def test_wrong_item_field_types(self):
+        response = self.post({
+            'jobs': [{'id': 'abc'}, {'name': 'a', 'client_id': [1]}, {'name': 'b', 'client_id': 'b'}],
+            'entries': [{'id': True}, {'job_client_id': {}}],
+        })
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual([job['status'] for job in results['jobs']], ['error', 'error', 'created'])
+        self.assertEqual(results['jobs'][0]['errors'], {'id': ['Must be an integer.']})
+        self.assertEqual(list(results['jobs'][1]['errors']), ['client_id'])
+        self.assertEqual([list(entry['errors']) for entry in results['entries']], [['id'], ['job_client_id']])
+
+
+class AnalyticsSnapshotTests(TestCase):
+    """The columnar snapshot must follow the table as it is refreshed, also by several workers."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(TIMESHEET_ANALYTICS_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(cache.clear)
+
+        self.user = User.objects.create_user('worker')
+        self.job = Job.objects.create(user=self.user, name='Garden')
+        self.entry = TimeEntry.objects.create(
+            user=self.user, job=self.job, date=date(2024, 3, 4), start_time=time(8), end_time=time(12), break_duration=0
+        )
+
+    def hours_by_job(self):
+        return analytics.hours_by_job(analytics.load_snapshot(self.user.pk))
+
+    def versions(self):
+        return sorted(child.name for child in analytics._user_dir(self.user.pk).iterdir() if child.is_dir())
+
+    def test_incremental_refresh(self):
+        self.assertEqual(self.hours_by_job(), {self.job.pk: 4.0})
+
+        TimeEntry.objects.create(
+            user=self.user, date=date(2024, 3, 5), start_time=time(22), end_time=time(2), break_duration=30
+        )
+        self.entry.end_time = time(10)
+        self.entry.save()
+        self.assertEqual(self.hours_by_job(), {self.job.pk: 2.0, None: 3.5})
+
+        self.entry.delete()
+        self.assertEqual(self.hours_by_job(), {None: 3.5})
+        self.assertEqual(len(self.versions()), 1)
+
+    def test_rows_committed_after_a_refresh(self):
+        self.assertEqual(self.hours_by_job(), {self.job.pk: 4.0})
+        high_water = timezone.now()
+
+        # Saved by transactions that stamped updated_at before the refresh but committed after it
+        late = TimeEntry.objects.create(
+            user=self.user, date=date(2024, 3, 5), start_time=time(8), end_time=time(10), break_duration=0
+        )
+        TimeEntry.objects.filter(pk=late.pk).update(updated_at=high_water - timedelta(hours=1))
+        caching.bump_generation(self.user.pk)
+        self.assertEqual(self.hours_by_job(), {self.job.pk: 4.0, None: 2.0})
+
+        # Within the overlap, even when a delete keeps the row count unchanged
+        later = TimeEntry.objects.create(
+            user=self.user, date=date(2024, 3, 6), start_time=time(8), end_time=time(9), break_duration=0
+        )
+        TimeEntry.objects.filter(pk=later.pk).update(updated_at=high_water - timedelta(minutes=1))
+        late.delete()
+        self.assertEqual(self.hours_by_job(), {self.job.pk: 4.0, None: 1.0})
+
+    def test_removed_version_is_rebuilt(self):
+        snapshot = analytics.load_snapshot(self.user.pk)
+        shutil.rmtree(analytics._user_dir(self.user.pk) / snapshot.meta['version'])
+        self.assertEqual(self.hours_by_job(), {self.job.pk: 4.0})
+
+    def test_concurrent_refreshes_keep_the_published_version(self):
+        snapshot = analytics.load_snapshot(self.user.pk)
+
+        def refresh():
+            for _ in range(20):
+                analytics._write(self.user.pk, snapshot.columns, snapshot.meta)
+
+        threads = [threading.Thread(target=refresh) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        meta = analytics._read_meta(analytics._user_dir(self.user.pk))
+        self.assertEqual(self.versions(), [meta['version']])
+        self.assertIsNotNone(analytics._open(self.user.pk, meta))
+
+
+class IdempotentPostTests(TestCase):
+    """A retried entry post must not save twice, whichever way it is resubmitted."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('worker')
+        self.client.force_login(self.user)
+        self.addCleanup(cache.clear)
+        self.url = reverse('timesheet:dashboard')
+        self.data = {'start_time': '08:00', 'end_time': '09:00', 'break_duration': 0, 'idempotency_key': 'retry-key-1'}
+
+    def test_plain_submit_after_script_post_redirects(self):
+        first = self.client.post(self.url, self.data, headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(first['Content-Type'], 'application/json')
+
+        # The script's fallback after a failed fetch
+        retry = self.client.post(self.url, self.data)
+        self.assertRedirects(retry, self.url, fetch_redirect_response=False)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(TimeEntry.objects.filter(user=self.user).count(), 1)
+
+        # A script retry still gets the fragment
+        again = self.client.post(self.url, self.data, headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(again.content, first.content)
+
+    def test_retry_during_first_attempt_is_not_held(self):
+        request = SimpleNamespace(user=self.user, path=self.url)
+        cache.set(idempotency._cache_key(request, self.data['idempotency_key']), idempotency._PENDING)
+
+        started = monotonic()
+        retry = self.client.post(self.url, self.data, headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertLess(monotonic() - started, 1)
+        self.assertEqual(retry.status_code, 409)
+        self.assertEqual(retry['Retry-After'], str(idempotency.RETRY_AFTER))
+        self.assertFalse(TimeEntry.objects.filter(user=self.user).exists())
+
+
+class HouseholdInvitationTests(TestCase):
+    """Nobody's hours are shared with a household until they accept its invitation."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.invitee = User.objects.create_user('invitee')
+        self.household = Household.objects.create(name='Family')
+        HouseholdMember.objects.create(household=self.household, user=self.owner, role=HouseholdMember.OWNER)
+        self.url = reverse('timesheet:household')
+
+    def test_invited_user_joins_on_accept(self):
+        self.client.force_login(self.owner)
+        self.client.post(self.url, {'action': 'invite', 'username': 'invitee'})
+        invitation = HouseholdInvitation.objects.get(household=self.household, user=self.invitee)
+        self.assertFalse(HouseholdMember.objects.filter(user=self.invitee).exists())
+
+        self.client.force_login(self.invitee)
+        self.assertContains(self.client.get(self.url), 'Family')
+        self.client.post(self.url, {'action': 'accept', 'invitation': invitation.pk})
+        self.assertEqual(HouseholdMember.objects.get(user=self.invitee).household, self.household)
+        self.assertFalse(HouseholdInvitation.objects.exists())
+
+    def test_declined_invitation_is_removed(self):
+        invitation = HouseholdInvitation.objects.create(
+            household=self.household, user=self.invitee, invited_by=self.owner
+        )
+        self.client.force_login(self.invitee)
+        self.client.post(self.url, {'action': 'decline', 'invitation': invitation.pk})
+        self.assertFalse(HouseholdInvitation.objects.exists())
+        self.assertFalse(HouseholdMember.objects.filter(user=self.invitee).exists())
+
+
+class InvoiceTests(TestCase):
+    """Stored invoice PDFs match what they print, and requests render them in-process."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user('worker')
+        self.jobs = [
+            Job.objects.create(user=self.user, name=name, hourly_rate=Decimal('20.00')) for name in ('Garden', 'Roof')
+        ]
+        for day, job in enumerate(self.jobs, start=4):
+            TimeEntry.objects.create(
+                user=self.user, job=job, date=date(2024, 3, day), start_time=time(8), end_time=time(12), break_duration=0
+            )
+
+    def build(self):
+        return invoicing.build_invoices(self.user, self.jobs, date(2024, 3, 1), date(2024, 3, 31))
+
+    def test_issue_date_is_part_of_the_stored_document(self):
+        first = self.build()[0]
+        with mock.patch.object(invoicing.timezone, 'localdate', return_value=first['issued'] + timedelta(days=1)):
+            later = self.build()[0]
+        self.assertEqual(first['number'], later['number'])
+        self.assertNotEqual(first['path'], later['path'])
+
+    def test_requests_render_in_process(self):
+        with mock.patch.object(invoicing, 'ProcessPoolExecutor', side_effect=AssertionError('forked')):
+            self.assertEqual(invoicing.render_invoices(self.build()), 2)
+
+
+class ClosedPeriodJobTests(TestCase):
+    """Jobs with entries in a closed period keep them, so frozen summaries stay true."""
+
+    def setUp(self):
+        # Cached closed periods would outlive the rolled back rows
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('worker')
+        self.job = Job.objects.create(user=self.user, name='Garden')
+        self.other = Job.objects.create(user=self.user, name='Gardening')
+        TimeEntry.objects.create(
+            user=self.user, job=self.job, date=date(2024, 3, 4), start_time=time(8), end_time=time(12), break_duration=0
+        )
+        periods.close_period(self.user, ClosedPeriod.WEEK, date(2024, 3, 4))
+        self.client.force_login(self.user)
+
+    def test_delete_is_refused(self):
+        self.client.post(reverse('timesheet:job_delete', args=[self.job.pk]))
+        self.assertEqual(TimeEntry.objects.get().job, self.job)
+
+    def test_merge_is_refused(self):
+        with self.assertRaises(merging.MergeError):
+            merging.merge_jobs(self.other, [self.job])
+        self.assertTrue(Job.objects.filter(pk=self.job.pk).exists())
+        # The target's own entries don't move, so it may still absorb open jobs
+        merging.merge_jobs(self.job, [self.other])
+
+
+@override_settings(TIMESHEET_EXPORT_STALE_SECONDS=60)
+class ExportRecoveryTests(TestCase):
+    """An export whose writer died mid-run is finished by ``run_exports``."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        user = User.objects.create_user('admin')
+        job = Job.objects.create(user=user, name='Site')
+        self.export = ExportJob.objects.create(
+            created_by=user, model=ExportJob.JOBS, object_ids=[job.pk], status=ExportJob.RUNNING,
+        )
+
+    def test_stale_running_export_is_reclaimed(self):
+        ExportJob.objects.filter(pk=self.export.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        call_command('run_exports', stdout=io.StringIO())
+        self.export.refresh_from_db()
+        self.assertEqual(self.export.status, ExportJob.DONE)
+        self.assertEqual(self.export.row_count, 1)
+
+    def test_live_running_export_is_left_alone(self):
+        ExportJob.objects.filter(pk=self.export.pk).update(heartbeat_at=timezone.now())
+        self.assertIsNone(exports.run_export(self.export.pk))
+        self.export.refresh_from_db()
+        self.assertEqual(self.export.status, ExportJob.RUNNING)
+
+
+class PartitionConversionSQLTests(SimpleTestCase):
+    """The DDL ``timesheet_partitions convert`` runs, checked without PostgreSQL."""
+
+    TABLE = partitioning.TABLE
+    LEGACY = partitioning.LEGACY_TABLE
+    FOREIGN_KEY = 'FOREIGN KEY (job_id) REFERENCES timesheet_app_job(id) DEFERRABLE INITIALLY DEFERRED'
+    CONSTRAINTS = [
+        ('timesheet_app_timeentry_job_id_fk', 'f', FOREIGN_KEY),
+        ('timesheet_app_timeentry_pkey', 'p', 'PRIMARY KEY (id)'),
+        ('timesheet_entry_client_uniq', 'u', 'UNIQUE (user_id, client_id)'),
+    ]
+    INDEXES = [
+        ('timesheet_app_timeentry_pkey',
+         f'CREATE UNIQUE INDEX timesheet_app_timeentry_pkey ON {TABLE} USING btree (id)'),
+        ('timesheet_entry_client_uniq',
+         f'CREATE UNIQUE INDEX timesheet_entry_client_uniq ON {TABLE} USING btree (user_id, client_id)'),
+        ('timesheet_entry_user_date_idx',
+         f'CREATE INDEX CONCURRENTLY timesheet_entry_user_date_idx ON {TABLE} USING btree (user_id, date)'),
+    ]
+
+    def statements(self, max_id=41):
+        return partitioning.conversion_sql(self.CONSTRAINTS, self.INDEXES, 2022, 2026, max_id)
+
+    def test_unique_constraints_include_the_partition_key(self):
+        statements = self.statements()
+        for constraint in [
+            'timesheet_app_timeentry_pkey PRIMARY KEY (id, date)',
+            'timesheet_entry_client_uniq UNIQUE (user_id, client_id, date)',
+            f'timesheet_app_timeentry_job_id_fk {self.FOREIGN_KEY}',
+        ]:
+            self.assertIn(f'ALTER TABLE {self.TABLE} ADD CONSTRAINT {constraint}', statements)
+
+    def test_indexes_are_moved_to_the_new_table(self):
+        statements = self.statements()
+        # Constraint indexes go with their constraints; plain ones are dropped and recreated
+        dropped = [statement for statement in statements if statement.startswith('DROP INDEX')]
+        self.assertEqual(dropped, ['DROP INDEX timesheet_entry_user_date_idx'])
+        recreated = f'CREATE INDEX timesheet_entry_user_date_idx ON {self.TABLE} USING btree (user_id, date)'
+        self.assertLess(statements.index(dropped[0]), statements.index(recreated))
+
+    def test_statement_order(self):
+        statements = self.statements()
+        self.assertEqual(statements[:4], [
+            f'ALTER TABLE {self.TABLE} DROP CONSTRAINT timesheet_app_timeentry_job_id_fk',
+            f'ALTER TABLE {self.TABLE} DROP CONSTRAINT timesheet_app_timeentry_pkey',
+            f'ALTER TABLE {self.TABLE} DROP CONSTRAINT timesheet_entry_client_uniq',
+            f'ALTER TABLE {self.TABLE} ALTER COLUMN id DROP IDENTITY IF EXISTS',
+        ])
+        create = f'CREATE TABLE {self.TABLE} (LIKE {self.LEGACY} INCLUDING DEFAULTS) PARTITION BY RANGE (date)'
+        self.assertLess(statements.index(f'ALTER TABLE {self.TABLE} RENAME TO {self.LEGACY}'), statements.index(create))
+        partitions = [statement.split()[5] for statement in statements if ' FOR VALUES FROM ' in statement]
+        self.assertEqual(partitions, [partitioning.partition_name(year) for year in range(2022, 2027)])
+        self.assertIn(f'CREATE TABLE {partitioning.DEFAULT_PARTITION} PARTITION OF {self.TABLE} DEFAULT', statements)
+        # Rows are copied once every constraint and index is in place
+        self.assertEqual(statements[-2:], [
+            f'INSERT INTO {self.TABLE} SELECT * FROM {self.LEGACY}',
+            f'DROP TABLE {self.LEGACY}',
+        ])
+
+    def test_sequence_continues_after_existing_ids(self):
+        self.assertIn(f"SELECT setval('{partitioning.SEQUENCE}', 41, true)", self.statements())
+        self.assertIn(f"SELECT setval('{partitioning.SEQUENCE}', 1, false)", self.statements(max_id=None))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Table partitioning needs PostgreSQL')
+class PartitionConversionTests(TransactionTestCase):
+    """Runs the conversion against the test database."""
+
+    def test_convert(self):
+        if partitioning.is_partitioned():
+            self.skipTest('The test database was converted before the run')
+        user = User.objects.create_user('worker')
+        entry = TimeEntry.objects.create(
+            user=user, date=date(2023, 6, 1), start_time=time(8), end_time=time(12), break_duration=0
+        )
+        dry_run = partitioning.convert(ahead=1, dry_run=True)
+        self.assertFalse(partitioning.is_partitioned())
+
+        self.assertEqual(partitioning.convert(ahead=1), dry_run)
+        self.assertTrue(partitioning.is_partitioned())
+        self.assertIn(partitioning.partition_name(2023), [name for name, _, _ in partitioning.partitions()])
+        self.assertEqual(TimeEntry.objects.get(date=date(2023, 6, 1)).pk, entry.pk)
+        later = TimeEntry.objects.create(
+            user=user, date=date(2023, 6, 2), start_time=time(8), end_time=time(12), break_duration=0
+        )
+        self.assertGreater(later.pk, entry.pk)
+
+
+class ArchiveTests(TestCase):
+    """Archived years must read back the same as the live table did."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(cache.clear)
+
+        self.user = User.objects.create_user('worker')
+        self.job = Job.objects.create(user=self.user, name='Garden')
+        TimeEntry.objects.create(
+            user=self.user, job=self.job, date=date(2020, 3, 2), start_time=time(8), end_time=time(12), break_duration=0
+        )
+        TimeEntry.objects.create(
+            user=self.user, date=date(2020, 3, 3), start_time=time(13), end_time=time(15), break_duration=0
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            archive.archive_year(self.user.pk, 2020)
+        self.client.force_login(self.user)
+
+    def test_closed_week_in_archived_year(self):
+        periods.close_period(self.user, ClosedPeriod.WEEK, date(2020, 3, 2))
+
+        totals = views._week_totals(self.user, date(2020, 3, 2))
+        self.assertEqual(totals['total_entries'], 2)
+        self.assertEqual(totals['week_data'][0]['entries'][0].job, self.job)
+        self.assertEqual(float(totals['weekly_total']), 6.0)
+
+        summary = self.client.get(reverse('timesheet:api_weekly_summary'), {'year': 2020, 'week': 10}).json()
+        self.assertEqual(summary['total_hours'], 6.0)
+        self.assertEqual({job['job_id']: job['hours'] for job in summary['jobs']}, {self.job.pk: 4.0, None: 2.0})
+
+    def test_merged_job_stays_on_archived_entries(self):
+        target = Job.objects.create(user=self.user, name='Gardening')
+        with self.captureOnCommitCallbacks(execute=True):
+            merging.merge_jobs(target, [self.job])
+
+        rows = [row for row in archive.iter_rows(self.user.pk) if row['job_id'] is not None]
+        self.assertEqual([(row['job_id'], row['job_name']) for row in rows], [(target.pk, 'Gardening')])
+        self.assertEqual(archive.minutes_by_job(self.user.pk, date(2020, 1, 1), date(2020, 12, 31)), {target.pk: 240, None: 120})
+
+        archive.restore_year(archive.archived_years(self.user.pk).get())
+        self.assertEqual(TimeEntry.objects.get(date=date(2020, 3, 2)).job, target)
+
+    def test_archived_entries_in_closed_period_block_merge(self):
+        periods.close_period(self.user, ClosedPeriod.WEEK, date(2020, 3, 2))
+        with self.assertRaises(merging.MergeError):
+            merging.merge_jobs(Job.objects.create(user=self.user, name='Gardening'), [self.job])
+
+    def test_rolled_back_archive_leaves_no_file(self):
+        TimeEntry.objects.create(
+            user=self.user, date=date(2020, 3, 4), start_time=time(8), end_time=time(9), break_duration=0
+        )
+        directory = f'{archive.ARCHIVE_DIR}/{self.user.pk}'
+        files = default_storage.listdir(directory)[1]
+        with mock.patch('django.db.models.QuerySet._raw_delete', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                archive.archive_year(self.user.pk, 2020)
+        self.assertEqual(default_storage.listdir(directory)[1], files)
+        self.assertEqual(TimeEntry.objects.filter(date__year=2020).count(), 1)
+
+
+class ArchivedReportTests(TestCase):
+    """Archiving a year must not change any report covering it."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=directory, TIMESHEET_ANALYTICS_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(cache.clear)
+
+        self.user = User.objects.create_user('worker')
+        self.job = Job.objects.create(user=self.user, name='Garden', hourly_rate=Decimal('20.00'))
+        for day, job in ((2, self.job), (3, None), (4, self.job)):
+            TimeEntry.objects.create(
+                user=self.user, job=job, date=date(2020, 3, day), start_time=time(8), end_time=time(11), break_duration=0
+            )
+        TimeEntry.objects.create(
+            user=self.user, job=self.job, date=date(2020, 3, 4), start_time=time(13), end_time=time(14), break_duration=0
+        )
+        self.client.force_login(self.user)
+
+    def assertUnchangedByArchiving(self, report):
+        before = report()
+        with self.captureOnCommitCallbacks(execute=True):
+            archive.archive_year(self.user.pk, 2020)
+        self.assertFalse(TimeEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(report(), before)
+
+    def test_household_summary(self):
+        family = Household.objects.create(name='Family')
+        HouseholdMember.objects.create(household=family, user=self.user, role=HouseholdMember.OWNER)
+        memberships = list(HouseholdMember.objects.filter(household=family).select_related('user'))
+
+        def report():
+            summary = household.compute_summary(memberships, date(2020, 3, 1), date(2020, 3, 31))
+            return summary['total_hours'], summary['by_member'], summary['by_job']
+        self.assertUnchangedByArchiving(report)
+
+    def test_invoices(self):
+        def report():
+            invoices = invoicing.build_invoices(self.user, [self.job], date(2020, 3, 1), date(2020, 3, 31))
+            return [(invoice['lines'], invoice['total'], invoice['hash']) for invoice in invoices]
+        self.assertUnchangedByArchiving(report)
+
+    def test_api_job_detail(self):
+        url = reverse('timesheet:api_job_detail', args=[self.job.pk])
+
+        def report():
+            job = self.client.get(url).json()
+            return job['entry_count'], job['total_hours']
+        self.assertUnchangedByArchiving(report)
+
+    def test_job_list(self):
+        def report():
+            # Only the context matters here, not the template
+            with mock.patch.object(views, 'render', side_effect=lambda request, template, context: context):
+                context = views.job_list(SimpleNamespace(user=self.user))
+            return [(job.pk, job.entry_count, job.hours) for job in context['jobs']], context['total_entries']
+        self.assertUnchangedByArchiving(report)
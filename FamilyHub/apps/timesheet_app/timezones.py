@@ -0,0 +1,55 @@
+"""
+Per-user timezones for the timesheet.
+
+Entry dates are wall-clock dates in the owner's zone, so "today", "this week"
+and the future-date checks have to be worked out in that zone as well. The
+zone name is cached per user (cleared when their profile changes, see
+signals.py) and each ``ZoneInfo`` is built once per process.
+UserTimezoneMiddleware activates it, after which ``timezone.localdate()`` and
+``timezone.localtime()`` answer for the user without a query.
+"""
+
+import functools
+import zoneinfo
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import TimesheetProfile
+
+
+def default_timezone_name():
+    """Zone for users without a profile (``TIMESHEET_DEFAULT_TIMEZONE``)."""
+    return getattr(settings, 'TIMESHEET_DEFAULT_TIMEZONE', 'Pacific/Auckland')
+
+
+@functools.lru_cache(maxsize=None)
+def get_zone(name):
+    return zoneinfo.ZoneInfo(name)
+
+
+@functools.lru_cache(maxsize=1)
+def timezone_choices():
+    return [(name, name.replace('_', ' ')) for name in sorted(zoneinfo.available_timezones())]
+
+
+def _cache_key(user_id):
+    return f'timesheet:tz:{user_id}'
+
+
+def user_timezone_name(user_id):
+    key = _cache_key(user_id)
+    name = cache.get(key)
+    if name is None:
+        name = TimesheetProfile.objects.filter(user_id=user_id).values_list('timezone', flat=True).first()
+        name = name or default_timezone_name()
+        cache.set(key, name, timeout=None)
+    return name
+
+
+def user_timezone(user_id):
+    return get_zone(user_timezone_name(user_id))
+
+
+def forget_user_timezone(user_id):
+    cache.delete(_cache_key(user_id))
@@ -1,5 +1,6 @@
 from django.urls import path
 from . import views
+from . import api_views
 
 app_name = 'timesheet'
 
@@ -8,10 +9,24 @@ urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('daily/', views.daily_entry, name='daily_entry'),
     path('weekly/', views.weekly_summary, name='weekly_summary'),
+    path('household/', views.household, name='household'),
+    path('household/review/', views.week_review, name='week_review'),
+    path('leave/', views.leave, name='leave'),
+    path('periods/', views.closed_periods, name='closed_periods'),
+    path('preferences/', views.preferences, name='preferences'),
+    
+    # Invoicing
+    path('invoices/', views.invoices, name='invoices'),
+    path('invoices/<slug:digest>.pdf', views.invoice_download, name='invoice_download'),
+    
+    # Exports
+    path('export/entries.csv', views.export_entries, name='export_entries'),
+    path('exports/<int:pk>/download/', views.export_download, name='export_download'),
     
     # Job management
     path('jobs/', views.job_list, name='job_list'),
     path('jobs/add/', views.job_create, name='job_create'),
+    path('jobs/merge/', views.job_merge, name='job_merge'),
     path('jobs/<int:pk>/edit/', views.job_edit, name='job_edit'),
     path('jobs/<int:pk>/delete/', views.job_delete, name='job_delete'),
     
@@ -22,6 +37,18 @@ urlpatterns = [
     
     # AJAX endpoints
     path('api/validate-overlap/', views.validate_overlap, name='validate_overlap'),
+    path('api/intervals/', views.day_intervals, name='day_intervals'),
+    path('api/jobs/autocomplete/', views.job_autocomplete, name='job_autocomplete'),
+    path('api/heatmap/', views.heatmap_data, name='heatmap_data'),
+    path('api/charts/hours/', views.chart_hours, name='chart_hours'),
+    
+    # JSON API
+    path('api/sync/', api_views.sync, name='api_sync'),
+    path('api/v1/jobs/', api_views.api_jobs, name='api_jobs'),
+    path('api/v1/jobs/<int:pk>/', api_views.api_job_detail, name='api_job_detail'),
+    path('api/v1/entries/', api_views.api_entries, name='api_entries'),
+    path('api/v1/entries/<int:pk>/', api_views.api_entry_detail, name='api_entry_detail'),
+    path('api/v1/summary/weekly/', api_views.api_weekly_summary, name='api_weekly_summary'),
     
     # Debug endpoints (only in DEBUG mode)
     path('debug/', views.debug_showcase, name='debug_showcase'),
@@ -1,36 +1,116 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
 from django.db.models import Sum, Q, Count, F, DurationField
 from django.db.models.functions import Cast
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.views.decorators.http import condition, require_GET
 from datetime import datetime, timedelta, date
 from decimal import Decimal
-import pytz
-from .models import Job, TimeEntry
-from .forms import JobForm, TimeEntryForm, QuickTimeEntryForm, DateFilterForm
+from array import array
+import calendar
+import copy
+import csv
+import sys
+from .models import ClosedPeriod, ExportJob, HouseholdInvitation, HouseholdMember, Job, LeaveRecord, WeekApproval, TimeEntry, TimesheetProfile, worked_minutes_expression
+from .forms import (
+    JobForm, TimeEntryForm, QuickTimeEntryForm, DateFilterForm, HouseholdForm, HouseholdMemberForm,
+    InvoiceForm, JobMergeForm, TimesheetProfileForm, ClosePeriodForm, LeaveRecordForm,
+)
+from .search import search_jobs
+from .caching import get_generation, user_cache_key
+from .idempotency import idempotent
+from .concurrency import VersionConflict, save_form_versioned
+from .merging import MergeError, merge_jobs
+from . import analytics
+from . import approvals
+from . import archive
+from . import leave as leave_balances
+from . import periods
+from .forecast import forecast_for_user
+from . import household as household_stats
+from . import invoicing
+from . import charts
+
+
+def _wants_fragment(request):
+    """True for script-driven posts that only need the changed fragment back."""
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def _entry_fragment(request, entry):
+    """
+    The rendered row for a just-added entry plus its day's new total.
+
+    The row's job comes from the validated form, so rendering it needs no
+    query and no context processors; the total and count are one aggregate.
+    """
+    day = TimeEntry.objects.filter(user=request.user, date=entry.date).aggregate(
+        minutes=Sum(worked_minutes_expression()),
+        count=Count('id'),
+    )
+    return JsonResponse({
+        'entry_id': entry.pk,
+        'date': entry.date.isoformat(),
+        'html': render_to_string('timesheet/partials/entry_row.html', {'entry': entry}),
+        'total_hours': round((day['minutes'] or 0) / 60, 2),
+        'entry_count': day['count'],
+    })
+
+
+def _form_error_messages(form):
+    return [
+        error if field == '__all__' else f'{form.fields[field].label or field}: {error}'
+        for field, errors in form.errors.items()
+        for error in errors
+    ]
+
+
+def _fragment_errors(error_messages):
+    return JsonResponse({'errors': list(error_messages)}, status=400)
+
+
+CONFLICT_MESSAGE = (
+    'This was changed on another device while you were editing. '
+    'The saved values are shown below; submit again to keep yours.'
+)
+
+
+def _rebase(data, instance):
+    """Copy of posted form data moved onto ``instance``'s current version."""
+    data = data.copy()
+    data['version'] = instance.version
+    return data
+
+
+def _entry_values(entry):
+    return {
+        'id': entry.pk,
+        'version': entry.version,
+        'job': entry.job_id,
+        'job_name': entry.job.display_name() if entry.job else None,
+        'date': entry.date.isoformat(),
+        'start_time': entry.start_time.strftime('%H:%M'),
+        'end_time': entry.end_time.strftime('%H:%M'),
+        'break_duration': entry.break_duration,
+    }
 
 
 @login_required
+@idempotent
 def dashboard(request):
     """Dashboard view showing today's overview with quick entry form."""
-    # Set timezone to Auckland
-    auckland_tz = pytz.timezone('Pacific/Auckland')
-    now = timezone.now().astimezone(auckland_tz)
+    # In the user's timezone (see UserTimezoneMiddleware)
+    now = timezone.localtime()
     today = now.date()
     
-    # Get today's entries
-    today_entries = TimeEntry.objects.filter(
-        user=request.user,
-        date=today
-    ).select_related('job').order_by('start_time')
-    
-    # Calculate today's total hours
-    today_total = sum(entry.total_hours() for entry in today_entries)
-    
     # Handle quick entry form
     if request.method == 'POST':
         form = QuickTimeEntryForm(user=request.user, data=request.POST)
@@ -41,9 +121,13 @@ def dashboard(request):
             try:
                 entry.full_clean()
                 entry.save()
+                if _wants_fragment(request):
+                    return _entry_fragment(request, entry)
                 messages.success(request, 'Time entry added successfully!')
                 return redirect('timesheet:dashboard')
             except ValidationError as e:
+                if _wants_fragment(request):
+                    return _fragment_errors(e.messages)
                 # Handle different types of validation errors
                 if hasattr(e, 'error_dict'):
                     # Field-specific errors
@@ -60,11 +144,22 @@ def dashboard(request):
                     messages.error(request, str(e))
             except Exception as e:
                 messages.error(request, 'An unexpected error occurred. Please try again.')
+        elif _wants_fragment(request):
+            return _fragment_errors(_form_error_messages(form))
         else:
             messages.error(request, 'Please correct the errors below.')
     else:
         form = QuickTimeEntryForm(user=request.user)
     
+    # Get today's entries
+    today_entries = TimeEntry.objects.filter(
+        user=request.user,
+        date=today
+    ).select_related('job').order_by('start_time')
+    
+    # Calculate today's total hours
+    today_total = sum(entry.total_hours() for entry in today_entries)
+    
     context = {
         'today': today,
         'current_datetime': now,
@@ -75,16 +170,17 @@ def dashboard(request):
         'today_total': today_total,
         'form': form,
         'has_jobs': Job.objects.filter(user=request.user).exists(),
+        'forecast': forecast_for_user(request.user.pk, today),
     }
     return render(request, 'timesheet/dashboard.html', context)
 
 
 @login_required
+@idempotent
 def daily_entry(request):
     """Daily entry view with date picker to select any date."""
     # Get current date for comparison
-    auckland_tz = pytz.timezone('Pacific/Auckland')
-    today = timezone.now().astimezone(auckland_tz).date()
+    today = timezone.localdate()
     
     # Get date from GET parameter or default to today
     selected_date = request.GET.get('date')
@@ -100,15 +196,6 @@ def daily_entry(request):
     else:
         selected_date = today
     
-    # Get entries for selected date
-    entries = TimeEntry.objects.filter(
-        user=request.user,
-        date=selected_date
-    ).select_related('job').order_by('start_time')
-    
-    # Calculate daily total
-    daily_total = sum(entry.total_hours() for entry in entries)
-    
     # Handle form submission
     if request.method == 'POST':
         form = TimeEntryForm(user=request.user, data=request.POST)
@@ -118,19 +205,34 @@ def daily_entry(request):
             try:
                 entry.full_clean()
                 entry.save()
+                if _wants_fragment(request):
+                    return _entry_fragment(request, entry)
                 messages.success(request, 'Time entry added successfully!')
                 return redirect(f'{reverse("timesheet:daily_entry")}?date={selected_date}')
             except ValidationError as e:
+                if _wants_fragment(request):
+                    return _fragment_errors(e.messages)
                 error_msg = ', '.join(e.messages) if hasattr(e, 'messages') else str(e)
                 messages.error(request, f'Validation error: {error_msg}')
             except Exception as e:
                 messages.error(request, 'An unexpected error occurred. Please try again.')
+        elif _wants_fragment(request):
+            return _fragment_errors(_form_error_messages(form))
         else:
             messages.error(request, 'Please correct the form errors below.')
     else:
         # Pre-fill form with selected date
         form = TimeEntryForm(user=request.user, initial={'date': selected_date})
     
+    # Get entries for selected date
+    entries = TimeEntry.objects.filter(
+        user=request.user,
+        date=selected_date
+    ).select_related('job').order_by('start_time')
+    
+    # Calculate daily total
+    daily_total = sum(entry.total_hours() for entry in entries)
+    
     # Date filter form
     date_form = DateFilterForm(initial={'date': selected_date})
     
@@ -160,12 +262,52 @@ def daily_entry(request):
     return render(request, 'timesheet/daily_entry.html', context)
 
 
+def _week_totals(user, week_start):
+    """Entries and totals for each day of the week starting ``week_start``."""
+    week_end = week_start + timedelta(days=6)
+    week_entries = list(TimeEntry.objects.filter(
+        user=user,
+        date__range=[week_start, week_end]
+    ).select_related('job').order_by('date', 'start_time'))
+    archived = list(archive.archived_years(user.pk, week_start, week_end))
+    if archived:
+        # Entries of archived years are read back from cold storage
+        week_entries = sorted(
+            archive.archived_entries(user.pk, week_start, week_end, years=archived) + week_entries,
+            key=lambda entry: (entry.date, entry.start_time),
+        )
+    
+    # Organize entries by day
+    week_data = []
+    weekly_total = Decimal('0.00')
+    
+    for i in range(7):
+        current_date_iter = week_start + timedelta(days=i)
+        day_entries = [entry for entry in week_entries if entry.date == current_date_iter]
+        day_total = sum(entry.total_hours() for entry in day_entries)
+        weekly_total += day_total
+        
+        week_data.append({
+            'date': current_date_iter,
+            'day_name': current_date_iter.strftime('%A'),
+            'weekday': current_date_iter.weekday(),  # 0=Monday, 6=Sunday
+            'entries': day_entries,
+            'total': day_total,
+        })
+    
+    return {
+        'week_data': week_data,
+        'weekly_total': weekly_total,
+        'days_worked': len(set(entry.date for entry in week_entries)),
+        'total_entries': len(week_entries),
+    }
+
+
 @login_required
 def weekly_summary(request):
     """Weekly summary view showing current week with totals."""
     # Get current date and week info
-    auckland_tz = pytz.timezone('Pacific/Auckland')
-    current_date = timezone.now().astimezone(auckland_tz).date()
+    current_date = timezone.localdate()
     current_year, current_week_num, _ = current_date.isocalendar()
     
     # Get week start date from GET parameter or default to current week
@@ -184,34 +326,18 @@ def weekly_summary(request):
     # Calculate week end
     week_end = week_start + timedelta(days=6)
     
-    # Get all entries for the week
-    week_entries = TimeEntry.objects.filter(
-        user=request.user,
-        date__range=[week_start, week_end]
-    ).select_related('job').order_by('date', 'start_time')
-    
-    # Organize entries by day
-    week_data = []
-    weekly_total = Decimal('0.00')
-    
-    for i in range(7):
-        current_date_iter = week_start + timedelta(days=i)
-        day_entries = [entry for entry in week_entries if entry.date == current_date_iter]
-        day_total = sum(entry.total_hours() for entry in day_entries)
-        weekly_total += day_total
-        
-        week_data.append({
-            'date': current_date_iter,
-            'day_name': current_date_iter.strftime('%A'),
-            'weekday': current_date_iter.weekday(),  # 0=Monday, 6=Sunday
-            'entries': day_entries,
-            'total': day_total,
-            'is_today': current_date_iter == current_date,
-        })
-    
-    # Calculate statistics
-    days_worked = set(entry.date for entry in week_entries)
-    total_entries_count = len(week_entries)
+    # A closed week can't change, so it is computed once and kept
+    closed_period = periods.covering(request.user.pk, week_start, week_end)
+    if closed_period:
+        totals = periods.frozen(
+            closed_period, 'weekly_summary', lambda: _week_totals(request.user, week_start), week_start
+        )
+    else:
+        totals = _week_totals(request.user, week_start)
+    week_data = totals['week_data']
+    weekly_total = totals['weekly_total']
+    for day in week_data:
+        day['is_today'] = day['date'] == current_date
     
     # Navigation weeks
     prev_week_start = week_start - timedelta(weeks=1)
@@ -226,14 +352,20 @@ def weekly_summary(request):
     # Calculate daily average
     daily_average = round(float(weekly_total) / 7, 1) if weekly_total > 0 else 0
     
+    # Whole-history statistics from the columnar snapshot (no ORM instances)
+    history_stats = analytics.summary_statistics(analytics.load_snapshot(request.user.pk))
+    
     context = {
         'week_start': week_start,
         'week_end': week_end,
         'week_data': week_data,
         'weekly_total': weekly_total,
         'daily_average': daily_average,
-        'days_worked': len(days_worked),
-        'total_entries': total_entries_count,
+        'history_stats': history_stats,
+        'days_worked': totals['days_worked'],
+        'total_entries': totals['total_entries'],
+        'closed_period': closed_period,
+        'approval': WeekApproval.objects.filter(user=request.user, week_start=week_start).first(),
         'current_week': week,
         'current_year': year,
         'prev_year': prev_year,
@@ -248,15 +380,21 @@ def weekly_summary(request):
 @login_required
 def job_list(request):
     """List all jobs for the current user with optimized queries."""
-    # Optimized query with annotations
-    jobs = Job.objects.filter(user=request.user).annotate(
-        entry_count=Count('time_entries')
-    ).order_by('name', 'address')
+    jobs = list(Job.objects.filter(user=request.user).order_by('name', 'address'))
+    
+    # Per-job hours and counts come from the analytics snapshot, which also
+    # covers archived years, instead of job.total_hours() and Count()
+    snapshot = analytics.load_snapshot(request.user.pk)
+    hours_by_job = analytics.hours_by_job(snapshot)
+    entries_by_job = analytics.entries_by_job(snapshot)
+    for job in jobs:
+        job.hours = Decimal(str(hours_by_job.get(job.pk, 0))).quantize(Decimal('0.01'))
+        job.entry_count = entries_by_job.get(job.pk, 0)
     
     # Calculate statistics using annotations
-    total_jobs = jobs.count()
+    total_jobs = len(jobs)
     total_entries = sum(job.entry_count for job in jobs)
-    total_hours = sum(job.total_hours() for job in jobs)  # Keep using model method for accuracy
+    total_hours = sum((job.hours for job in jobs), Decimal('0.00'))
     avg_entries_per_job = round(total_entries / total_jobs, 1) if total_jobs > 0 else 0
     
     context = {
@@ -301,9 +439,17 @@ def job_edit(request, pk):
     if request.method == 'POST':
         form = JobForm(request.POST, instance=job)
         if form.is_valid():
-            form.save()
-            messages.success(request, f'Job "{job.display_name()}" updated successfully!')
-            return redirect('timesheet:job_list')
+            try:
+                save_form_versioned(form)
+                messages.success(request, f'Job "{job.display_name()}" updated successfully!')
+                return redirect('timesheet:job_list')
+            except VersionConflict as conflict:
+                if conflict.current is None:
+                    messages.error(request, 'This job was deleted on another device.')
+                    return redirect('timesheet:job_list')
+                messages.warning(request, CONFLICT_MESSAGE)
+                job = conflict.current
+                form = JobForm(_rebase(request.POST, job), instance=copy.copy(job))
         else:
             messages.error(request, 'Please correct the errors below.')
     else:
@@ -327,6 +473,11 @@ def job_delete(request, pk):
     entry_count = TimeEntry.objects.filter(job=job).count()
     
     if request.method == 'POST':
+        try:
+            periods.check_jobs_open(request.user.pk, [job.pk])
+        except periods.PeriodClosed as exc:
+            messages.error(request, exc.message)
+            return redirect('timesheet:job_list')
         job_name = job.display_name()
         job.delete()
         messages.success(request, f'Job "{job_name}" deleted successfully!')
@@ -340,6 +491,33 @@ def job_delete(request, pk):
 
 
 @login_required
+def job_merge(request):
+    """Fold duplicate jobs into one, moving all of their time entries."""
+    if request.method == 'POST':
+        form = JobMergeForm(user=request.user, data=request.POST)
+        if form.is_valid():
+            target = form.cleaned_data['target']
+            sources = form.cleaned_data['sources']
+            try:
+                moved = merge_jobs(target, sources)
+            except MergeError as exc:
+                messages.error(request, str(exc))
+            else:
+                messages.success(
+                    request,
+                    f'Merged {len(sources)} job(s) into "{target.display_name()}" ({moved} entries moved).'
+                )
+                return redirect('timesheet:job_list')
+        else:
+            messages.error(request, 'Please correct the errors below.')
+    else:
+        form = JobMergeForm(user=request.user)
+
+    return render(request, 'timesheet/job_merge.html', {'form': form})
+
+
+@login_required
+@idempotent
 def entry_add(request):
     """Add a new time entry."""
     initial_data = {}
@@ -376,21 +554,37 @@ def entry_add(request):
 
 
 @login_required
+@idempotent
 def entry_edit(request, pk):
     """Edit an existing time entry."""
     entry = get_object_or_404(TimeEntry, pk=pk, user=request.user)
+    conflict_entry = None
     
     if request.method == 'POST':
         form = TimeEntryForm(user=request.user, data=request.POST, instance=entry)
+        # is_valid() runs the model's full_clean(), so one conditional UPDATE is the only write
         if form.is_valid():
             try:
-                entry = form.save()
-                entry.full_clean()
-                entry.save()
+                entry = save_form_versioned(form)
+                if _wants_fragment(request):
+                    return _entry_fragment(request, entry)
                 messages.success(request, 'Time entry updated successfully!')
                 return redirect(f'{reverse("timesheet:daily_entry")}?date={entry.date}')
-            except ValidationError as e:
-                messages.error(request, f'Error: {e}')
+            except VersionConflict as conflict:
+                if conflict.current is None:
+                    messages.error(request, 'This entry was deleted on another device.')
+                    return redirect('timesheet:daily_entry')
+                if _wants_fragment(request):
+                    return JsonResponse({
+                        'errors': [CONFLICT_MESSAGE],
+                        'current': _entry_values(conflict.current),
+                    }, status=409)
+                messages.warning(request, CONFLICT_MESSAGE)
+                entry = conflict.current
+                conflict_entry = _entry_values(entry)
+                form = TimeEntryForm(user=request.user, data=_rebase(request.POST, entry), instance=copy.copy(entry))
+        elif _wants_fragment(request):
+            return _fragment_errors(_form_error_messages(form))
         else:
             messages.error(request, 'Please correct the errors below.')
     else:
@@ -399,6 +593,7 @@ def entry_edit(request, pk):
     context = {
         'form': form,
         'entry': entry,
+        'conflict_entry': conflict_entry,
         'title': f'Edit Time Entry for {entry.date}',
     }
     return render(request, 'timesheet/entry_form.html', context)
@@ -411,6 +606,11 @@ def entry_delete(request, pk):
     
     if request.method == 'POST':
         entry_date = entry.date
+        try:
+            periods.check_open(request.user.pk, entry_date)
+        except periods.PeriodClosed as exc:
+            messages.error(request, exc.message)
+            return redirect(f'{reverse("timesheet:daily_entry")}?date={entry_date}')
         entry.delete()
         messages.success(request, 'Time entry deleted successfully!')
         return redirect(f'{reverse("timesheet:daily_entry")}?date={entry_date}')
@@ -421,6 +621,332 @@ def entry_delete(request, pk):
     return render(request, 'timesheet/entry_delete.html', context)
 
 
+@login_required
+def household(request):
+    """Combined weekly or monthly hours for every member of the user's household."""
+    today = timezone.localdate()
+
+    membership = HouseholdMember.objects.filter(user=request.user).select_related('household').order_by('pk').first()
+    household_form = HouseholdForm()
+    member_form = HouseholdMemberForm(household=membership and membership.household)
+
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'create' and membership is None:
+            household_form = HouseholdForm(data=request.POST)
+            if household_form.is_valid():
+                new_household = household_form.save()
+                HouseholdMember.objects.create(
+                    household=new_household, user=request.user, role=HouseholdMember.OWNER
+                )
+                messages.success(request, f'Household "{new_household.name}" created successfully!')
+                return redirect('timesheet:household')
+        elif action == 'invite' and membership and membership.role == HouseholdMember.OWNER:
+            member_form = HouseholdMemberForm(household=membership.household, data=request.POST)
+            if member_form.is_valid():
+                HouseholdInvitation.objects.create(
+                    household=membership.household, user=member_form.cleaned_data['user'], invited_by=request.user
+                )
+                messages.success(
+                    request, f'{member_form.cleaned_data["username"]} invited. They join once they accept.'
+                )
+                return redirect('timesheet:household')
+        elif action == 'cancel_invitation' and membership and membership.role == HouseholdMember.OWNER:
+            membership.household.invitations.filter(pk=request.POST.get('invitation')).delete()
+            return redirect('timesheet:household')
+        elif action in ('accept', 'decline') and membership is None:
+            invitation = HouseholdInvitation.objects.filter(
+                user=request.user, pk=request.POST.get('invitation')
+            ).select_related('household').first()
+            if invitation is None:
+                messages.error(request, 'That invitation is no longer available.')
+            elif action == 'accept':
+                with transaction.atomic():
+                    HouseholdMember.objects.create(household=invitation.household, user=request.user)
+                    # A user belongs to at most one household
+                    HouseholdInvitation.objects.filter(user=request.user).delete()
+                messages.success(request, f'You joined "{invitation.household.name}".')
+            else:
+                invitation.delete()
+                messages.info(request, f'Invitation to "{invitation.household.name}" declined.')
+            return redirect('timesheet:household')
+        else:
+            messages.error(request, 'Invalid request')
+
+    if membership is None:
+        invitations = HouseholdInvitation.objects.filter(user=request.user).select_related('household', 'invited_by')
+        return render(request, 'timesheet/household.html', {
+            'household_form': household_form,
+            'invitations': invitations,
+        })
+
+    period = request.GET.get('period')
+    if period not in household_stats.PERIODS:
+        period = household_stats.WEEK
+    try:
+        selected_date = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        selected_date = today
+
+    memberships = list(membership.household.memberships.select_related('user').order_by('user__username'))
+    summary = household_stats.household_summary(membership.household, memberships, period, selected_date)
+
+    next_start = household_stats.adjacent_period(period, summary['start'], 1)
+    is_owner = membership.role == HouseholdMember.OWNER
+    context = {
+        'household': membership.household,
+        'is_owner': is_owner,
+        'pending_weeks': membership.household.pending_weeks,
+        'memberships': memberships,
+        'member_form': member_form,
+        'invitations': membership.household.invitations.select_related('user') if is_owner else [],
+        'period': period,
+        'summary': summary,
+        'prev_date': household_stats.adjacent_period(period, summary['start'], -1),
+        'next_date': next_start if next_start <= today else None,
+    }
+    return render(request, 'timesheet/household.html', context)
+
+
+REVIEW_ACTIONS = {
+    'approve': (WeekApproval.APPROVED, 'approved'),
+    'reject': (WeekApproval.REJECTED, 'rejected'),
+}
+
+
+@login_required
+def week_review(request):
+    """The household owner approves or rejects members' weeks, many at a time."""
+    membership = HouseholdMember.objects.filter(
+        user=request.user, role=HouseholdMember.OWNER
+    ).select_related('household').order_by('pk').first()
+    if membership is None:
+        messages.error(request, 'Only a household owner can review weeks.')
+        return redirect('timesheet:household')
+    household = membership.household
+
+    if request.method == 'POST':
+        action = REVIEW_ACTIONS.get(request.POST.get('action'))
+        try:
+            approval_ids = [int(pk) for pk in request.POST.getlist('weeks')]
+        except ValueError:
+            approval_ids = []
+        if action is None or not approval_ids:
+            messages.error(request, 'Select at least one week to approve or reject.')
+        else:
+            status, verb = action
+            note = request.POST.get('note', '').strip()[:200]
+            changed = approvals.review_weeks(household, request.user, approval_ids, status, note=note)
+            messages.success(request, f'{changed} week(s) {verb}.')
+        return redirect('timesheet:week_review')
+
+    context = {
+        'household': household,
+        # Kept as a counter (see approvals.py); the list below shows the oldest weeks only
+        'pending_count': household.pending_weeks,
+        'weeks': approvals.pending_weeks(household),
+    }
+    return render(request, 'timesheet/week_review.html', context)
+
+
+@login_required
+def invoices(request):
+    """Generate client invoices for selected jobs over a date range."""
+    today = timezone.localdate()
+    generated = []
+
+    if request.method == 'POST':
+        form = InvoiceForm(user=request.user, data=request.POST)
+        if form.is_valid():
+            generated = invoicing.build_invoices(
+                request.user,
+                form.cleaned_data['jobs'],
+                form.cleaned_data['start_date'],
+                form.cleaned_data['end_date'],
+            )
+            rendered = invoicing.render_invoices(generated)
+            if generated:
+                messages.success(
+                    request,
+                    f'{len(generated)} invoice(s) ready ({rendered} newly rendered).'
+                )
+            else:
+                messages.warning(request, 'No time entries for the selected jobs in that period.')
+        else:
+            messages.error(request, 'Please correct the errors below.')
+    else:
+        # Default to last month
+        last_month_end = today.replace(day=1) - timedelta(days=1)
+        form = InvoiceForm(user=request.user, initial={
+            'start_date': last_month_end.replace(day=1),
+            'end_date': last_month_end,
+            'jobs': Job.objects.filter(user=request.user, hourly_rate__isnull=False),
+        })
+
+    context = {
+        'form': form,
+        'invoices': generated,
+    }
+    return render(request, 'timesheet/invoices.html', context)
+
+
+@login_required
+def invoice_download(request, digest):
+    """Serve a previously rendered invoice PDF."""
+    path = invoicing.invoice_path(request.user.pk, digest)
+    if not default_storage.exists(path):
+        raise Http404('Invoice not found')
+    return FileResponse(
+        default_storage.open(path, 'rb'),
+        as_attachment=True,
+        filename=f'invoice-{digest[:8]}.pdf',
+        content_type='application/pdf',
+    )
+
+
+@login_required
+def preferences(request):
+    """Timesheet preferences; currently the user's timezone."""
+    profile = TimesheetProfile.objects.filter(user=request.user).first() or TimesheetProfile(user=request.user)
+    if request.method == 'POST':
+        form = TimesheetProfileForm(request.POST, instance=profile)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Preferences saved.')
+            return redirect('timesheet:preferences')
+        messages.error(request, 'Please correct the errors below.')
+    else:
+        form = TimesheetProfileForm(instance=profile)
+
+    context = {
+        'form': form,
+        'now': timezone.localtime(),
+    }
+    return render(request, 'timesheet/preferences.html', context)
+
+
+@login_required
+def leave(request):
+    """Leave balances and records; the balances are kept current as entries change."""
+    if request.method == 'POST' and request.POST.get('action') == 'delete':
+        record = get_object_or_404(LeaveRecord, pk=request.POST.get('record'), user=request.user)
+        record.delete()
+        messages.success(request, 'Leave record deleted.')
+        return redirect('timesheet:leave')
+
+    if request.method == 'POST':
+        form = LeaveRecordForm(request.POST, instance=LeaveRecord(user=request.user))
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Leave recorded.')
+            return redirect('timesheet:leave')
+        messages.error(request, 'Please correct the errors below.')
+    else:
+        today = timezone.localdate()
+        form = LeaveRecordForm(initial={'start': today, 'end': today})
+
+    context = {
+        'form': form,
+        'balances': leave_balances.balances(request.user.pk),
+        'records': LeaveRecord.objects.filter(user=request.user).order_by('-start')[:50],
+    }
+    return render(request, 'timesheet/leave.html', context)
+
+
+@login_required
+def closed_periods(request):
+    """Close weeks or months once payroll is done, or reopen them for corrections."""
+    if request.method == 'POST' and request.POST.get('action') == 'reopen':
+        period = get_object_or_404(ClosedPeriod, pk=request.POST.get('period'), user=request.user)
+        periods.reopen_period(period)
+        messages.success(request, f'{period.start:%d %b} - {period.end:%d %b %Y} reopened.')
+        return redirect('timesheet:closed_periods')
+
+    if request.method == 'POST':
+        form = ClosePeriodForm(data=request.POST)
+        if form.is_valid():
+            try:
+                period = periods.close_period(
+                    request.user, form.cleaned_data['kind'], form.cleaned_data['date'], closed_by=request.user
+                )
+            except ValidationError as exc:
+                form.add_error(None, exc)
+            else:
+                messages.success(request, f'{period.start:%d %b} - {period.end:%d %b %Y} closed.')
+                return redirect('timesheet:closed_periods')
+        messages.error(request, 'Please correct the errors below.')
+    else:
+        form = ClosePeriodForm(initial={'kind': ClosedPeriod.WEEK, 'date': timezone.localdate() - timedelta(days=7)})
+
+    context = {
+        'form': form,
+        'periods': periods.closed_periods(request.user.pk)[::-1],
+    }
+    return render(request, 'timesheet/closed_periods.html', context)
+
+
+class _Echo:
+    """Write target for csv.writer that hands each formatted line straight back."""
+
+    def write(self, value):
+        return value
+
+
+EXPORT_HEADER = ['Date', 'Start', 'End', 'Break (min)', 'Hours', 'Job', 'Address', 'Archived']
+
+
+@login_required
+def export_entries(request):
+    """
+    The user's entries as CSV, archived years included.
+
+    Optional ``start``/``end`` (YYYY-MM-DD) narrow the range. Rows are
+    streamed as they are read, so a whole history never sits in memory.
+    """
+    try:
+        start = request.GET.get('start')
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+        end = request.GET.get('end')
+        end = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+    except ValueError:
+        return HttpResponse('Dates must be YYYY-MM-DD', status=400, content_type='text/plain')
+
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(EXPORT_HEADER)
+        for row in archive.iter_rows(request.user.pk, start, end):
+            yield writer.writerow([
+                row['date'].isoformat(),
+                row['start_time'].strftime('%H:%M'),
+                row['end_time'].strftime('%H:%M'),
+                row['break_duration'],
+                f"{row['hours']:.2f}",
+                row['job_name'] or '',
+                row['job_address'] or '',
+                'yes' if row['archived'] else '',
+            ])
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="timesheet-entries.csv"'
+    return response
+
+
+@login_required
+def export_download(request, pk):
+    """Serve a finished admin CSV export to the user who started it."""
+    exports_for = ExportJob.objects.all() if request.user.is_superuser else request.user.timesheet_exports.all()
+    export = get_object_or_404(exports_for, pk=pk, status=ExportJob.DONE)
+    if not default_storage.exists(export.path):
+        raise Http404('Export file not found')
+    return FileResponse(
+        default_storage.open(export.path, 'rb'),
+        as_attachment=True,
+        filename=f'{export.model}-export-{export.pk}.csv',
+        content_type='text/csv',
+    )
+
+
 @login_required
 def validate_overlap(request):
     """AJAX endpoint to validate time entry overlaps."""
@@ -462,6 +988,178 @@ def validate_overlap(request):
     return JsonResponse({'valid': False, 'message': 'Invalid request'})
 
 
+def _intervals_range(request):
+    """Parse ``date`` and ``span`` (day or week) into an inclusive date range."""
+    day = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    if request.GET.get('span') == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    return day, day
+
+
+def _intervals_etag(request):
+    """ETag from the user's cache generation; no database query needed."""
+    if not request.user.is_authenticated:
+        return None
+    try:
+        start, end = _intervals_range(request)
+    except ValueError:
+        return None
+    return f'{get_generation(request.user.pk)}-{start}-{end}'
+
+
+@login_required
+@require_GET
+@condition(etag_func=_intervals_etag)
+def day_intervals(request):
+    """
+    Sorted ``[start_minute, end_minute, entry_id, label]`` intervals per day.
+
+    The entry form fetches this once per week and checks overlaps locally;
+    the model's own validation still runs when the form is submitted.
+    """
+    try:
+        start, end = _intervals_range(request)
+    except ValueError:
+        return JsonResponse({'error': 'date must be YYYY-MM-DD'}, status=400)
+
+    days = {}
+    rows = TimeEntry.objects.filter(
+        user=request.user, date__range=[start, end]
+    ).order_by('date', 'start_time').values_list(
+        'id', 'date', 'start_time', 'end_time', 'job__name', 'job__address'
+    )
+    for pk, day, start_time, end_time, name, address in rows:
+        days.setdefault(day.isoformat(), []).append([
+            start_time.hour * 60 + start_time.minute,
+            end_time.hour * 60 + end_time.minute,
+            pk,
+            f'{start_time:%H:%M} - {end_time:%H:%M} for {name or address or "Unnamed Job"}',
+        ])
+
+    response = JsonResponse({'start': start.isoformat(), 'end': end.isoformat(), 'days': days})
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+def job_autocomplete(request):
+    """AJAX endpoint returning the user's best matching jobs for the job picker."""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+
+    jobs = search_jobs(request.user, query, limit=limit)
+    return JsonResponse({
+        'results': [
+            {'id': job.pk, 'text': job.display_name(), 'address': job.address}
+            for job in jobs
+        ]
+    })
+
+
+def _year_minutes(user, year):
+    """Dense list of minutes worked per day of ``year``, cached per user generation."""
+    key = user_cache_key(user.pk, 'heatmap', year)
+    minutes = cache.get(key)
+    if minutes is None:
+        start = date(year, 1, 1)
+        minutes = [0] * (366 if calendar.isleap(year) else 365)
+        rows = TimeEntry.objects.filter(
+            user=user,
+            date__range=[start, date(year, 12, 31)]
+        ).minutes_by_date().values_list('date', 'minutes')
+        for day, day_minutes in rows:
+            minutes[(day - start).days] = day_minutes or 0
+        for day, day_minutes in archive.minutes_by_date(user.pk, start, date(year, 12, 31)).items():
+            minutes[(day - start).days] += day_minutes
+        # Bounded, as every generation bump leaves the old key behind
+        cache.set(key, minutes, timeout=60 * 60 * 24)
+    return minutes
+
+
+@login_required
+def heatmap_data(request):
+    """
+    Year-at-a-glance minutes worked per day.
+
+    JSON by default; ``?format=bin`` returns little-endian uint16 minutes,
+    one per day starting 1 January.
+    """
+    today = timezone.localdate()
+    try:
+        year = int(request.GET.get('year', today.year))
+    except ValueError:
+        year = today.year
+    if not 1 <= year <= 9999:
+        year = today.year
+
+    minutes = _year_minutes(request.user, year)
+
+    if request.GET.get('format') == 'bin':
+        # A day never holds more than 24h of non-overlapping entries, so uint16 fits
+        packed = array('H', minutes)
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        response = HttpResponse(packed.tobytes(), content_type='application/octet-stream')
+        response['X-Heatmap-Start'] = date(year, 1, 1).isoformat()
+    else:
+        response = JsonResponse({
+            'year': year,
+            'start': date(year, 1, 1).isoformat(),
+            'max': max(minutes),
+            'minutes': minutes,
+        })
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
+
+CHART_MIN_POINTS = 10
+CHART_MAX_POINTS = 5000
+
+
+@login_required
+def chart_hours(request):
+    """
+    Hours per day or week, downsampled server-side to ``points`` points.
+
+    Query parameters: ``resolution`` (day|week), ``method`` (lttb|minmax),
+    ``points`` and an optional ``start``/``end`` (YYYY-MM-DD); the range
+    defaults to the user's whole history.
+    """
+    today = timezone.localdate()
+
+    resolution = request.GET.get('resolution', charts.DAY)
+    method = request.GET.get('method', charts.LTTB)
+    if resolution not in charts.RESOLUTIONS or method not in charts.METHODS:
+        return JsonResponse({'error': 'Unknown resolution or method'}, status=400)
+    try:
+        points = min(max(int(request.GET.get('points', 500)), CHART_MIN_POINTS), CHART_MAX_POINTS)
+        start = request.GET.get('start')
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+        end = request.GET.get('end')
+        end = datetime.strptime(end, '%Y-%m-%d').date() if end else today
+    except ValueError:
+        return JsonResponse({'error': 'Invalid points or date'}, status=400)
+
+    key = user_cache_key(request.user.pk, 'chart', resolution, method, points, start, end)
+    payload = cache.get(key)
+    if payload is None:
+        snapshot = analytics.load_snapshot(request.user.pk)
+        if start is None:
+            start = date.fromordinal(int(snapshot['date'][0])) if len(snapshot) else end
+        if start > end:
+            return JsonResponse({'error': 'start must not be after end'}, status=400)
+        payload = charts.chart_payload(snapshot, start, end, resolution, points, method)
+        cache.set(key, payload, timeout=60 * 60 * 24)
+
+    response = JsonResponse(payload)
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
+
 @login_required
 def debug_showcase(request):
     """
@@ -0,0 +1,313 @@
+"""
+Two-tier cache backend: a bounded in-process LRU (L1) over a shared cache (L2).
+
+Hot, tiny values such as the timesheet cache generations are read on every
+request. With Redis as the only cache each read is a network round trip; this
+backend answers repeat reads from process memory instead.
+
+Only keys starting with one of ``L1_KEY_PREFIXES`` use L1. Every other key
+goes straight to L2 and never touches the stamps below, so writing ordinary
+cached values costs no extra round trip and invalidates nothing in L1. An L1
+value may be up to ``CHECK_INTERVAL`` seconds old, so keep keys that guard
+writes (closed periods, job ownership) out of the list.
+
+Every L1 key falls in one of ``STAMP_BUCKETS`` buckets, and each bucket has a
+version stamp kept in L2. A write or delete through any process stores the
+value in L2, bumps the bucket's stamp and drops its own L1 copy; L1 is only
+filled by reads, which take the stamp before reading L2, so a write racing
+with another process never pins an outdated value. Each process reads all the
+stamps with one ``get_many`` at most every ``CHECK_INTERVAL`` seconds. It
+keeps an L1 entry only while that entry's bucket stamp is unchanged. A write
+on another process is therefore seen within ``CHECK_INTERVAL`` seconds, and
+writes by the same process are seen immediately. Set ``CHECK_INTERVAL`` to 0
+to read the stamps before every L1 hit.
+
+Concurrent misses for a key in one process are coalesced: the first thread
+reads L2 (or, in ``get_or_set``, computes the value) while the others wait on
+the key's lock and then find the value in L1.
+
+Configuration::
+
+    CACHES = {
+        'shared': {'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': 'redis://redis:6379/0'},
+        'default': {
+            'BACKEND': 'home.cache.TieredCache',
+            'OPTIONS': {
+                'L2': 'shared',            # alias of the shared cache
+                'MAX_ENTRIES': 1000,       # L1 size, least recently used evicted
+                'MAX_VALUE_BYTES': 16384,  # larger values are only kept in L2
+                'L1_TIMEOUT': 60,          # longest an L1 entry is trusted, in seconds
+                'CHECK_INTERVAL': 1,       # seconds between stamp checks
+                'L1_KEY_PREFIXES': ('timesheet:gen:entries:',),  # keys kept in L1
+            },
+        },
+    }
+
+Sessions should use the shared alias directly, so a logout is seen at once
+by every process.
+"""
+
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+STAMP_BUCKETS = 16
+LOCK_STRIPES = 64
+
+
+class TieredCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options.get('L2', location or 'shared')
+        self._max_entries = int(options.get('MAX_ENTRIES', 1000))
+        self._max_value_bytes = int(options.get('MAX_VALUE_BYTES', 16 * 1024))
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 60))
+        self._check_interval = float(options.get('CHECK_INTERVAL', 1))
+        self._l1_prefixes = tuple(options.get('L1_KEY_PREFIXES', ()))
+
+        # key -> (pickled value, bucket stamp, expiry on the monotonic clock)
+        self._l1 = OrderedDict()
+        self._l1_lock = threading.Lock()
+        self._key_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+        self._stamps = [None] * STAMP_BUCKETS
+        self._stamps_checked = None
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    # Stamps ---------------------------------------------------------------
+
+    def _bucket(self, key):
+        return zlib.crc32(key.encode()) % STAMP_BUCKETS
+
+    def _stamp_key(self, bucket):
+        return f'tiered-stamp:{bucket}'
+
+    def _fresh_stamp(self):
+        # Time-based so a stamp lost to eviction or clear() never comes back with an old value
+        return time.time_ns() // 1000
+
+    def _current_stamps(self):
+        """Bucket stamps as last read from L2, re-read if ``CHECK_INTERVAL`` has passed."""
+        now = time.monotonic()
+        if self._stamps_checked is None or now - self._stamps_checked >= self._check_interval:
+            keys = [self._stamp_key(bucket) for bucket in range(STAMP_BUCKETS)]
+            found = self.l2.get_many(keys)
+            for key in keys:
+                if key not in found:
+                    self.l2.add(key, self._fresh_stamp(), timeout=None)
+                    found[key] = self.l2.get(key)
+            self._stamps = [found[key] for key in keys]
+            self._stamps_checked = now
+        return self._stamps
+
+    def _bump(self, key):
+        """Tell every process that ``key`` changed; returns the bucket's new stamp."""
+        bucket = self._bucket(key)
+        stamp_key = self._stamp_key(bucket)
+        try:
+            stamp = self.l2.incr(stamp_key)
+        except ValueError:
+            stamp = self._fresh_stamp()
+            if not self.l2.add(stamp_key, stamp, timeout=None):
+                stamp = self.l2.incr(stamp_key)
+        # Only this bucket is known to be current, so the others keep their check time
+        self._stamps[bucket] = stamp
+        return stamp
+
+    # L1 -------------------------------------------------------------------
+
+    def _in_l1(self, key):
+        """Whether ``key``, as passed by the caller, is kept in L1 at all."""
+        return key.startswith(self._l1_prefixes)
+
+    def _timeout(self, timeout):
+        """Seconds (or ``None`` for no expiry) for both tiers."""
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _lock_for(self, key):
+        return self._key_locks[hash(key) % LOCK_STRIPES]
+
+    def _l1_get(self, key):
+        """``(True, value)`` for a live L1 entry whose stamp is current, else ``(False, None)``."""
+        with self._l1_lock:
+            entry = self._l1.get(key)
+        if entry is None:
+            return False, None
+        pickled, stamp, expires = entry
+        if expires <= time.monotonic() or stamp != self._current_stamps()[self._bucket(key)]:
+            self._l1_discard(key)
+            return False, None
+        with self._l1_lock:
+            if key in self._l1:
+                self._l1.move_to_end(key)
+        return True, pickle.loads(pickled)
+
+    def _l1_set(self, key, value, stamp, timeout):
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        if len(pickled) > self._max_value_bytes:
+            self._l1_discard(key)
+            return
+        lifetime = self._l1_timeout if timeout is None else min(timeout, self._l1_timeout)
+        if lifetime <= 0:
+            self._l1_discard(key)
+            return
+        with self._l1_lock:
+            self._l1[key] = (pickled, stamp, time.monotonic() + lifetime)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_discard(self, key):
+        with self._l1_lock:
+            self._l1.pop(key, None)
+
+    def _changed(self, key):
+        """
+        After a write to L2: invalidate ``key`` everywhere, this process included.
+
+        L1 is not filled with the written value. Another process may have
+        written the key between the L2 write and the bump, and the value in
+        hand would then be kept under the newest stamp.
+        """
+        self._bump(key)
+        self._l1_discard(key)
+
+    def _fill(self, key, version):
+        """Read ``key`` from L2 into L1; returns ``(found, value)``."""
+        l1_key = self.make_and_validate_key(key, version=version)
+        # The stamp is taken before the read, so a write racing it makes the entry stale
+        stamp = self._current_stamps()[self._bucket(l1_key)]
+        sentinel = object()
+        value = self.l2.get(key, sentinel, version=version)
+        if value is sentinel:
+            return False, None
+        self._l1_set(l1_key, value, stamp, self._l1_timeout)
+        return True, value
+
+    # Cache API ------------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        if not self._in_l1(key):
+            return self.l2.get(key, default, version=version)
+        l1_key = self.make_and_validate_key(key, version=version)
+        found, value = self._l1_get(l1_key)
+        if found:
+            return value
+        with self._lock_for(l1_key):
+            # Another thread may have filled it while this one waited
+            found, value = self._l1_get(l1_key)
+            if not found:
+                found, value = self._fill(key, version)
+        return value if found else default
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self._in_l1(key):
+            return self.l2.get_or_set(key, default, timeout=self._timeout(timeout), version=version)
+        l1_key = self.make_and_validate_key(key, version=version)
+        found, value = self._l1_get(l1_key)
+        if found:
+            return value
+        with self._lock_for(l1_key):
+            found, value = self._l1_get(l1_key)
+            if not found:
+                found, value = self._fill(key, version)
+            if not found:
+                value = default() if callable(default) else default
+                if value is not None:
+                    self.add(key, value, timeout=timeout, version=version)
+                    # A concurrent add from another process wins
+                    value = self.get(key, value, version=version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        self.l2.set(key, value, timeout=timeout, version=version)
+        if self._in_l1(key):
+            self._changed(self.make_and_validate_key(key, version=version))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        if not self.l2.add(key, value, timeout=timeout, version=version):
+            return False
+        if self._in_l1(key):
+            self._changed(self.make_and_validate_key(key, version=version))
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        touched = self.l2.touch(key, timeout=timeout, version=version)
+        # The L1 copy may outlive a shortened timeout, so drop it
+        if self._in_l1(key):
+            self._l1_discard(self.make_and_validate_key(key, version=version))
+        return touched
+
+    def delete(self, key, version=None):
+        deleted = self.l2.delete(key, version=version)
+        if self._in_l1(key):
+            self._changed(self.make_and_validate_key(key, version=version))
+        return deleted
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version=version)
+        if self._in_l1(key):
+            self._changed(self.make_and_validate_key(key, version=version))
+        return value
+
+    def has_key(self, key, version=None):
+        if self._in_l1(key) and self._l1_get(self.make_and_validate_key(key, version=version))[0]:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            hit, value = False, None
+            if self._in_l1(key):
+                hit, value = self._l1_get(self.make_and_validate_key(key, version=version))
+            if hit:
+                found[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            stamps = self._current_stamps() if any(self._in_l1(key) for key in missing) else None
+            fetched = self.l2.get_many(missing, version=version)
+            for key, value in fetched.items():
+                if not self._in_l1(key):
+                    continue
+                l1_key = self.make_and_validate_key(key, version=version)
+                self._l1_set(l1_key, value, stamps[self._bucket(l1_key)], self._l1_timeout)
+            found.update(fetched)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        failed = self.l2.set_many(data, timeout=timeout, version=version)
+        for key in filter(self._in_l1, data):
+            self._changed(self.make_and_validate_key(key, version=version))
+        return failed
+
+    def delete_many(self, keys, version=None):
+        self.l2.delete_many(keys, version=version)
+        for key in filter(self._in_l1, keys):
+            self._changed(self.make_and_validate_key(key, version=version))
+
+    def clear(self):
+        self.l2.clear()
+        with self._l1_lock:
+            self._l1.clear()
+        # The stamps went with L2; the next read re-creates them with fresh values
+        self._stamps_checked = None
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
@@ -156,7 +156,14 @@ def navigation_context(request):
                 {'name': 'Dashboard', 'url': 'timesheet:dashboard', 'icon': 'bi-speedometer2'},
                 {'name': 'Daily Entry', 'url': 'timesheet:daily_entry', 'icon': 'bi-plus-circle'},
                 {'name': 'Weekly Summary', 'url': 'timesheet:weekly_summary', 'icon': 'bi-calendar-week'},
+                {'name': 'Household', 'url': 'timesheet:household', 'icon': 'bi-people'},
+                {'name': 'Review Weeks', 'url': 'timesheet:week_review', 'icon': 'bi-check2-square'},
+                {'name': 'Leave', 'url': 'timesheet:leave', 'icon': 'bi-airplane'},
+                {'name': 'Invoices', 'url': 'timesheet:invoices', 'icon': 'bi-receipt-cutoff'},
                 {'name': 'Jobs', 'url': 'timesheet:job_list', 'icon': 'bi-briefcase'},
+                {'name': 'Merge Jobs', 'url': 'timesheet:job_merge', 'icon': 'bi-intersect'},
+                {'name': 'Pay Periods', 'url': 'timesheet:closed_periods', 'icon': 'bi-lock'},
+                {'name': 'Preferences', 'url': 'timesheet:preferences', 'icon': 'bi-sliders'},
             ] if current_app == 'timesheet' else []
         },
         {
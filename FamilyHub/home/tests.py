@@ -0,0 +1,191 @@
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+
+def tiered_caches(l2, **options):
+    return {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': l2,
+        'tiered': {
+            'BACKEND': 'home.cache.TieredCache',
+            'OPTIONS': {'L2': 'shared', 'CHECK_INTERVAL': 0, 'L1_KEY_PREFIXES': ('',), **options},
+        },
+    }
+
+
+class TieredCacheTests:
+    """
+    TieredCache over a shared backend. Each ``create_connection`` call builds
+    a separate L1, standing in for another process sharing the same L2.
+    """
+
+    def l2_settings(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.settings_override = override_settings(CACHES=tiered_caches(self.l2_settings()))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.cache = caches['tiered']
+        self.addCleanup(caches['shared'].clear)
+
+    def other_process(self, **options):
+        with override_settings(CACHES=tiered_caches(self.l2_settings(), **options)):
+            return caches.create_connection('tiered')
+
+    def test_round_trip(self):
+        self.cache.set('answer', {'value': 42})
+        self.assertEqual(self.cache.get('answer'), {'value': 42})
+        self.assertEqual(caches['shared'].get('answer'), {'value': 42})
+        self.assertIsNone(self.cache.get('missing'))
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+
+    def test_repeat_reads_come_from_l1(self):
+        self.cache.set('answer', 42)
+        self.assertEqual(self.cache.get('answer'), 42)
+        # Removed behind the tier's back, without bumping a stamp
+        caches['shared'].delete('answer')
+        self.assertEqual(self.cache.get('answer'), 42)
+
+    def test_writes_from_another_process_are_seen(self):
+        other = self.other_process()
+        self.cache.set('answer', 1)
+        self.assertEqual(other.get('answer'), 1)
+
+        self.cache.set('answer', 2)
+        self.assertEqual(other.get('answer'), 2)
+
+        self.cache.incr('answer')
+        self.assertEqual(other.get('answer'), 3)
+
+        self.cache.delete('answer')
+        self.assertIsNone(other.get('answer'))
+
+    def test_write_racing_another_process(self):
+        other = self.other_process()
+        self.cache.set('generation', 1)
+        bump = self.cache._bump
+
+        def bump_after_other_write(key):
+            # The other process increments between this one's L2 write and its stamp bump
+            other.incr('generation')
+            return bump(key)
+
+        with mock.patch.object(self.cache, '_bump', bump_after_other_write):
+            self.assertEqual(self.cache.incr('generation'), 2)
+        self.assertEqual(self.cache.get('generation'), 3)
+        self.assertEqual(other.get('generation'), 3)
+
+    def test_stamps_are_checked_once_per_interval(self):
+        other = self.other_process(CHECK_INTERVAL=60)
+        self.cache.set('answer', 1)
+        self.assertEqual(other.get('answer'), 1)
+        self.cache.set('answer', 2)
+        self.assertEqual(other.get('answer'), 1)
+
+        other._stamps_checked = time.monotonic() - 61
+        self.assertEqual(other.get('answer'), 2)
+
+    def test_only_listed_keys_use_l1(self):
+        prefixes = ('timesheet:gen:entries:',)
+        writer = self.other_process(L1_KEY_PREFIXES=prefixes)
+        reader = self.other_process(L1_KEY_PREFIXES=prefixes, CHECK_INTERVAL=60)
+        writer.set('timesheet:gen:entries:1', 1)
+        writer.set('timesheet:gen:periods:1', 1)
+        self.assertEqual(reader.get_many(['timesheet:gen:entries:1', 'timesheet:gen:periods:1']), {
+            'timesheet:gen:entries:1': 1, 'timesheet:gen:periods:1': 1,
+        })
+        self.assertEqual(list(reader._l1), [reader.make_key('timesheet:gen:entries:1')])
+
+        # Writes to other keys bump no stamp and are seen at once
+        with mock.patch.object(writer, '_bump') as bump:
+            writer.incr('timesheet:gen:periods:1')
+            writer.set('timesheet:closed:1', [2020])
+        bump.assert_not_called()
+        self.assertEqual(reader.get('timesheet:gen:periods:1'), 2)
+        self.assertTrue(reader.has_key('timesheet:closed:1'))
+        self.assertEqual(reader.get_or_set('timesheet:closed:1', list), [2020])
+
+    def test_l1_is_bounded(self):
+        cache = self.other_process(MAX_ENTRIES=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+            cache.get(key)
+        cache.get('b')
+        cache.set('d', 'd')
+        cache.get('d')
+        self.assertEqual(list(cache._l1), [cache.make_key('b'), cache.make_key('d')])
+        self.assertEqual(cache.get('a'), 'a')
+
+    def test_large_values_stay_in_l2(self):
+        cache = self.other_process(MAX_VALUE_BYTES=100)
+        cache.set('large', 'x' * 1000)
+        self.assertEqual(cache.get('large'), 'x' * 1000)
+        self.assertNotIn(cache.make_key('large'), cache._l1)
+
+    def test_returned_values_are_copies(self):
+        self.cache.set('days', [1, 2])
+        self.cache.get('days').append(3)
+        self.assertEqual(self.cache.get('days'), [1, 2])
+
+    def test_add_and_get_many(self):
+        self.assertTrue(self.cache.add('a', 1))
+        self.assertFalse(self.cache.add('a', 2))
+        self.cache.set_many({'b': 2, 'c': 3})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c', 'd']), {'a': 1, 'b': 2, 'c': 3})
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.other_process().get_many(['a', 'b', 'c']), {'c': 3})
+
+    def test_expired_l1_entries_are_dropped(self):
+        self.cache.set('short', 1, timeout=0)
+        self.assertIsNone(self.cache.get('short'))
+
+    def test_concurrent_misses_are_coalesced(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'computed'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_set('slow', compute)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['computed'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_cleared_stamps_do_not_come_back(self):
+        other = self.other_process()
+        self.cache.set('answer', 1)
+        self.assertEqual(other.get('answer'), 1)
+        caches['shared'].clear()
+        caches['shared'].set('answer', 2)
+        self.assertEqual(other.get('answer'), 2)
+
+
+class LocMemTieredCacheTests(TieredCacheTests, SimpleTestCase):
+    def l2_settings(self):
+        return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-l2'}
+
+
+class FileBasedTieredCacheTests(TieredCacheTests, SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.directory, ignore_errors=True)
+
+    def l2_settings(self):
+        return {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': self.directory}